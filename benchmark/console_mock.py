@@ -0,0 +1,483 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+import collections
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import stage_metrics
+import synthetic_data
+import timestamp_util
+
+# condition on the timestamp of inference results, as written by ConsoleDataLoader
+_FILTER_CONDITION = re.compile(r'i\.T\s*(>=|<=|>|<|=)\s*"(\d{17})"')
+_FILTER_PREFIX = 'EXISTS(SELECT VALUE i FROM i IN c.Inferences WHERE '
+
+
+def format_timestamp(seconds):
+    """format epoch seconds in the timestamp format of Console
+
+    Args:
+        seconds (float): seconds since epoch
+
+    Returns:
+        str: 'YYYYMMDDHHMMSSfff' in UTC
+    """
+    return timestamp_util.to_string(int(seconds * 1000))
+
+
+def parse_filter(filter_str):
+    """parse filter of inference results by timestamp
+
+    Only the conditions on i.T joined by AND are supported, which is the
+    form written by ConsoleDataLoader.
+
+    Args:
+        filter_str (str): filter string
+
+    Returns:
+        list: list of (operator, timestamp)
+    """
+    if not filter_str:
+        return []
+    if not filter_str.startswith(_FILTER_PREFIX) or not filter_str.endswith(')'):
+        raise ValueError(f'unsupported filter: {filter_str}')
+    conditions = filter_str[len(_FILTER_PREFIX):-1].split(' AND ')
+    parsed = []
+    for condition in conditions:
+        match = _FILTER_CONDITION.fullmatch(condition.strip())
+        if match is None:
+            raise ValueError(f'unsupported filter condition: {condition}')
+        parsed.append((match.group(1), match.group(2)))
+    return parsed
+
+
+def _match_filter(timestamp, conditions):
+    for operator, value in conditions:
+        if operator == '>=' and not timestamp >= value:
+            return False
+        if operator == '<=' and not timestamp <= value:
+            return False
+        if operator == '>' and not timestamp > value:
+            return False
+        if operator == '<' and not timestamp < value:
+            return False
+        if operator == '=' and timestamp != value:
+            return False
+    return True
+
+
+class SyntheticDevice() :
+    """device producing synthetic frames in real time
+
+    Frames are produced at rate per second from the creation of the
+    device, with timestamps of the wall clock. Only the last
+    retention_frames frames are kept, like the storage of Console.
+    Frames are generated when they are requested, so an idle device
+    costs nothing. The image of a frame has the detected boxes drawn
+    on a plain background.
+
+    Args:
+        config (dict): device settings
+    """
+
+    def __init__(self, config):
+
+        # Get parameter from config
+        self._device_id = config.get('device_id', 'mock_device')
+        self._sub_directory_name = config.get('sub_directory_name', 'mock')
+        self._rate = config.get('rate', 10.0)
+        self._retention_frames = config.get('retention_frames', 1000)
+        self._image_width = config.get('image_width', 1920)
+        self._image_height = config.get('image_height', 1080)
+        self._jpeg_quality = config.get('jpeg_quality', 80)
+
+        # Check parameter
+        if self._rate <= 0:
+            raise ValueError('rate must be larger than 0')
+        if self._retention_frames < 1:
+            raise ValueError('retention_frames must be 1 or more')
+
+        self._generator = synthetic_data.SyntheticDetectionGenerator({
+            'seed': config.get('seed', 0),
+            'min_boxes': config.get('min_boxes', 0),
+            'max_boxes': config.get('max_boxes', 20),
+            'score_distribution': config.get('score_distribution', 'uniform'),
+            'image_width': self._image_width,
+            'image_height': self._image_height,
+            'min_box_height': config.get('min_box_height', 50),
+            'max_box_height': config.get('max_box_height', 500)
+        })
+        self._start = time.time()
+        self._next_frame = 0
+        self._frames = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def device_id(self):
+        """str: device id"""
+        return self._device_id
+
+    @property
+    def sub_directory_name(self):
+        """str: directory of images"""
+        return self._sub_directory_name
+
+    def frames(self):
+        """get frames in the retention, oldest first
+
+        Returns:
+            list: list of dict with timestamp, meta data and lazily encoded image
+        """
+        with self._lock:
+            produced = int((time.time() - self._start) * self._rate) + 1
+            # frames which are already out of the retention are not generated
+            if produced - self._next_frame > self._retention_frames:
+                self._next_frame = produced - self._retention_frames
+            while self._next_frame < produced:
+                self._frames.append(self._make_frame(self._next_frame))
+                self._next_frame += 1
+            while len(self._frames) > self._retention_frames:
+                self._frames.popleft()
+            return list(self._frames)
+
+    def image(self, frame):
+        """get base64 JPEG of a frame, encoded on the first request
+
+        Args:
+            frame (dict): frame returned by frames
+
+        Returns:
+            str: base64 encoded JPEG
+        """
+        with self._lock:
+            if frame['image'] is None:
+                frame['image'] = self._encode_image(frame['dict_meta'])
+            return frame['image']
+
+    def _make_frame(self, index):
+        dict_meta = self._generator.detections()
+        return {
+            'index': index,
+            'timestamp': format_timestamp(self._start + index / self._rate),
+            'meta': base64.b64encode(self._generator.serialize(dict_meta)).decode('ascii'),
+            'dict_meta': dict_meta,
+            'image': None
+        }
+
+    def _encode_image(self, dict_meta):
+        # cv2 and numpy are only needed for images
+        import cv2
+        import numpy as np
+
+        image = np.full((self._image_height, self._image_width, 3), 96, dtype=np.uint8)
+        for general_object in dict_meta['perception']['object_detection_list']:
+            bounding_box = general_object['bounding_box']
+            cv2.rectangle(
+                image, (bounding_box['left'], bounding_box['top']),
+                (bounding_box['right'], bounding_box['bottom']), (200, 160, 120), -1)
+        ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self._jpeg_quality])
+        if not ok:
+            raise RuntimeError('cannot encode image')
+        return base64.b64encode(jpeg.tobytes()).decode('ascii')
+
+
+class ConsoleMockServer() :
+    """local stand-in of the Console REST API
+
+    Serves the images and inference results of a SyntheticDevice in the
+    shapes returned by insight.get_images and
+    insight.get_inference_results(raw=1) of Console Access Library.
+
+    * GET /devices/<device_id>/images/directories/<sub_directory_name>
+      with limit, skip and order_by ('ASC' or 'DESC')
+    * GET /devices/<device_id>/data/inferenceresults
+      with NumberOfInferenceresults, filter and raw. Results matching the
+      filter are returned oldest first, up to NumberOfInferenceresults.
+    * GET /stats returns the number of requests and frames
+
+    Args:
+        config (dict): server and device settings
+    """
+
+    def __init__(self, config):
+
+        # Get parameter from config
+        self._host = config.get('host', '127.0.0.1')
+        self._port = config.get('port', 8089)
+        self._response_delay = config.get('response_delay', 0.0)
+        self._error_rate = config.get('error_rate', 0.0)
+
+        # Check parameter
+        if self._response_delay < 0:
+            raise ValueError('response_delay must be 0 or more')
+        if not 0.0 <= self._error_rate <= 1.0:
+            raise ValueError('error_rate must be set in the range of 0 to 1')
+
+        self._device = SyntheticDevice(config)
+        self._random = random.Random(config.get('seed', 0))
+        self._stats = collections.Counter()
+        self._lock = threading.Lock()
+        self._http_server = None
+
+    @property
+    def port(self):
+        """int: port of the server, known after start"""
+        if self._http_server is not None:
+            return self._http_server.server_address[1]
+        return self._port
+
+    def start(self):
+        """start serving in a background thread
+
+        """
+        # http.server is only needed for the server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        mock_server = self
+
+        class _ConsoleHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, body = mock_server.handle(self.path)
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer((self._host, self._port), _ConsoleHandler)
+        self._http_server.daemon_threads = True
+        threading.Thread(target=self._http_server.serve_forever, daemon=True).start()
+
+    def close(self):
+        """stop serving
+
+        """
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+    def stats(self):
+        """get request statistics
+
+        Returns:
+            dict: counts of requests, errors and returned frames
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def handle(self, path):
+        """handle a request
+
+        Args:
+            path (str): request path with query
+
+        Returns:
+            int: http status
+            object: json body
+        """
+        url = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = [urllib.parse.unquote(part) for part in url.path.strip('/').split('/')]
+
+        if parts == ['stats']:
+            return 200, self.stats()
+
+        self._count('requests')
+        if self._response_delay > 0:
+            time.sleep(self._random.expovariate(1.0 / self._response_delay))
+        if self._error_rate > 0 and self._random.random() < self._error_rate:
+            self._count('errors')
+            return 500, _error('E99999', 'injected error of the stand-in')
+
+        try:
+            if len(parts) == 5 and parts[0] == 'devices' \
+                and parts[2:4] == ['images', 'directories']:
+                return self._images(parts[1], parts[4], query)
+            if len(parts) == 4 and parts[0] == 'devices' \
+                and parts[2:] == ['data', 'inferenceresults']:
+                return self._inference_results(parts[1], query)
+        except ValueError as error:
+            self._count('errors')
+            return 400, _error('E00001', str(error))
+        self._count('errors')
+        return 404, _error('E00002', f'{url.path} is not found')
+
+    def _images(self, device_id, sub_directory_name, query):
+        if device_id != self._device.device_id \
+            or sub_directory_name != self._device.sub_directory_name:
+            raise ValueError(f'{device_id}/{sub_directory_name} is not found')
+        limit = int(query.get('limit', 50))
+        skip = int(query.get('skip', 0))
+        frames = self._device.frames()
+        if query.get('order_by', 'ASC').upper() == 'DESC':
+            frames = frames[::-1]
+        selected = frames[skip:skip + limit]
+        self._count('images', len(selected))
+        return 200, {
+            'total_image_count': len(frames),
+            'images': [
+                {'name': frame['timestamp'] + '.jpg', 'contents': self._device.image(frame)}
+                for frame in selected]
+        }
+
+    def _inference_results(self, device_id, query):
+        if device_id != self._device.device_id:
+            raise ValueError(f'{device_id} is not found')
+        if int(query.get('raw', 1)) != 1:
+            raise ValueError('only raw=1 is supported by the stand-in')
+        number = int(query.get('NumberOfInferenceresults', 20))
+        conditions = parse_filter(query.get('filter', ''))
+        selected = [
+            frame for frame in self._device.frames()
+            if _match_filter(frame['timestamp'], conditions)][:number]
+        self._count('inference_results', len(selected))
+        return 200, [
+            {
+                'id': f"{device_id}_{frame['index']}",
+                'device_id': device_id,
+                'model_id': 'mock_model',
+                'model_version_id': 'mock_model:v1.00',
+                '_ts': frame['index'],
+                'inference_result': {
+                    'DeviceID': device_id,
+                    'ModelID': 'mock_model',
+                    'Image': True,
+                    'Inferences': [{'T': frame['timestamp'], 'O': frame['meta']}]
+                }
+            }
+            for frame in selected]
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+
+def _error(code, message):
+    # error body of Console, which Console Access Library returns as it is
+    return {'result': 'ERROR', 'code': code, 'message': message}
+
+
+class _MockInsight() :
+
+    def __init__(self, endpoint, timeout, latency):
+        self._endpoint = endpoint.rstrip('/')
+        self._timeout = timeout
+        self._latency = latency
+
+    def get_images(self, device_id, sub_directory_name, number_of_images=50,
+                   skip=0, order_by='ASC'):
+        return self._get(
+            f'/devices/{urllib.parse.quote(device_id)}/images/directories/'
+            f'{urllib.parse.quote(sub_directory_name)}',
+            {'limit': number_of_images, 'skip': skip, 'order_by': order_by})
+
+    def get_inference_results(self, device_id, filter=None,  # pylint: disable=redefined-builtin
+                              number_of_inference_results=20, raw=1, time=None):
+        query = {'NumberOfInferenceresults': number_of_inference_results, 'raw': raw}
+        if filter:
+            query['filter'] = filter
+        if time:
+            query['time'] = time
+        return self._get(
+            f'/devices/{urllib.parse.quote(device_id)}/data/inferenceresults', query)
+
+    def _get(self, path, query):
+        url = f'{self._endpoint}{path}?{urllib.parse.urlencode(query)}'
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=self._timeout) as response:
+                body = json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            body = json.loads(error.read())
+        self._latency.observe(time.perf_counter() - start)
+        return body
+
+
+class ConsoleMockClient() :
+    """client of ConsoleMockServer with the interface of Console Access Library
+
+    Pass it to ConsoleDataLoader (or crowd_count_app.run) as the client.
+    Errors are returned as dict with 'message', as the library does.
+
+    Args:
+        endpoint (str): url of the server, e.g. http://127.0.0.1:8089
+        timeout (float, optional): seconds to wait for a response. Defaults to 60.
+    """
+
+    def __init__(self, endpoint, timeout=60.0):
+        self.latency = stage_metrics.LatencyHistogram()
+        self.insight = _MockInsight(endpoint, timeout, self.latency)
+
+
+def main():
+    """console stand-in main process
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--device_id', type=str, default='mock_device')
+    parser.add_argument('--sub_directory_name', type=str, default='mock')
+    parser.add_argument('--rate', type=float, default=10.0, help='frames per second')
+    parser.add_argument('--retention_frames', type=int, default=1000)
+    parser.add_argument('--image_width', type=int, default=1920)
+    parser.add_argument('--image_height', type=int, default=1080)
+    parser.add_argument('--jpeg_quality', type=int, default=80)
+    parser.add_argument('--min_boxes', type=int, default=0)
+    parser.add_argument('--max_boxes', type=int, default=20)
+    parser.add_argument('--response_delay', type=float, default=0.0,
+                        help='mean seconds added to each response')
+    parser.add_argument('--error_rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = ConsoleMockServer(vars(args))
+    server.start()
+    print(f'console stand-in on http://{args.host}:{server.port} '
+          f'(device_id {args.device_id}, sub_directory_name {args.sub_directory_name})',
+          flush=True)
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import synthetic_data
+import ingest_service
+
+
+async def _send_tcp(args, device, metas, sent):
+    _, writer = await asyncio.open_connection(args.host, args.tcp_port)
+    interval = 1.0 / args.rate
+    start = time.perf_counter()
+    for sequence, meta in enumerate(metas):
+        delay = start + sequence * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        header = {'device_id': device, 'timestamp': str(sequence), 'sequence': sequence}
+        sent[(device, sequence)] = time.perf_counter()
+        writer.write(ingest_service.encode_message(header, meta))
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _send_http(args, device, metas, sent):
+    reader, writer = await asyncio.open_connection(args.host, args.http_port)
+    interval = 1.0 / args.rate
+    start = time.perf_counter()
+    rejected = 0
+    for sequence, meta in enumerate(metas):
+        delay = start + sequence * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent[(device, sequence)] = time.perf_counter()
+        writer.write(
+            f'POST /devices/{device}/meta HTTP/1.1\r\n'
+            f'Host: {args.host}\r\n'
+            f'X-Timestamp: {sequence}\r\n'
+            f'X-Sequence: {sequence}\r\n'
+            f'Content-Length: {len(meta)}\r\n\r\n'.encode('latin-1') + meta)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        content_length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                content_length = int(value)
+        await reader.readexactly(content_length)
+        if status != 202:
+            rejected += 1
+    writer.close()
+    await writer.wait_closed()
+    return rejected
+
+
+async def _subscribe(args, sent, latencies, stop):
+    reader, writer = await asyncio.open_connection(args.host, args.publish_port)
+    while not stop.is_set():
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=0.1)
+        except asyncio.TimeoutError:
+            continue
+        if not line:
+            break
+        result = json.loads(line)
+        sequence = int(result['sequence'])
+        sent_time = sent.get((result['device_id'], sequence))
+        if sent_time is not None:
+            latencies.append(time.perf_counter() - sent_time)
+    writer.close()
+
+
+async def _run(args):
+    metas = {}
+    for index in range(args.devices):
+        generator = synthetic_data.SyntheticDetectionGenerator({
+            'seed': args.seed + index,
+            'min_boxes': args.min_boxes,
+            'max_boxes': args.max_boxes
+        })
+        metas[f'device{index:05d}'] = generator.flatbuffers(int(args.rate * args.duration))
+
+    sent = {}
+    latencies = []
+    stop = asyncio.Event()
+    subscriber = asyncio.ensure_future(_subscribe(args, sent, latencies, stop))
+    # let the subscriber connect before the first result
+    await asyncio.sleep(0.2)
+
+    send = _send_http if args.protocol == 'http' else _send_tcp
+    start = time.perf_counter()
+    returns = await asyncio.gather(
+        *[send(args, device, device_metas, sent) for device, device_metas in metas.items()])
+    send_seconds = time.perf_counter() - start
+
+    # wait for results in flight
+    deadline = time.perf_counter() + args.drain_timeout
+    while len(latencies) < len(sent) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    stop.set()
+    await subscriber
+
+    report = {
+        'protocol': args.protocol,
+        'devices': args.devices,
+        'sent': len(sent),
+        'received': len(latencies),
+        'lost': len(sent) - len(latencies),
+        'send_seconds': send_seconds,
+        'messages_per_second': len(sent) / send_seconds if send_seconds > 0 else 0.0
+    }
+    if args.protocol == 'http':
+        report['rejected'] = sum(returns)
+    if latencies:
+        latencies.sort()
+        report['latency_ms'] = {
+            'mean': statistics.mean(latencies) * 1000.0,
+            'p50': latencies[len(latencies) // 2] * 1000.0,
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000.0,
+            'max': latencies[-1] * 1000.0
+        }
+    return report
+
+
+def main():
+    """ingest load test main process
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--tcp_port', type=int, default=9000)
+    parser.add_argument('--http_port', type=int, default=9080)
+    parser.add_argument('--publish_port', type=int, default=9001)
+    parser.add_argument('--protocol', type=str, default='tcp', choices=('tcp', 'http'))
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=10.0, help='messages per second per device')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min_boxes', type=int, default=0)
+    parser.add_argument('--max_boxes', type=int, default=20)
+    parser.add_argument('--drain_timeout', type=float, default=10.0)
+    parser.add_argument('--output', type=str, default='')
+    args = parser.parse_args()
+
+    if args.rate <= 0 or args.duration <= 0:
+        raise ValueError('rate and duration must be larger than 0')
+
+    report = asyncio.run(_run(args))
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import statistics
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import synthetic_data
+import count_cache
+import crowd_count
+import crowd_count_output
+import local_data_loader
+import meta_serializer
+
+
+def _measure(func, frame_num, repeat):
+    timings = timeit.repeat(func, number=1, repeat=repeat)
+    best = min(timings) / frame_num
+    median = statistics.median(timings) / frame_num
+    return {
+        'frames': frame_num,
+        'repeat': repeat,
+        'seconds_per_frame': best,
+        'median_seconds_per_frame': median,
+        'frames_per_second': 1.0 / best if best > 0 else 0.0
+    }
+
+
+def _schema_benchmarks(args, generator_config):
+    results = {}
+
+    # same detection results in both schemas
+    generator = synthetic_data.SyntheticDetectionGenerator(generator_config)
+    dict_metas = [generator.detections() for _ in range(args.frames)]
+    metas = [generator.serialize(dict_meta) for dict_meta in dict_metas]
+    compact_metas = [generator.serialize_compact(dict_meta) for dict_meta in dict_metas]
+    counter = crowd_count.CrowdCount(synthetic_data.make_param(seed=args.seed))
+
+    serializer = meta_serializer.MetaSerializer()
+    compact_serializer = meta_serializer.MetaSerializer('compact')
+    results['serialize'] = _measure(
+        lambda: [serializer(dict_meta) for dict_meta in dict_metas],
+        args.frames, args.repeat)
+    results['serialize_compact'] = _measure(
+        lambda: [compact_serializer(dict_meta) for dict_meta in dict_metas],
+        args.frames, args.repeat)
+    results['deserialize_arrays'] = _measure(
+        lambda: [counter.deserialize_meta_arrays(meta) for meta in metas],
+        args.frames, args.repeat)
+    results['deserialize_compact'] = _measure(
+        lambda: [counter.deserialize_meta_data(meta) for meta in compact_metas],
+        args.frames, args.repeat)
+    results['deserialize_compact_arrays'] = _measure(
+        lambda: [counter.deserialize_meta_arrays(meta) for meta in compact_metas],
+        args.frames, args.repeat)
+
+    wire_size = {
+        'object_detection_top_bytes_per_frame':
+            sum(len(meta) for meta in metas) / args.frames,
+        'compact_bytes_per_frame':
+            sum(len(meta) for meta in compact_metas) / args.frames
+    }
+    return results, wire_size
+
+
+def _micro_benchmarks(args, metas):
+    results = {}
+    frame_num = len(metas)
+
+    param = synthetic_data.make_param(
+        area_num=args.area_num, point_num=args.point_nums[0], seed=args.seed)
+    counter = crowd_count.CrowdCount(param)
+
+    bbox_arrays = [counter.deserialize_meta_data(meta) for meta in metas]
+    filtered = [counter._remove_low_conf(bbox_array) for bbox_array in bbox_arrays]
+    positiones_list = [counter._bbox2point(bboxes) for bboxes, _ in filtered]
+    counts = [counter._inpolygon(positiones) for positiones in positiones_list]
+
+    results['deserialize'] = _measure(
+        lambda: [counter.deserialize_meta_data(meta) for meta in metas],
+        frame_num, args.repeat)
+    results['remove_low_conf'] = _measure(
+        lambda: [counter._remove_low_conf(bbox_array) for bbox_array in bbox_arrays],
+        frame_num, args.repeat)
+    results['bbox2point'] = _measure(
+        lambda: [counter._bbox2point(bboxes) for bboxes, _ in filtered],
+        frame_num, args.repeat)
+
+    for point_num in args.point_nums:
+        polygon_counter = crowd_count.CrowdCount(synthetic_data.make_param(
+            area_num=args.area_num, point_num=point_num, seed=args.seed))
+        results[f'inpolygon_{point_num}pt'] = _measure(
+            lambda: [polygon_counter._inpolygon(positiones)
+                     for positiones in positiones_list],
+            frame_num, args.repeat)
+
+    def run_stabilizer():
+        counter.reset_iir()
+        for area_num, count in counts:
+            counter._stabilizer(area_num, count)
+    results['stabilizer'] = _measure(run_stabilizer, frame_num, args.repeat)
+
+    def run_crowd_count():
+        counter.reset_iir()
+        for meta in metas:
+            counter(meta)
+    results['crowd_count'] = _measure(run_crowd_count, frame_num, args.repeat)
+
+    def run_crowd_count_cached():
+        cached_counter = crowd_count.CrowdCount(
+            param, count_cache=count_cache.CountCache({'max_entries': 1024}))
+        for meta in metas:
+            cached_counter(meta)
+    results['crowd_count_cached'] = _measure(
+        run_crowd_count_cached, frame_num, args.repeat)
+
+    return results
+
+
+def _local_benchmark(args, generator, work_dir):
+    meta_file = os.path.join(work_dir, 'synthetic.csv')
+    generator.write_csv(meta_file, args.frames)
+    param = synthetic_data.make_param(
+        area_num=args.area_num, point_num=args.point_nums[0], seed=args.seed)
+    output_config = {
+        'output_dir': os.path.join(work_dir, 'output'),
+        'output_video_fps': 30,
+        'output_video_width': 1920,
+        'output_video_height': 1080
+    }
+
+    load_timings = []
+    total_timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        loader = local_data_loader.LocalDataLoader(
+            {'video_file': '', 'meta_file': meta_file})
+        counter = crowd_count.CrowdCount(param)
+        writer = crowd_count_output.CrowdCountOutput(
+            output_config, loader.get_image_info(), counter.get_param_info())
+        _, meta_list, _ = loader()
+        loaded = time.perf_counter()
+        for meta in meta_list:
+            writer(counter(meta))
+        del writer
+        end = time.perf_counter()
+        load_timings.append(loaded - start)
+        total_timings.append(end - start)
+
+    best = min(total_timings)
+    return {
+        'frames': args.frames,
+        'repeat': args.repeat,
+        'load_seconds': min(load_timings),
+        'total_seconds': best,
+        'median_total_seconds': statistics.median(total_timings),
+        'frames_per_second': args.frames / best if best > 0 else 0.0
+    }
+
+
+def _compare(results, baseline_file):
+    with open(baseline_file, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    print(f"{'benchmark':<24} {'baseline fps':>14} {'current fps':>14} {'ratio':>8}")
+    for name, result in results['results'].items():
+        if name not in baseline.get('results', {}):
+            continue
+        base_fps = baseline['results'][name]['frames_per_second']
+        fps = result['frames_per_second']
+        ratio = fps / base_fps if base_fps > 0 else 0.0
+        print(f'{name:<24} {base_fps:>14.1f} {fps:>14.1f} {ratio:>7.2f}x')
+
+
+def main():
+    """benchmark main process
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min_boxes', type=int, default=0)
+    parser.add_argument('--max_boxes', type=int, default=20)
+    parser.add_argument('--score_distribution', type=str, default='uniform',
+                        choices=synthetic_data.SyntheticDetectionGenerator.SCORE_DISTRIBUTIONS)
+    parser.add_argument('--static_ratio', type=float, default=0.0)
+    parser.add_argument('--area_num', type=int, default=2)
+    parser.add_argument('--point_nums', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--skip_local', action='store_true')
+    parser.add_argument('--output', type=str, default='benchmark_results.json')
+    parser.add_argument('--compare', type=str, default='')
+    args = parser.parse_args()
+
+    generator_config = {
+        'seed': args.seed,
+        'min_boxes': args.min_boxes,
+        'max_boxes': args.max_boxes,
+        'score_distribution': args.score_distribution,
+        'static_ratio': args.static_ratio
+    }
+    generator = synthetic_data.SyntheticDetectionGenerator(generator_config)
+    metas = generator.flatbuffers(args.frames)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor()
+        },
+        'settings': vars(args),
+        'results': _micro_benchmarks(args, metas)
+    }
+
+    schema_results, wire_size = _schema_benchmarks(args, generator_config)
+    results['results'].update(schema_results)
+    results['wire_size'] = wire_size
+
+    if not args.skip_local:
+        with tempfile.TemporaryDirectory() as work_dir:
+            local_generator = synthetic_data.SyntheticDetectionGenerator(generator_config)
+            results['results']['local_end_to_end'] = _local_benchmark(
+                args, local_generator, work_dir)
+
+    for name, result in results['results'].items():
+        print(f"{name:<24} {result['frames_per_second']:>12.1f} frames/s")
+    for name, size in results['wire_size'].items():
+        print(f'{name:<40} {size:>8.1f}')
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
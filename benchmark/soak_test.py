@@ -0,0 +1,266 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import io
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import subprocess
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import stage_metrics
+import timestamp_util
+import memory_profiler
+import crowd_count_app
+import console_mock
+
+
+def _merge_histogram(histogram, stats):
+    histogram.count += stats['count']
+    histogram.total += stats['total']
+    if stats['count']:
+        if histogram.min == 0.0 or stats['min'] < histogram.min:
+            histogram.min = stats['min']
+        histogram.max = max(histogram.max, stats['max'])
+    histogram.buckets = [
+        count + added for count, added in zip(histogram.buckets, stats['buckets'])]
+
+
+def _latency_ms(histogram):
+    stats = histogram.to_dict()
+    return {
+        name: stats[name] * 1000.0 for name in ('mean', 'p50', 'p90', 'p99', 'max')}
+
+
+def _make_config(args, work_dir, first_timestamp):
+    config = copy.deepcopy(crowd_count_app.load_config(args.config_path))
+    config['data_source_settings']['mode'] = 'console'
+    console_settings = {'device_id': args.device_id}
+    if args.images:
+        console_settings['sub_directory_name'] = args.sub_directory_name
+        console_settings['number_of_images'] = args.batch
+    else:
+        console_settings['sub_directory_name'] = ''
+        console_settings['number_of_inference_results'] = args.batch
+        console_settings['first_timestamp'] = first_timestamp
+        console_settings['last_timestamp'] = ''
+    config['data_source_settings']['console_data_settings'] = console_settings
+
+    # outputs of every iteration go to the work directory
+    config['output_settings']['output_dir'] = os.path.join(work_dir, 'output')
+    config['metrics_settings'] = {
+        'enable': True, 'summary_interval': 0, 'http_port': 0,
+        'dump_file': os.path.join(work_dir, 'metrics.json')}
+    for section in ('checkpoint_settings', 'memory_profile_settings', 'pipeline_settings',
+                    'thumbnail_settings', 'heatmap_settings', 'occupancy_settings',
+                    'result_store_settings'):
+        config.pop(section, None)
+    config['crowd_count_settings']['reload_interval'] = 0
+    return config
+
+
+def _start_mock(args):
+    command = [
+        sys.executable, os.path.join(os.path.dirname(__file__), 'console_mock.py'),
+        '--port', str(args.port), '--device_id', args.device_id,
+        '--sub_directory_name', args.sub_directory_name,
+        '--rate', str(args.rate), '--image_width', str(args.image_width),
+        '--image_height', str(args.image_height), '--max_boxes', str(args.max_boxes),
+        '--response_delay', str(args.response_delay), '--error_rate', str(args.error_rate),
+        # images are fetched oldest first, so only the latest batch is kept
+        '--retention_frames', str(args.batch if args.images else args.retention_frames)]
+    # the stand-in runs in another process so that it does not share the GIL
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    process.stdout.readline()
+    return process, f'http://127.0.0.1:{args.port}'
+
+
+def soak(args):
+    """run the application against Console repeatedly
+
+    Args:
+        args (argparse.Namespace): arguments
+
+    Returns:
+        dict: throughput, latency percentiles and memory growth
+    """
+    mock_process = None
+    endpoint = args.endpoint
+    if not endpoint:
+        mock_process, endpoint = _start_mock(args)
+    client = console_mock.ConsoleMockClient(endpoint)
+
+    frame_latency = stage_metrics.LatencyHistogram()
+    fetch_latency = stage_metrics.LatencyHistogram()
+    iteration_latency = stage_metrics.LatencyHistogram()
+    age_latency = stage_metrics.LatencyHistogram()
+    timeline = []
+    errors = []
+    frames = 0
+    first_timestamp = console_mock.format_timestamp(time.time())
+    timeline_file = None
+    if args.timeline:
+        timeline_file = open(args.timeline, 'w', encoding='utf-8')
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    start = time.perf_counter()
+    iteration = 0
+    try:
+        while time.perf_counter() - start < args.duration:
+            iteration_start = time.perf_counter()
+            config = _make_config(args, args.work_dir, first_timestamp)
+            record = {'iteration': iteration, 'elapsed': iteration_start - start}
+            try:
+                # the application prints its summary on every run
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = crowd_count_app.run(
+                        config, no_progress=True, console_client=client)
+            except (ValueError, RuntimeError) as error:
+                errors.append({'iteration': iteration, 'error': str(error)})
+                record['error'] = str(error)
+                result = None
+            seconds = time.perf_counter() - iteration_start
+
+            if result is not None:
+                with open(config['metrics_settings']['dump_file'], 'r', encoding='utf-8') as file:
+                    metrics = json.load(file)
+                if 'frame' in metrics['stages']:
+                    _merge_histogram(frame_latency, metrics['stages']['frame'])
+                if 'loader_fetch' in metrics['stages']:
+                    _merge_histogram(fetch_latency, metrics['stages']['loader_fetch'])
+                iteration_latency.observe(seconds)
+                frames += result['frames']
+                record['frames'] = result['frames']
+                record['seconds'] = seconds
+                record['frames_per_second'] = result['frames'] / seconds if seconds > 0 else 0.0
+                last_timestamp = result['timestamp']
+                if last_timestamp is not None:
+                    # how old the newest result is when it has been written
+                    age = time.time() - last_timestamp / 1000.0
+                    age_latency.observe(max(0.0, age))
+                    record['age'] = age
+                    if not args.images:
+                        # first timestamp after the last processed one
+                        first_timestamp = timestamp_util.to_string(last_timestamp + 1)
+
+            record['rss_bytes'] = memory_profiler.rss_bytes()
+            timeline.append(record)
+            if timeline_file is not None:
+                timeline_file.write(json.dumps(record) + '\n')
+                timeline_file.flush()
+            if not args.keep_output:
+                shutil.rmtree(config['output_settings']['output_dir'], ignore_errors=True)
+            print(f"[soak] {iteration:>6} frames={record.get('frames', 0):<5} "
+                  f"fps={record.get('frames_per_second', 0.0):8.1f} "
+                  f"age={record.get('age', 0.0):6.2f}s "
+                  f"rss={record['rss_bytes'] / 2**20:7.1f}MB"
+                  + (f" error={record['error']}" if 'error' in record else ''), flush=True)
+
+            iteration += 1
+            delay = args.interval - (time.perf_counter() - iteration_start)
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        if timeline_file is not None:
+            timeline_file.close()
+        if mock_process is not None:
+            mock_process.terminate()
+            mock_process.wait()
+
+    elapsed = time.perf_counter() - start
+    report = {
+        'settings': vars(args),
+        'iterations': iteration,
+        'errors': len(errors),
+        'frames': frames,
+        'seconds': elapsed,
+        'frames_per_second': frames / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'frame': _latency_ms(frame_latency),
+            'loader_fetch': _latency_ms(fetch_latency),
+            'request': _latency_ms(client.latency),
+            'iteration': _latency_ms(iteration_latency),
+            'age': _latency_ms(age_latency)
+        },
+        'error_messages': errors[:20]
+    }
+
+    # memory growth after the first tenth, which includes warm up
+    samples = [(record['elapsed'], record['rss_bytes']) for record in timeline]
+    samples = samples[len(samples) // 10:]
+    if len(samples) >= 2:
+        samples = np.asarray(samples, dtype=np.float64)
+        slope = float(np.polyfit(samples[:, 0], samples[:, 1], 1)[0])
+        report['memory'] = {
+            'first_rss_bytes': int(samples[0, 1]),
+            'last_rss_bytes': int(samples[-1, 1]),
+            'max_rss_bytes': int(samples[:, 1].max()),
+            'rss_bytes_per_hour': slope * 3600.0
+        }
+    return report
+
+
+def main():
+    """soak test main process
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config_path', type=str, default='./config/crowd_count_app.yaml')
+    parser.add_argument('--endpoint', type=str, default='',
+                        help='url of a running console_mock.py, empty to start one')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--device_id', type=str, default='mock_device')
+    parser.add_argument('--sub_directory_name', type=str, default='mock')
+    parser.add_argument('--images', action='store_true', help='fetch images and metas')
+    parser.add_argument('--duration', type=float, default=3600.0, help='seconds')
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help='seconds between the starts of runs')
+    parser.add_argument('--batch', type=int, default=100,
+                        help='number of images or inference results per run')
+    parser.add_argument('--rate', type=float, default=10.0, help='frames per second of the device')
+    parser.add_argument('--retention_frames', type=int, default=10000)
+    parser.add_argument('--image_width', type=int, default=1920)
+    parser.add_argument('--image_height', type=int, default=1080)
+    parser.add_argument('--max_boxes', type=int, default=20)
+    parser.add_argument('--response_delay', type=float, default=0.0)
+    parser.add_argument('--error_rate', type=float, default=0.0)
+    parser.add_argument('--work_dir', type=str, default='output/soak')
+    parser.add_argument('--keep_output', action='store_true')
+    parser.add_argument('--timeline', type=str, default='', help='json lines of every run')
+    parser.add_argument('--output', type=str, default='soak_results.json')
+    args = parser.parse_args()
+
+    if args.duration <= 0 or args.batch < 1:
+        raise ValueError('duration must be larger than 0 and batch must be 1 or more')
+
+    report = soak(args)
+    print(json.dumps({key: value for key, value in report.items() if key != 'settings'},
+                     indent=4))
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import csv
+import math
+import json
+import random
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import compact_meta
+import local_data_loader
+
+
+class SyntheticDetectionGenerator() :
+    """generate synthetic human detection results
+
+    Args:
+        config (dict, optional): generator settings. Defaults to None.
+    """
+
+    SCORE_DISTRIBUTIONS = ('uniform', 'high', 'low', 'bimodal')
+
+    def __init__(self, config=None):
+        if config is None:
+            config = {}
+
+        # Get parameter from config
+        self._seed = config.get('seed', 0)
+        self._min_boxes = config.get('min_boxes', 0)
+        self._max_boxes = config.get('max_boxes', 10)
+        self._score_distribution = config.get('score_distribution', 'uniform')
+        self._image_width = config.get('image_width', 1920)
+        self._image_height = config.get('image_height', 1080)
+        self._min_box_height = config.get('min_box_height', 50)
+        self._max_box_height = config.get('max_box_height', 500)
+        self._static_ratio = config.get('static_ratio', 0.0)
+        self._random = random.Random(self._seed)
+        self._previous = None
+
+        # parameter range check
+        if self._min_boxes < 0 or self._max_boxes < self._min_boxes:
+            raise ValueError('min_boxes and max_boxes must be 0 <= min_boxes <= max_boxes')
+        if self._score_distribution not in self.SCORE_DISTRIBUTIONS:
+            raise ValueError(
+                f'score_distribution should be one of {self.SCORE_DISTRIBUTIONS}')
+        if not 0.0 <= self._static_ratio <= 1.0:
+            raise ValueError('static_ratio must be set in the range of 0 to 1')
+
+        # serializer of the application is reused as the reference encoder
+        self._serializer = local_data_loader.LocalDataLoader(
+            {'video_file': '', 'meta_file': ''})
+
+    def detections(self):
+        """generate detection result of one frame
+
+        With static_ratio, the boxes of the previous frame are repeated with
+        only score jitter, like a static scene.
+
+        Returns:
+            dict: detection result in the same format as the csv input
+        """
+        if self._previous is not None \
+            and self._random.random() < self._static_ratio:
+            object_list = []
+            for general_object in self._previous['perception']['object_detection_list']:
+                jittered = dict(general_object)
+                jittered['score'] = min(
+                    1.0, max(0.0, general_object['score'] + self._random.uniform(-1e-4, 1e-4)))
+                object_list.append(jittered)
+        else:
+            object_list = [
+                self._general_object()
+                for _ in range(self._random.randint(self._min_boxes, self._max_boxes))]
+
+        dict_meta = {'perception': {'object_detection_list': object_list}}
+        self._previous = dict_meta
+        return dict_meta
+
+    def serialize(self, dict_meta):
+        """serialize detection result to ObjectDetectionTop flatbuffers
+
+        Args:
+            dict_meta (dict): detection result
+
+        Returns:
+            bytes: serialized meta data
+        """
+        return self._serializer._serialize_meta_data(dict_meta)
+
+    def serialize_compact(self, dict_meta):
+        """serialize detection result to ObjectDetectionCompact flatbuffers
+
+        Boxes are stored in reverse order, which is the order
+        ObjectDetectionTop from serialize() is decoded in.
+
+        Args:
+            dict_meta (dict): detection result
+
+        Returns:
+            bytes: serialized meta data
+        """
+        object_list = dict_meta['perception']['object_detection_list'][::-1]
+        return compact_meta.serialize_compact(
+            [[general_object['bounding_box']['left'],
+              general_object['bounding_box']['top'],
+              general_object['bounding_box']['right'],
+              general_object['bounding_box']['bottom']]
+             for general_object in object_list],
+            [general_object['score'] for general_object in object_list],
+            [general_object['class_id'] for general_object in object_list])
+
+    def flatbuffers(self, frame_num, schema='object_detection_top'):
+        """generate serialized detection results
+
+        Args:
+            frame_num (int): number of frames
+            schema (str, optional): 'object_detection_top' or 'compact'.
+                Defaults to 'object_detection_top'.
+
+        Returns:
+            list: list of serialized meta data
+        """
+        if schema == 'compact':
+            serialize = self.serialize_compact
+        elif schema == 'object_detection_top':
+            serialize = self.serialize
+        else:
+            raise ValueError(f'{schema} is not supported')
+        return [serialize(self.detections()) for _ in range(frame_num)]
+
+    def write_csv(self, file_path, frame_num):
+        """write detection results in the csv input format of LocalDataLoader
+
+        Args:
+            file_path (str): output csv file
+            frame_num (int): number of frames
+        """
+        with open(file_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(list(range(10)))
+            for frame in range(frame_num):
+                writer.writerow([frame, json.dumps(self.detections())])
+
+    def _general_object(self):
+        height = self._random.randint(self._min_box_height, self._max_box_height)
+        width = max(1, int(height * self._random.uniform(0.3, 0.6)))
+        left = self._random.randint(0, max(0, self._image_width - width))
+        top = self._random.randint(0, max(0, self._image_height - height))
+        return {
+            'class_id': 0,
+            'bounding_box': {
+                'left': left,
+                'top': top,
+                'right': left + width,
+                'bottom': top + height
+            },
+            'score': self._score()
+        }
+
+    def _score(self):
+        if self._score_distribution == 'high':
+            return self._random.betavariate(8.0, 1.0)
+        if self._score_distribution == 'low':
+            return self._random.betavariate(1.0, 8.0)
+        if self._score_distribution == 'bimodal':
+            if self._random.random() < 0.5:
+                return self._random.betavariate(8.0, 1.0)
+            return self._random.betavariate(1.0, 8.0)
+        return self._random.random()
+
+
+def make_polygon(point_num, center, radius, seed=0):
+    """make a simple (star shaped) polygon
+
+    Args:
+        point_num (int): number of vertices
+        center (list): center of polygon (x, y)
+        radius (float): maximum distance from center to vertex
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        list: vertices of polygon in clockwise direction on image coordinates
+    """
+    rand = random.Random(seed)
+    polygon = []
+    for i in range(point_num):
+        angle = 2.0 * math.pi * i / point_num
+        distance = radius * rand.uniform(0.5, 1.0)
+        polygon.append([
+            int(center[0] + distance * math.cos(angle)),
+            int(center[1] + distance * math.sin(angle))])
+    return polygon
+
+
+def make_param(area_num=2, point_num=4, image_width=1920, image_height=1080,
+               iir_up_ratio=0.2, iir_down_ratio=0.9, seed=0):
+    """make crowd count parameter with synthetic areas
+
+    Args:
+        area_num (int, optional): number of areas. Defaults to 2.
+        point_num (int, optional): number of vertices per area. Defaults to 4.
+        image_width (int, optional): image width. Defaults to 1920.
+        image_height (int, optional): image height. Defaults to 1080.
+        iir_up_ratio (float, optional): stabilizer parameter. Defaults to 0.2.
+        iir_down_ratio (float, optional): stabilizer parameter. Defaults to 0.9.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        dict: parameter for CrowdCount
+    """
+    area_point = []
+    for area in range(area_num):
+        center = [
+            image_width * (area + 1) / (area_num + 1), image_height / 2]
+        radius = min(image_width / (area_num + 1), image_height) / 2
+        area_point.append(make_polygon(point_num, center, radius, seed + area))
+
+    return {
+        'remove_low_conf': {
+            'min_detect_score': 0.3,
+            'max_height': image_height,
+            'min_height': 0
+        },
+        'bbox2point': {
+            'bbox_to_point_ratio': 0.9
+        },
+        'inpolygon': {
+            'area_num': area_num,
+            'area_point_len': [point_num] * area_num,
+            'area_point': area_point
+        },
+        'stabilizer': {
+            'iir_up_ratio': iir_up_ratio,
+            'iir_down_ratio': iir_down_ratio
+        }
+    }
@@ -0,0 +1,429 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import copy
+import json
+import time
+import argparse
+import traceback
+import contextlib
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+import crowd_count_app
+
+META_EXTENSIONS = {'.csv': 'csv', '.fba': 'archive'}
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+SUMMARY_FILE = 'batch_summary.json'
+
+# memory of one job without decoded video frames
+_BASE_JOB_MEMORY = 256 * 1024 * 1024
+
+
+def discover_jobs(input_dir):
+    """find pairs of metadata and video in a directory tree
+
+    A metadata file (.csv, or .fba of meta_archive) is paired with the
+    video of the same name in the same directory. The video is optional.
+
+    Args:
+        input_dir (str): input directory
+
+    Returns:
+        list: jobs (dict of name, meta_file, meta_format and video_file)
+    """
+    jobs = []
+    for directory, directory_names, file_names in os.walk(input_dir):
+        # same order on every run, so that names are kept on resume
+        directory_names.sort()
+        file_set = set(file_names)
+        for file_name in sorted(file_names):
+            stem, extension = os.path.splitext(file_name)
+            if extension.lower() not in META_EXTENSIONS:
+                continue
+            video_file = ''
+            for video_extension in VIDEO_EXTENSIONS:
+                if stem + video_extension in file_set:
+                    video_file = os.path.join(directory, stem + video_extension)
+                    break
+            relative = os.path.relpath(os.path.join(directory, stem), input_dir)
+            jobs.append({
+                'name': relative.replace(os.sep, '_'),
+                'meta_file': os.path.join(directory, file_name),
+                'meta_format': META_EXTENSIONS[extension.lower()],
+                'video_file': video_file
+            })
+
+    # the same name from different meta formats would share an output directory
+    names = [job['name'] for job in jobs]
+    for job in jobs:
+        if names.count(job['name']) > 1:
+            job['name'] += '_' + job['meta_format']
+
+    # different paths may still have the same name (a_b/c and a/b_c)
+    used = set()
+    for job in jobs:
+        name = job['name']
+        number = 2
+        while name in used:
+            name = f"{job['name']}_{number}"
+            number += 1
+        job['name'] = name
+        used.add(name)
+    return jobs
+
+
+def estimate_job_memory(job):
+    """estimate memory of one job
+
+    The local data loader keeps all decoded frames of the video in memory.
+
+    Args:
+        job (dict): job
+
+    Returns:
+        int: bytes
+    """
+    memory = _BASE_JOB_MEMORY + 4 * os.path.getsize(job['meta_file'])
+    if job['video_file']:
+        import cv2
+        capture = cv2.VideoCapture(job['video_file'])
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        capture.release()
+        memory += frames * width * height * 3
+    return memory
+
+
+def available_memory():
+    """get available memory of the system
+
+    Returns:
+        int: bytes, 0 if unknown
+    """
+    try:
+        with open('/proc/meminfo', 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def make_job_config(base_config, job, job_dir):
+    """make application config of one job
+
+    Input files are replaced by the files of the job, and every output
+    is written in the job directory so that jobs never share a file.
+
+    Args:
+        base_config (dict): application config
+        job (dict): job
+        job_dir (str): output directory of the job
+
+    Returns:
+        dict: application config of the job
+    """
+    config = copy.deepcopy(base_config)
+    data_source = config.setdefault('data_source_settings', {})
+    data_source['mode'] = 'local'
+    local_settings = data_source.setdefault('local_data_settings', {})
+    local_settings['video_file'] = job['video_file']
+    local_settings['meta_file'] = job['meta_file']
+    local_settings['meta_format'] = job['meta_format']
+
+    config['output_settings']['output_dir'] = job_dir
+    if 'checkpoint_settings' in config \
+        and config['checkpoint_settings'].get('enable', False):
+        config['checkpoint_settings']['checkpoint_file'] = \
+            os.path.join(job_dir, 'checkpoint.json')
+
+    # periodic reports and http servers of many processes are not useful
+    metrics_settings = config.get('metrics_settings')
+    if metrics_settings:
+        metrics_settings['summary_interval'] = 0
+        metrics_settings['http_port'] = 0
+        metrics_settings['dump_file'] = os.path.join(job_dir, 'metrics.json')
+    thumbnail_settings = config.get('thumbnail_settings')
+    if thumbnail_settings:
+        thumbnail_settings['http_port'] = 0
+
+    output_paths = (
+        ('result_store_settings', 'store_dir', 'result_store'),
+        ('occupancy_settings', 'output_file', 'occupancy.jsonl'),
+        ('heatmap_settings', 'snapshot_dir', 'heatmap'),
+        ('thumbnail_settings', 'output_dir', 'thumbnail'),
+        ('memory_profile_settings', 'report_file', 'memory_profile.json'))
+    for section, key, name in output_paths:
+        if config.get(section) and config[section].get(key):
+            config[section][key] = os.path.join(job_dir, name)
+    return config
+
+
+def _init_worker():
+    # jobs run in parallel, so each job uses one thread of OpenCV
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+def _run_job(config, log_file, resume):
+    # output of the job is written to its log file
+    start = time.perf_counter()
+    with open(log_file, 'a', encoding='utf-8') as log, \
+        contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            result = crowd_count_app.run(config, resume=resume, no_progress=True)
+        except Exception:  # pylint: disable=broad-except
+            # a broken input fails only its own job
+            error = traceback.format_exc()
+            log.write(error)
+            return {
+                'status': 'failed',
+                'error': error.strip().splitlines()[-1],
+                'wall_seconds': time.perf_counter() - start
+            }
+    result['status'] = 'done'
+    result['wall_seconds'] = time.perf_counter() - start
+    return result
+
+
+class BatchRunner() :
+    """process pairs of metadata and video in parallel processes
+
+    Jobs are started from the largest, as long as the estimated memory
+    of the running jobs fits in the memory budget, so that all workers
+    stay busy until the end. A failed job is recorded in the summary and
+    does not stop the others, and jobs in a worker process which died
+    are retried in a new pool.
+
+    Args:
+        config (dict): batch settings
+        app_config (dict): application config used for every job
+    """
+
+    def __init__(self, config, app_config):
+
+        # Get parameter from config
+        self._input_dir = config.get('input_dir', 'input/batch')
+        self._output_dir = config.get('output_dir', 'output/batch')
+        self._workers = config.get('workers', 0)
+        self._memory_per_job_mb = config.get('memory_per_job_mb', 0)
+        self._memory_fraction = config.get('memory_fraction', 0.8)
+        self._retries = config.get('retries', 1)
+
+        # Check parameter
+        if not os.path.isdir(self._input_dir):
+            raise ValueError(f'cannot open {self._input_dir}')
+        if self._workers < 0:
+            raise ValueError('workers must be 0 (number of cores) or more')
+        if not 0.0 < self._memory_fraction <= 1.0:
+            raise ValueError('memory_fraction must be set in the range of 0 (excluded) to 1')
+        if self._retries < 0:
+            raise ValueError('retries must be 0 or more')
+
+        if self._workers == 0:
+            self._workers = os.cpu_count() or 1
+        self._app_config = app_config
+
+    def __call__(self, resume=False):
+        """run all jobs
+
+        Args:
+            resume (bool, optional): skip finished jobs of the previous summary
+                and resume the others from checkpoint. Defaults to False.
+
+        Returns:
+            dict: summary report
+        """
+        os.makedirs(self._output_dir, exist_ok=True)
+        summary_file = os.path.join(self._output_dir, SUMMARY_FILE)
+        results = {}
+        if resume and os.path.exists(summary_file):
+            with open(summary_file, 'r', encoding='utf-8') as file:
+                results = {
+                    job['name']: job for job in json.load(file)['jobs']
+                    if job['status'] == 'done'}
+        finished = set(results)
+        resume_jobs = resume and 'checkpoint_settings' in self._app_config \
+            and self._app_config['checkpoint_settings'].get('enable', False)
+
+        jobs = [job for job in discover_jobs(self._input_dir) if job['name'] not in results]
+        for job in jobs:
+            if self._memory_per_job_mb > 0:
+                job['memory'] = self._memory_per_job_mb * 1024 * 1024
+            else:
+                job['memory'] = estimate_job_memory(job)
+            job['attempts'] = 0
+        # longest jobs first, so that short jobs fill the end
+        jobs.sort(key=lambda job: job['memory'], reverse=True)
+
+        budget = available_memory() * self._memory_fraction
+        print(f'[batch] {len(jobs)} jobs, {self._workers} workers, '
+              f'memory budget {budget / 2**20:.0f}MB')
+
+        start = time.perf_counter()
+        pending = list(jobs)
+        running = {}
+        pool = futures.ProcessPoolExecutor(self._workers, initializer=_init_worker)
+        try:
+            while pending or running:
+                self._submit(pool, pending, running, budget, resume_jobs)
+                done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        if job['attempts'] <= self._retries:
+                            job['isolate'] = True
+                            pending.append(job)
+                            continue
+                        result = {'status': 'failed', 'error': 'worker process died'}
+                    results[job['name']] = self._record(job, result)
+                    print(f"[batch] {job['name']}: {result['status']} "
+                          f"({len(results)}/{len(results) + len(pending) + len(running)})")
+
+                if broken:
+                    # all jobs of a broken pool fail, run them again one by one
+                    # in a new pool to find the job which broke it
+                    for future, job in running.items():
+                        if job['attempts'] <= self._retries:
+                            job['isolate'] = True
+                            pending.append(job)
+                        else:
+                            results[job['name']] = self._record(
+                                job, {'status': 'failed', 'error': 'worker process died'})
+                    running = {}
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = futures.ProcessPoolExecutor(
+                        self._workers, initializer=_init_worker)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        summary = self._summary(results, finished, time.perf_counter() - start)
+        with open(summary_file + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=4)
+        os.replace(summary_file + '.tmp', summary_file)
+        return summary
+
+    def _submit(self, pool, pending, running, budget, resume):
+        if any(job.get('isolate') for job in running.values()):
+            return
+        used = sum(job['memory'] for job in running.values())
+        index = 0
+        while index < len(pending) and len(running) < self._workers:
+            job = pending[index]
+            # a job larger than the budget runs alone
+            if running and (job.get('isolate') \
+                or budget > 0 and used + job['memory'] > budget):
+                index += 1
+                continue
+            pending.pop(index)
+            job_dir = os.path.join(self._output_dir, job['name'])
+            os.makedirs(job_dir, exist_ok=True)
+            job_config = make_job_config(self._app_config, job, job_dir)
+            job['attempts'] += 1
+            future = pool.submit(
+                _run_job, job_config, os.path.join(job_dir, 'log.txt'),
+                resume or (job['attempts'] > 1 and 'checkpoint_settings' in job_config
+                           and job_config['checkpoint_settings'].get('enable', False)))
+            running[future] = job
+            used += job['memory']
+            if job.get('isolate'):
+                break
+
+    def _record(self, job, result):
+        record = {
+            'name': job['name'],
+            'meta_file': job['meta_file'],
+            'video_file': job['video_file'],
+            'attempts': job['attempts'],
+            'estimated_memory_mb': job['memory'] / 2**20
+        }
+        record.update(result)
+        if record.get('seconds'):
+            processed = record['frames'] - record['start_frame']
+            record['frames_per_second'] = processed / record['seconds']
+        return record
+
+    def _summary(self, results, finished, seconds):
+        jobs = sorted(results.values(), key=lambda job: job['name'])
+        done = [job for job in jobs if job['status'] == 'done']
+        # jobs finished by a previous run are not included in the speed
+        frames = sum(
+            job['frames'] - job['start_frame'] for job in done if job['name'] not in finished)
+        return {
+            'total': {
+                'jobs': len(jobs),
+                'done': len(done),
+                'failed': len(jobs) - len(done),
+                'skipped': len(finished),
+                'frames': frames,
+                'seconds': seconds,
+                'frames_per_second': frames / seconds if seconds > 0 else 0.0,
+                'workers': self._workers
+            },
+            'jobs': jobs
+        }
+
+
+def main():
+    """batch main process
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config_path', type=str, default='config/crowd_count_app.yaml')
+    parser.add_argument('--input_dir', type=str, default=None)
+    parser.add_argument('--output_dir', type=str, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--resume', action='store_true',
+                        help='skip finished jobs and resume the others')
+    args = parser.parse_args()
+
+    app_config = crowd_count_app.load_config(args.config_path)
+    batch_config = dict(app_config.get('batch_settings', {}))
+    for key in ('input_dir', 'output_dir', 'workers'):
+        if getattr(args, key) is not None:
+            batch_config[key] = getattr(args, key)
+
+    summary = BatchRunner(batch_config, app_config)(args.resume)
+
+    for job in summary['jobs']:
+        if job['status'] == 'done':
+            print(f"[batch] {job['name']:<32} done   {job['frames']:>8} frames "
+                  f"{job['wall_seconds']:8.1f}s")
+        else:
+            print(f"[batch] {job['name']:<32} failed {job['error']}")
+    total = summary['total']
+    print(f"[batch] {total['done']}/{total['jobs']} jobs done, {total['frames']} frames "
+          f"in {total['seconds']:.1f}s ({total['frames_per_second']:.1f} frames/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+
+class Checkpoint() :
+    """save and load processing state for resume
+
+    Args:
+        config (dict): checkpoint settings
+        fingerprint (str): hash of the configuration of the run
+    """
+
+    VERSION = 1
+
+    def __init__(self, config, fingerprint):
+        # Get parameter from config
+        self._checkpoint_file = config['checkpoint_file']
+        self._interval_frames = config.get('interval_frames', 100)
+        self._fingerprint = fingerprint
+
+        # Check parameter
+        if not self._checkpoint_file:
+            raise ValueError('checkpoint_file is not set')
+        if self._interval_frames < 1:
+            raise ValueError('interval_frames must be 1 or more')
+
+    @staticmethod
+    def make_fingerprint(settings):
+        """make hash of the settings which affect the output
+
+        Args:
+            settings (list): settings (json serializable)
+
+        Returns:
+            str: sha256 hex digest
+        """
+        return hashlib.sha256(
+            json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def is_due(self, frame):
+        """check if checkpoint should be saved
+
+        Args:
+            frame (int): number of processed frames
+
+        Returns:
+            bool: True if checkpoint should be saved
+        """
+        return frame % self._interval_frames == 0
+
+    def save(self, frame, timestamp, state):
+        """save checkpoint atomically
+
+        The state is written to a temporary file in the same directory and
+        then renamed, so a crash never leaves a partial checkpoint.
+
+        Args:
+            frame (int): number of processed frames (index of next frame)
+            timestamp (str): timestamp of next frame or None
+            state (dict): state of each pipeline component
+        """
+        checkpoint = {
+            'version': self.VERSION,
+            'fingerprint': self._fingerprint,
+            'frame': frame,
+            'timestamp': timestamp,
+            'state': state
+        }
+
+        dir_name = os.path.dirname(os.path.abspath(self._checkpoint_file))
+        os.makedirs(dir_name, exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(
+            prefix='.checkpoint_', suffix='.tmp', dir=dir_name)
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+                json.dump(checkpoint, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self._checkpoint_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self):
+        """load checkpoint
+
+        Returns:
+            dict: checkpoint, None if checkpoint file does not exist
+        """
+        if not os.path.exists(self._checkpoint_file):
+            return None
+
+        with open(self._checkpoint_file, 'r', encoding='utf-8') as file:
+            checkpoint = json.load(file)
+
+        # check checkpoint
+        if checkpoint.get('version') != self.VERSION:
+            raise ValueError(
+                f'unsupported checkpoint version {checkpoint.get("version")}')
+        if checkpoint.get('fingerprint') != self._fingerprint:
+            raise ValueError(
+                f'{self._checkpoint_file} was saved with different configuration')
+
+        return checkpoint
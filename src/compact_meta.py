@@ -0,0 +1,145 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import numpy as np
+import flatbuffers
+
+sys.path.append(os.path.join(os.path.dirname(__file__),'.'))
+sys.path.append(
+    os.path.join(os.path.dirname(__file__),'smart_camera_interface_schema'))
+
+import smart_camera_interface_schema.SmartCamera.ObjectDetectionCompact as SObjectDetectionCompact
+
+# schema versions of serialized meta data
+SCHEMA_VERSION_OBJECT_DETECTION_TOP = 1
+SCHEMA_VERSION_COMPACT = 2
+
+# file_identifier of ObjectDetectionCompact.fbs
+FILE_IDENTIFIER = b'ODC2'
+
+# vtable offsets of ObjectDetectionCompact fields
+_BOUNDING_BOXES = 4
+_SCORES = 6
+_CLASS_IDS = 8
+
+_BOX_DTYPE = np.dtype('<i4')
+_SCORE_DTYPE = np.dtype('<f4')
+_CLASS_ID_DTYPE = np.dtype('<u4')
+
+
+def get_schema_version(serialize_meta):
+    """detect schema of serialized meta data
+
+    ObjectDetectionCompact buffers have a file identifier after the root
+    offset. ObjectDetectionTop buffers have none, and the bytes there are
+    padding or a small vtable which never match the identifier.
+
+    Args:
+        serialize_meta (bytes): serialized meta data
+
+    Returns:
+        int: SCHEMA_VERSION_COMPACT or SCHEMA_VERSION_OBJECT_DETECTION_TOP
+    """
+    if len(serialize_meta) >= 8 and bytes(serialize_meta[4:8]) == FILE_IDENTIFIER:
+        return SCHEMA_VERSION_COMPACT
+    return SCHEMA_VERSION_OBJECT_DETECTION_TOP
+
+
+def serialize_compact(bboxes, scores, class_ids, builder=None):
+    """serialize detection result to ObjectDetectionCompact
+
+    Each vector is written with one copy of its bytes.
+
+    Args:
+        bboxes (array_like): bounding boxes (left, top, right, bottom), shape (N, 4)
+        scores (array_like): scores, shape (N,)
+        class_ids (array_like): class ids, shape (N,)
+        builder (flatbuffers.Builder, optional): builder to use. Defaults to None.
+
+    Returns:
+        bytes: serialized meta data
+    """
+    boxes = np.ascontiguousarray(bboxes, dtype=_BOX_DTYPE).reshape(-1, 4)
+    score_array = np.ascontiguousarray(scores, dtype=_SCORE_DTYPE).reshape(-1)
+    class_id_array = np.ascontiguousarray(class_ids, dtype=_CLASS_ID_DTYPE).reshape(-1)
+    box_num = boxes.shape[0]
+    if score_array.shape[0] != box_num or class_id_array.shape[0] != box_num:
+        raise ValueError('size of bboxes, scores and class_ids do not match')
+
+    if builder is None:
+        builder = flatbuffers.Builder(64 + box_num * 24)
+
+    class_ids_fb = builder.CreateNumpyVector(class_id_array)
+    scores_fb = builder.CreateNumpyVector(score_array)
+
+    # vector of structs is the raw bytes of the (N, 4) array
+    SObjectDetectionCompact.StartBoundingBoxesVector(builder, box_num)
+    size = boxes.nbytes
+    builder.head = builder.Head() - size
+    builder.Bytes[builder.Head():builder.Head() + size] = boxes.tobytes()
+    boxes_fb = builder.EndVector(box_num)
+
+    SObjectDetectionCompact.Start(builder)
+    SObjectDetectionCompact.AddBoundingBoxes(builder, boxes_fb)
+    SObjectDetectionCompact.AddScores(builder, scores_fb)
+    SObjectDetectionCompact.AddClassIds(builder, class_ids_fb)
+    root = SObjectDetectionCompact.End(builder)
+    _finish_with_identifier(builder, root)
+
+    return builder.Output()
+
+
+def decode_compact(serialize_meta):
+    """decode ObjectDetectionCompact as NumPy views
+
+    The returned arrays share memory with serialize_meta (no copy).
+
+    Args:
+        serialize_meta (bytes): serialized meta data
+
+    Returns:
+        numpy.ndarray: bounding boxes (left, top, right, bottom), shape (N, 4)
+        numpy.ndarray: scores, shape (N,)
+        numpy.ndarray: class ids, shape (N,)
+    """
+    root = flatbuffers.encode.Get(flatbuffers.packer.uoffset, serialize_meta, 0)
+    table = flatbuffers.table.Table(serialize_meta, root)
+    boxes = _vector_view(table, _BOUNDING_BOXES, _BOX_DTYPE, 4)
+    scores = _vector_view(table, _SCORES, _SCORE_DTYPE, 1).reshape(-1)
+    class_ids = _vector_view(table, _CLASS_IDS, _CLASS_ID_DTYPE, 1).reshape(-1)
+    return boxes, scores, class_ids
+
+
+def _vector_view(table, field_offset, dtype, width):
+    offset = table.Offset(field_offset)
+    if offset == 0:
+        return np.zeros((0, width), dtype=dtype)
+    start = table.Vector(offset)
+    length = table.VectorLen(offset)
+    return np.frombuffer(
+        table.Bytes, dtype=dtype, count=length * width, offset=start
+    ).reshape(length, width)
+
+
+def _finish_with_identifier(builder, root):
+    # flatbuffers 1.11 Builder.Finish does not write file_identifier
+    builder.Prep(builder.minalign, 4 + len(FILE_IDENTIFIER))
+    for byte in reversed(FILE_IDENTIFIER):
+        builder.PrependByte(byte)
+    builder.PrependUOffsetTRelative(root)
+    builder.finished = True
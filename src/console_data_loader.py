@@ -17,15 +17,11 @@ limitations under the License.
 import os
 import base64
 import logging
-import cv2
 import numpy as np
 
-import console_access_library
-from console_access_library.client import Client
-from console_access_library.common.config import Config
-from console_access_library.common.read_console_access_settings import ReadConsoleAccessSettings
-
 import data_loader
+import stage_metrics
+import timestamp_util
 
 
 class ConsoleDataLoader(data_loader.DataLoader) :
@@ -33,9 +29,14 @@ class ConsoleDataLoader(data_loader.DataLoader) :
 
     Args:
         DataLoader (class): load data interface class
+        config (dict): console data settings
+        metrics (StageMetrics, optional): stage metrics. Defaults to None.
+        client (object, optional): client with the insight API of Console
+            Access Library, used instead of the client created from
+            setting_path (e.g. a local stand-in of Console). Defaults to None.
     """
 
-    def __init__(self, config):
+    def __init__(self, config, metrics=None, client=None):
 
         # Init
         self._params = {}
@@ -44,30 +45,21 @@ class ConsoleDataLoader(data_loader.DataLoader) :
         self._params['last_timestamp'] = ''
         self._params['number_of_images'] = 0
         self._params['number_of_inference_results'] = 0
-        self._image_time_list = []
+        self._image_time_list = np.empty(0, dtype=np.int64)
         self._image_data_list = []
-        self._meta_time_list = []
+        self._meta_time_list = np.empty(0, dtype=np.int64)
         self._meta_data_list = []
+        # timestamps are written with the length of the input
+        self._timestamp_length = timestamp_util.TIMESTAMP_LENGTH
         self._console_access_client = None
+        self._metrics = stage_metrics.NULL_METRICS
+        if metrics is not None:
+            self._metrics = metrics
 
-        # Check parameter
-        if not 'setting_path' in config:
-            raise ValueError('Console Access Library setting file is not found')
-        if not os.path.exists(config['setting_path']):
-            raise ValueError(f"cannot open {config['setting_path']}")
-
-        # Instantiate Console Access Library Client.
-        console_access_library.set_logger(logging.INFO)
-
-        read_console_access_settings_obj = ReadConsoleAccessSettings(config['setting_path'])
-        config_obj = Config(
-            read_console_access_settings_obj.console_endpoint,
-            read_console_access_settings_obj.portal_authorization_endpoint,
-            read_console_access_settings_obj.client_id,
-            read_console_access_settings_obj.client_secret,
-        )
- 
-        self._console_access_client = Client(config_obj)
+        if client is None:
+            self._console_access_client = self._create_client(config)
+        else:
+            self._console_access_client = client
 
         # Get parameter from config
         self._params['device_id'] = config['device_id']
@@ -91,7 +83,7 @@ class ConsoleDataLoader(data_loader.DataLoader) :
         Returns:
             list: list of image data
             list: list of meta data
-            list: list of timestamp
+            numpy.ndarray: timestamps in epoch milliseconds
         """
         if isinstance(self._params['sub_directory_name'], str) \
             and self._params['sub_directory_name']:
@@ -125,13 +117,52 @@ class ConsoleDataLoader(data_loader.DataLoader) :
         return image_info
 
 
+    @property
+    def timestamp_length(self):
+        """int: length of timestamp strings of the input"""
+        return self._timestamp_length
+
+
+    @staticmethod
+    def _create_client(config):
+        # Check parameter
+        if not 'setting_path' in config:
+            raise ValueError('Console Access Library setting file is not found')
+        if not os.path.exists(config['setting_path']):
+            raise ValueError(f"cannot open {config['setting_path']}")
+
+        # Console Access Library is only needed for the real Console
+        import console_access_library
+        from console_access_library.client import Client
+        from console_access_library.common.config import Config
+        from console_access_library.common.read_console_access_settings \
+            import ReadConsoleAccessSettings
+
+        # Instantiate Console Access Library Client.
+        console_access_library.set_logger(logging.INFO)
+
+        read_console_access_settings_obj = ReadConsoleAccessSettings(config['setting_path'])
+        config_obj = Config(
+            read_console_access_settings_obj.console_endpoint,
+            read_console_access_settings_obj.portal_authorization_endpoint,
+            read_console_access_settings_obj.client_id,
+            read_console_access_settings_obj.client_secret,
+        )
+
+        return Client(config_obj)
+
+
     def _get_images(self):
+        # cv2 is only needed when images are fetched
+        import cv2
+
         # get image response
-        image_response = self._console_access_client.insight.get_images(
-            self._params['device_id'],
-            self._params['sub_directory_name'],
-            self._params['number_of_images']
-        )
+        with self._metrics.measure('loader_fetch'):
+            image_response = self._console_access_client.insight.get_images(
+                self._params['device_id'],
+                self._params['sub_directory_name'],
+                self._params['number_of_images']
+            )
 
         # check responce
         if isinstance(image_response, dict) and 'message' in image_response.keys():
@@ -140,16 +171,26 @@ class ConsoleDataLoader(data_loader.DataLoader) :
         # number of images
         self._params['number_of_images'] = len(image_response['images'])
 
+        image_time_list = []
         for image_data in image_response['images']:
 
             # image timestamp
-            self._image_time_list.append(image_data['name'].replace('.jpg', ''))
+            image_time_list.append(image_data['name'].replace('.jpg', ''))
 
             # image data
-            img_binary = base64.b64decode(image_data['contents'])
-            img_arr = np.frombuffer(img_binary, dtype=np.uint8)
-            self._image_data_list.append(
-                cv2.imdecode(img_arr, flags=cv2.IMREAD_COLOR))
+            with self._metrics.measure('loader_decode'):
+                img_binary = base64.b64decode(image_data['contents'])
+                img_arr = np.frombuffer(img_binary, dtype=np.uint8)
+                image = cv2.imdecode(img_arr, flags=cv2.IMREAD_COLOR)
+            self._image_data_list.append(image)
+
+        # timestamps are parsed once, and formatted again only for output
+        self._image_time_list = timestamp_util.parse_array(image_time_list)
+        self._timestamp_length = timestamp_util.get_length(image_time_list)
+        # filter of inference results uses the names of the images as they are
+        if image_time_list:
+            self._params['first_timestamp'] = image_time_list[0]
+            self._params['last_timestamp'] = image_time_list[-1]
 
 
     def _get_inference_results(self):
@@ -157,8 +198,6 @@ class ConsoleDataLoader(data_loader.DataLoader) :
         if isinstance(self._params['sub_directory_name'], str) \
             and self._params['sub_directory_name']:
             if self._params['number_of_images'] > 0:
-                self._params['first_timestamp'] = self._image_time_list[0]
-                self._params['last_timestamp'] = self._image_time_list[-1]
                 self._params['number_of_inference_results'] \
                     = self._params['number_of_images']
             else:
@@ -186,18 +225,20 @@ class ConsoleDataLoader(data_loader.DataLoader) :
                 filter_str += \
                     f'i.T >= "{first_timestamp}" AND i.T <= "{last_timestamp}")'
 
-            inference_response = \
-                self._console_access_client.insight.get_inference_results(
-                self._params['device_id'],
-                number_of_inference_results=self._params['number_of_inference_results'],
-                raw=1,
-                filter=filter_str)
+            with self._metrics.measure('loader_fetch'):
+                inference_response = \
+                    self._console_access_client.insight.get_inference_results(
+                    self._params['device_id'],
+                    number_of_inference_results=self._params['number_of_inference_results'],
+                    raw=1,
+                    filter=filter_str)
         else:
-            inference_response = \
-                self._console_access_client.insight.get_inference_results(
-                self._params['device_id'],
-                number_of_inference_results=self._params['number_of_inference_results'],
-                raw=1)
+            with self._metrics.measure('loader_fetch'):
+                inference_response = \
+                    self._console_access_client.insight.get_inference_results(
+                    self._params['device_id'],
+                    number_of_inference_results=self._params['number_of_inference_results'],
+                    raw=1)
 
         # check responce
         if isinstance(inference_response, dict) \
@@ -205,28 +246,26 @@ class ConsoleDataLoader(data_loader.DataLoader) :
             raise ValueError(f"{inference_response['message']}")
 
         # get meta data from inference results
+        meta_time_list = []
         for inference_data in inference_response:
             base64_data = inference_data['inference_result']['Inferences'][0]['O']
-            fb_data = base64.b64decode(base64_data)
+            with self._metrics.measure('loader_decode'):
+                fb_data = base64.b64decode(base64_data)
             time = inference_data['inference_result']['Inferences'][0]['T']
             self._meta_data_list.append(fb_data)
-            self._meta_time_list.append(time)
+            meta_time_list.append(time)
+        self._meta_time_list = timestamp_util.parse_array(meta_time_list)
+        if not (isinstance(self._params['sub_directory_name'], str)
+                and self._params['sub_directory_name']):
+            self._timestamp_length = timestamp_util.get_length(meta_time_list)
 
 
     def _match_image_and_meta(self):
-        match_meta_data_list = []
-
-        # image timestamp loop
-        for image_time in self._image_time_list:
-            match_flag = False
-            for meta_time, meta_data in zip(
-                self._meta_time_list, self._meta_data_list):
-                if meta_time == image_time:
-                    match_meta_data_list.append(meta_data)
-                    match_flag = True
-                    break
-            if match_flag is False:
-                match_meta_data_list.append(None)
+        # first meta data with the same timestamp as each image
+        positions = timestamp_util.match(self._meta_time_list, self._image_time_list)
+        match_meta_data_list = [
+            self._meta_data_list[position] if position >= 0 else None
+            for position in positions.tolist()]
 
         # update meta data
         self._meta_data_list = match_meta_data_list
@@ -0,0 +1,175 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+
+class _LruCache() :
+    __slots__ = ['_entries', '_max_entries', 'hits', 'misses']
+
+    def __init__(self, max_entries):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CountCache() :
+    """cache of raw per-area counts for repeated detection results
+
+    Two levels are looked up in order:
+    the hash of the serialized meta data reuses the whole result before
+    the stabilizer, and the (quantized) point set reuses the inpolygon
+    result when only scores changed.
+
+    Args:
+        config (dict, optional): cache settings. Defaults to None.
+    """
+
+    def __init__(self, config=None):
+        if config is None:
+            config = {}
+
+        # Get parameter from config
+        self._max_entries = config.get('max_entries', 1024)
+        self._point_quantum = config.get('point_quantum', 1)
+
+        # Check parameter
+        if self._max_entries < 1:
+            raise ValueError('max_entries must be 1 or more')
+        if self._point_quantum < 0:
+            raise ValueError('point_quantum must be 0 or more')
+
+        self._meta_cache = _LruCache(self._max_entries)
+        self._point_cache = _LruCache(self._max_entries)
+
+    @staticmethod
+    def meta_key(serialize_meta):
+        """make cache key of serialized meta data
+
+        Args:
+            serialize_meta (bytes): serialized meta data
+
+        Returns:
+            bytes: digest of meta data
+        """
+        return hashlib.blake2b(serialize_meta, digest_size=16).digest()
+
+    def point_key(self, positiones):
+        """make cache key of point set
+
+        Args:
+            positiones (list): list of points (x, y)
+
+        Returns:
+            tuple: sorted quantized points, None if point cache is disabled
+        """
+        if self._point_quantum == 0:
+            return None
+        quantum = self._point_quantum
+        if quantum == 1:
+            return tuple(sorted((position[0], position[1]) for position in positiones))
+        return tuple(sorted(
+            (position[0] // quantum, position[1] // quantum) for position in positiones))
+
+    def get_meta(self, key):
+        """get cached result of meta data
+
+        Args:
+            key (bytes): key from meta_key
+
+        Returns:
+            tuple: bboxes, scores, points, area_num and raw count, or None
+        """
+        return self._meta_cache.get(key)
+
+    def put_meta(self, key, value):
+        """store result of meta data
+
+        Args:
+            key (bytes): key from meta_key
+            value (tuple): bboxes, scores, points, area_num and raw count
+        """
+        self._meta_cache.put(key, value)
+
+    def get_points(self, key):
+        """get cached inpolygon result of point set
+
+        Args:
+            key (tuple): key from point_key
+
+        Returns:
+            tuple: area_num and raw count, or None
+        """
+        if key is None:
+            return None
+        return self._point_cache.get(key)
+
+    def put_points(self, key, value):
+        """store inpolygon result of point set
+
+        Args:
+            key (tuple): key from point_key
+            value (tuple): area_num and raw count
+        """
+        if key is not None:
+            self._point_cache.put(key, value)
+
+    def clear(self):
+        """remove all entries (called when parameters change)
+
+        """
+        self._meta_cache.clear()
+        self._point_cache.clear()
+
+    def stats(self):
+        """get hit statistics
+
+        Returns:
+            dict: hits, misses and hit rate of each level
+        """
+        stats = {}
+        for name, cache in (('meta', self._meta_cache), ('point', self._point_cache)):
+            lookups = cache.hits + cache.misses
+            stats[name] = {
+                'hits': cache.hits,
+                'misses': cache.misses,
+                'hit_rate': cache.hits / lookups if lookups else 0.0,
+                'entries': len(cache)
+            }
+        return stats
@@ -14,7 +14,11 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import numpy as np
+
 import object_detection_processor
+import stage_metrics
+import zone_config
 
 class CrowdCount(object_detection_processor.ObjectDetectionProcessor):
     """crowd counting class
@@ -24,60 +28,29 @@ class CrowdCount(object_detection_processor.ObjectDetectionProcessor):
         Detect with ObjectDetection schema Interface Class
     """
     MAX_AREA_NUM = 4
-    MAX_POINT_NUM = 16
+    MAX_POINT_NUM = 4096
     DEBUG_CROWD_COUNT = False
 
-    def __init__(self, config):
+    def __init__(self, config, metrics=None, count_cache=None, tracker=None):
         self._stabilized_count = [0.0] * self.MAX_AREA_NUM
         self._initial = True
+        self._frame_step = 1
         self._inpolygon_params = {}
         self._stabilizer_params = {}
         self._remove_params = {}
         self._bbox2point_params = {}
-
-        # load parameter from json
-        self._inpolygon_params = config['inpolygon']
-        self._stabilizer_params = config['stabilizer']
-        self._remove_params = config['remove_low_conf']
-        self._bbox2point_params = config['bbox2point']
-
-        # parameter range check
-        if self._inpolygon_params['area_num'] > self.MAX_AREA_NUM:
-            raise RuntimeError(
-                'area_num should be less than or equal to ', self.MAX_AREA_NUM)
-        if len(self._inpolygon_params['area_point_len']) \
-            < self._inpolygon_params['area_num']:
-            raise RuntimeError(
-                'size of \'area_point_len\' and area_num do not match.')
-        if len(self._inpolygon_params['area_point']) \
-            < self._inpolygon_params['area_num']:
-            raise RuntimeError(
-                'size of \'area_point\' and area_num do not match.')
-
-        for area_num in range(self._inpolygon_params['area_num']):
-            if self._inpolygon_params['area_point_len'][area_num] \
-                > self.MAX_POINT_NUM:
-                raise RuntimeError(
-                    'area_point_len should be less than or equal to ', self.MAX_POINT_NUM
-                )
-            if self._inpolygon_params['area_point_len'][area_num] < 3:
-                raise RuntimeError(
-                    'area_point_len should be larger than 2 ')
-            if len(self._inpolygon_params['area_point'][area_num]) \
-                < self._inpolygon_params['area_point_len'][area_num]:
-                raise RuntimeError(
-                    'number of area_point should be larger than ',
-                    self._inpolygon_params['area_point_len'][area_num]
-                )
-
-
-
-        if self._stabilizer_params['iir_down_ratio'] < 0 \
-            or self._stabilizer_params['iir_down_ratio'] > 1:
-            raise RuntimeError('iir_down_ratio must be set in the range of 0 to 1')
-        if self._stabilizer_params['iir_up_ratio'] < 0 \
-            or self._stabilizer_params['iir_up_ratio'] > 1:
-            raise RuntimeError('iir_up_ratio must be set in the range of 0 to 1')
+        self._metrics = stage_metrics.NULL_METRICS
+        if metrics is not None:
+            self._metrics = metrics
+        self._count_cache = count_cache
+        self._tracker = tracker
+
+        # load parameter from json and compile it
+        self._zone_config = None
+        self._reset_areas = set()
+        self._class_stabilized_count = np.zeros((0, self.MAX_AREA_NUM))
+        self._class_initial = True
+        self.set_zone_config(self.compile_config(config))
 
         if self.DEBUG_CROWD_COUNT:
             print(self._inpolygon_params)
@@ -85,12 +58,111 @@ class CrowdCount(object_detection_processor.ObjectDetectionProcessor):
             print(self._remove_params)
             print(self._bbox2point_params)
 
+    @classmethod
+    def compile_config(cls, config):
+        """check and compile parameters
+
+        Args:
+            config (dict): crowd count parameters
+
+        Returns:
+            CompiledZoneConfig: compiled parameters
+        """
+        return zone_config.CompiledZoneConfig(
+            config, cls.MAX_AREA_NUM, cls.MAX_POINT_NUM)
+
+    def set_zone_config(self, compiled_config):
+        """swap parameters with compiled config
+
+        Stabilizer state is kept for areas whose polygon is unchanged,
+        changed or added areas restart from the current count.
+
+        Args:
+            compiled_config (CompiledZoneConfig): compiled parameters
+        """
+        if self._zone_config is not None:
+            self._reset_areas |= compiled_config.changed_areas(self._zone_config)
+        if self._zone_config is None \
+            or not np.array_equal(compiled_config.class_ids, self._zone_config.class_ids):
+            # classes are counted from scratch when the class list changes
+            self._class_stabilized_count = np.zeros(
+                (len(compiled_config.class_ids), self.MAX_AREA_NUM))
+            self._class_initial = True
+        if self._count_cache is not None:
+            self._count_cache.clear()
+        self._zone_config = compiled_config
+        self._inpolygon_params = compiled_config.inpolygon_params
+        self._stabilizer_params = compiled_config.stabilizer_params
+        self._remove_params = compiled_config.remove_params
+        self._bbox2point_params = compiled_config.bbox2point_params
+
+    def set_frame_step(self, frame_step):
+        """set number of input frames since the previous counted frame
+
+        The iir ratios are raised to the power of frame_step, so the
+        stabilizer keeps the same time constant in input frames (and in
+        wall-clock time) when frames are skipped.
+
+        Args:
+            frame_step (int): number of input frames, 1 if no frame is skipped
+        """
+        self._frame_step = frame_step
+
     def reset_iir(self):
         """reset iir stabilizer
 
         """
         self._stabilized_count = [0.0] * self.MAX_AREA_NUM
         self._initial = True
+        self._reset_areas = set()
+        self._class_stabilized_count[:] = 0.0
+        self._class_initial = True
+
+    def get_state(self):
+        """get stabilizer state for checkpoint
+
+        Returns:
+            dict: stabilizer state
+        """
+        state = {
+            'params': self._zone_config.params,
+            'stabilized_count': list(self._stabilized_count),
+            'initial': self._initial,
+            'reset_areas': sorted(self._reset_areas)
+        }
+        if len(self._class_stabilized_count) > 0:
+            state['class_ids'] = self._zone_config.class_ids.tolist()
+            state['class_stabilized_count'] = self._class_stabilized_count.tolist()
+            state['class_initial'] = self._class_initial
+        return state
+
+    def set_state(self, state):
+        """restore stabilizer state from checkpoint
+
+        If the parameters in effect at the checkpoint (reloaded while
+        processing) differ from the current ones, the state is restored with
+        them and then the current ones are swapped in as in a reload.
+
+        Args:
+            state (dict): stabilizer state
+        """
+        current_config = None
+        if state.get('params', self._zone_config.params) != self._zone_config.params:
+            current_config = self._zone_config
+            self.set_zone_config(self.compile_config(state['params']))
+
+        self._stabilized_count = list(state['stabilized_count'])
+        self._initial = state['initial']
+        self._reset_areas = set(state.get('reset_areas', []))
+        # class state is kept only if the classes are the same
+        if state.get('class_ids') == self._zone_config.class_ids.tolist() \
+            and 'class_stabilized_count' in state:
+            self._class_stabilized_count = np.array(
+                state['class_stabilized_count'], dtype=np.float64)
+            self._class_initial = state['class_initial']
+
+        if current_config is not None:
+            self.set_zone_config(current_config)
 
     def get_param_info(self):
         """get inpolygon parameter for other process
@@ -109,21 +181,140 @@ class CrowdCount(object_detection_processor.ObjectDetectionProcessor):
             dict: detect result
         """
 
-        bbox_array = super().deserialize_meta_data(serialize_meta)
-
-        bboxes, bboxes_score = self._remove_low_conf(bbox_array)
-        positiones = self._bbox2point(bboxes)
-        area_num, count = self._inpolygon(positiones)
-        count_out = self._stabilizer(area_num, count)
+        metrics = self._metrics
+        count_cache = self._count_cache
+
+        # reuse counts of the same meta data
+        meta_key = None
+        cached = None
+        if count_cache is not None and serialize_meta is not None:
+            meta_key = count_cache.meta_key(serialize_meta)
+            cached = count_cache.get_meta(meta_key)
+
+        if cached is not None:
+            bboxes, bboxes_score, positiones, area_num, count, class_count = cached
+            bboxes_score = list(bboxes_score)
+            metrics.increment('count_cache_meta_hits')
+        else:
+            if len(self._zone_config.class_ids) > 0:
+                bboxes, bboxes_score, positiones, area_num, count, class_count = \
+                    self._count_classes(serialize_meta)
+            else:
+                bboxes, bboxes_score, positiones, area_num, count = \
+                    self._count_raw(serialize_meta)
+                class_count = None
+            if meta_key is not None:
+                count_cache.put_meta(
+                    meta_key,
+                    (bboxes, tuple(bboxes_score), positiones, area_num, count, class_count))
+
+        with metrics.measure('stabilizer'):
+            class_count_out = None
+            if class_count is not None:
+                # before _stabilizer, which clears the initial and reset flags
+                class_count_out = self._class_stabilizer(area_num, class_count)
+            count_out = self._stabilizer(area_num, count)
         count_out = count_out[:area_num]
 
         # Output to dict
-        result_dict = self.__output_to_dict(
-            bboxes, bboxes_score, positiones, count_out)
+        with metrics.measure('output_to_dict'):
+            result_dict = self.__output_to_dict(
+                bboxes, bboxes_score, positiones, count_out)
+            if class_count_out is not None:
+                result_dict['class_count'] = class_count_out
+
+        # identities and line crossing counts (optional stage)
+        if self._tracker is not None:
+            with metrics.measure('tracker'):
+                track_ids, line_count = self._tracker(bboxes, positiones)
+            result_dict['track_ids'] = track_ids
+            result_dict['line_count'] = line_count
 
         return result_dict
 
 
+    def _count_raw(self, serialize_meta):
+        metrics = self._metrics
+        count_cache = self._count_cache
+
+        with metrics.measure('deserialize_meta_data'):
+            bbox_array = super().deserialize_meta_data(serialize_meta)
+        with metrics.measure('remove_low_conf'):
+            bboxes, bboxes_score = self._remove_low_conf(bbox_array)
+        with metrics.measure('bbox2point'):
+            positiones = self._bbox2point(bboxes)
+        metrics.increment('detections_input', len(bbox_array))
+        metrics.increment('detections_counted', len(bboxes))
+
+        # reuse inpolygon result of the same point set
+        point_key = None
+        cached = None
+        if count_cache is not None:
+            point_key = count_cache.point_key(positiones)
+            cached = count_cache.get_points(point_key)
+
+        if cached is not None:
+            area_num, count = cached
+            metrics.increment('count_cache_point_hits')
+        else:
+            with metrics.measure('inpolygon'):
+                area_num, count = self._inpolygon(positiones)
+            if count_cache is not None:
+                count_cache.put_points(point_key, (area_num, count))
+
+        return bboxes, bboxes_score, positiones, area_num, count
+
+
+    def _count_classes(self, serialize_meta):
+        # counts of all boxes and of each class in one pass over arrays
+        metrics = self._metrics
+        zone = self._zone_config
+        remove = self._remove_params
+
+        with metrics.measure('deserialize_meta_data'):
+            bbox_array, scores, class_ids = super().deserialize_meta_arrays(serialize_meta)
+        with metrics.measure('remove_low_conf'):
+            bbox_array = bbox_array.astype(np.int64)
+            # compare scores in float64 as _remove_low_conf does
+            scores = scores.astype(np.float64)
+            heights = bbox_array[:, 3] - bbox_array[:, 1]
+            counted = (scores >= remove['min_detect_score']) \
+                & (remove['min_height'] <= heights) & (heights <= remove['max_height'])
+
+            rows = zone.class_rows(class_ids)
+            class_rows = np.maximum(rows, 0)
+            class_counted = (rows >= 0) & (scores >= zone.class_min_score[class_rows]) \
+                & (zone.class_min_height[class_rows] <= heights) \
+                & (heights <= zone.class_max_height[class_rows])
+            used = counted | class_counted
+        with metrics.measure('bbox2point'):
+            ratio = self._bbox2point_params['bbox_to_point_ratio']
+            boxes = bbox_array[used]
+            points = np.empty((len(boxes), 2), dtype=np.int64)
+            points[:, 0] = np.trunc((boxes[:, 0] + boxes[:, 2]) / 2.0)
+            points[:, 1] = np.trunc(boxes[:, 1] * (1.0 - ratio) + boxes[:, 3] * ratio)
+        metrics.increment('detections_input', len(bbox_array))
+        metrics.increment('detections_counted', int(counted.sum()))
+
+        with metrics.measure('inpolygon'):
+            area_num = zone.area_num
+            inside = self._inside(points)
+            count = [0.0] * self.MAX_AREA_NUM
+            count[:area_num] = inside[counted[used]].sum(axis=0).astype(np.float64).tolist()
+
+            # one hot matrix of classes x boxes turns inside into class counts
+            class_used = class_counted[used]
+            one_hot = np.zeros((len(zone.class_ids), len(points)), dtype=np.int32)
+            one_hot[rows[used][class_used], np.flatnonzero(class_used)] = 1
+            class_count = np.zeros((len(zone.class_ids), self.MAX_AREA_NUM))
+            class_count[:, :area_num] = one_hot @ inside
+            class_count.flags.writeable = False
+
+        counted_used = counted[used]
+        return (boxes[counted_used].tolist(), scores[counted].tolist(),
+                points[counted_used].tolist(), area_num, count, class_count)
+
+
     def __output_to_dict(self, bboxes, bboxes_score, positiones, count_out):
         bbox_dicts = []
         for bbox in bboxes:
@@ -205,38 +396,34 @@ class CrowdCount(object_detection_processor.ObjectDetectionProcessor):
         return positiones
 
     def _inpolygon(self,positiones):
-        area_num = self._inpolygon_params['area_num']
-        area_point_len = self._inpolygon_params['area_point_len']
-        area_point = self._inpolygon_params['area_point']
+        zone = self._zone_config
+        area_num = zone.area_num
 
         count = [0.0] * self.MAX_AREA_NUM
 
-        for area in range(area_num):
-            polygon = area_point[area]
-            num_len = area_point_len[area]
-            if num_len < 3:
-                print('ERROR: area_point_len should be larger than 2')
-            for position in positiones:
-                inside = False
-                s_x = position[0]
-                s_y = position[1]
-                for i_1 in range(num_len):
-                    i_2 = (i_1+1)%num_len
-                    if min(polygon[i_1][0], polygon[i_2][0]) < s_x \
-                        <= max(polygon[i_1][0], polygon[i_2][0]):
-                        if (polygon[i_1][1] + (polygon[i_2][1]-polygon[i_1][1]) \
-                            /(polygon[i_2][0]-polygon[i_1][0])*(s_x-polygon[i_1][0]) - s_y) \
-                            > 0:
-                            inside = not inside
-
-                if inside:
-                    count[area]+=1
+        if len(positiones) > 0 and area_num > 0:
+            inside = self._inside(positiones)
+            count[:area_num] = inside.sum(axis=0).astype(np.float64).tolist()
         return area_num, count
 
+    def _inside(self, positiones):
+        # 1 if the point is inside the area, shape (points, area_num)
+        zone = self._zone_config
+        points = np.asarray(positiones, dtype=np.float64).reshape(-1, 2)
+        s_x = points[:, 0:1]
+        s_y = points[:, 1:2]
+
+        # crossing of the upward ray from each point with each edge
+        crossing = (zone.edge_xmin < s_x) & (s_x <= zone.edge_xmax) \
+            & (zone.edge_y1 + zone.edge_slope * (s_x - zone.edge_x1) - s_y > 0)
+
+        # inside if number of crossings in the area is odd
+        return (crossing.astype(np.int32) @ zone.edge_area_mask) % 2
+
 
     def _stabilizer(self, area_num, count):
-        iir_down_ratio = self._stabilizer_params['iir_down_ratio']
-        iir_up_ratio    = self._stabilizer_params['iir_up_ratio']
+        iir_down_ratio = self._stabilizer_params['iir_down_ratio'] ** self._frame_step
+        iir_up_ratio    = self._stabilizer_params['iir_up_ratio'] ** self._frame_step
 
         val = 0.0
         count_out = [0] * self.MAX_AREA_NUM
@@ -244,9 +431,10 @@ class CrowdCount(object_detection_processor.ObjectDetectionProcessor):
             val = 0.0
             current = count[area]
             previous = self._stabilized_count[area]
-            if self._initial:
+            if self._initial or area in self._reset_areas:
                 val = current
                 self._initial = False
+                self._reset_areas.discard(area)
             else:
                 iir_ratio = 0.0
                 if current > previous:
@@ -261,3 +449,25 @@ class CrowdCount(object_detection_processor.ObjectDetectionProcessor):
         if self.DEBUG_CROWD_COUNT:
             print('[stabilizer] stabilized count:',self._stabilized_count)
         return count_out
+
+    def _class_stabilizer(self, area_num, class_count):
+        # same iir as _stabilizer with one state per (class, area)
+        iir_down_ratio = self._stabilizer_params['iir_down_ratio'] ** self._frame_step
+        iir_up_ratio = self._stabilizer_params['iir_up_ratio'] ** self._frame_step
+
+        current = class_count[:, :area_num]
+        previous = self._class_stabilized_count[:, :area_num]
+        iir_ratio = np.where(current > previous, iir_up_ratio, iir_down_ratio)
+        val = previous * iir_ratio + current * (1.0 - iir_ratio)
+
+        # initial or changed areas restart from the current count
+        restart = np.full(area_num, self._initial or self._class_initial)
+        restart[[area for area in self._reset_areas if area < area_num]] = True
+        val = np.where(restart, current, val)
+        self._class_stabilized_count[:, :area_num] = val
+        self._class_initial = False
+
+        count_out = np.maximum(np.trunc(val + 0.5), 0).astype(np.int64)
+        if self.DEBUG_CROWD_COUNT:
+            print('[stabilizer] stabilized class count:', self._class_stabilized_count)
+        return count_out.tolist()
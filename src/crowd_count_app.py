@@ -14,26 +14,113 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import time
+START_TIME = time.perf_counter()
+
 import os
 import yaml
 import argparse
-from tqdm import tqdm
 
-import console_data_loader
-import local_data_loader
+import checkpoint
+import count_cache
 import crowd_count
 import crowd_count_output
+import frame_ring
+import heatmap
+import occupancy
+import result_store
+import stage_metrics
+import thumbnail_output
+import timestamp_util
+import tracker
+import zone_config
 
 
-def main():
-    """main process
+class StartupReport() :
+    """record elapsed time of each startup phase
 
     """
 
-    # Get argument
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--config_path', type=str, default='config/crowd_count_app.yaml')
-    args = parser.parse_args()
+    def __init__(self):
+        self._phases = []
+        self._last = START_TIME
+
+    def mark(self, phase):
+        """record time from the previous mark
+
+        Args:
+            phase (str): phase name
+        """
+        now = time.perf_counter()
+        self._phases.append((phase, now - self._last))
+        self._last = now
+
+    def __str__(self):
+        lines = ['[startup] phase                     time']
+        for phase, seconds in self._phases:
+            lines.append(f'[startup] {phase:<24} {seconds*1e3:8.1f}ms')
+        lines.append(
+            f"[startup] {'total':<24} {(self._last - START_TIME)*1e3:8.1f}ms")
+        return '\n'.join(lines)
+
+
+def save_checkpoint(checkpoint_writer, frame, timestamp_list, components,
+                    timestamp_length=timestamp_util.TIMESTAMP_LENGTH):
+    """save state of processing
+
+    Args:
+        checkpoint_writer (Checkpoint): checkpoint writer
+        frame (int): number of processed frames
+        timestamp_list (numpy.ndarray): timestamps in epoch milliseconds
+        components (dict): name and instance (with get_state) to save
+        timestamp_length (int, optional): length of timestamp strings of the input.
+            Defaults to TIMESTAMP_LENGTH.
+    """
+    # checkpoint keeps the timestamp string of Console
+    if len(timestamp_list) > frame:
+        timestamp = timestamp_util.to_string(timestamp_list[frame], timestamp_length)
+    else:
+        timestamp = None
+
+    checkpoint_writer.save(frame, timestamp, {
+        name: component.get_state() for name, component in components.items()
+    })
+
+
+def load_config(config_path):
+    """load application config from yaml file
+
+    Args:
+        config_path (str): path of config file
+
+    Returns:
+        dict: application config
+    """
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as file:
+            return yaml.safe_load(file)
+    raise ValueError(f'cannot open {config_path}')
+
+
+def run(config, resume=False, no_progress=False, startup_report=None, console_client=None):
+    """process one input with application config
+
+    Args:
+        config (dict): application config
+        resume (bool, optional): resume processing from checkpoint. Defaults to False.
+        no_progress (bool, optional): do not show progress bar. Defaults to False.
+        startup_report (StartupReport, optional): print elapsed time of each
+            startup phase to this report. Defaults to None.
+        console_client (object, optional): client of Console used by the console
+            mode instead of Console Access Library. Defaults to None.
+
+    Returns:
+        dict: number of frames, first processed frame, processing time,
+            the last count and the last timestamp in epoch milliseconds
+    """
+    show_startup_report = startup_report is not None
+    if startup_report is None:
+        startup_report = StartupReport()
 
     # Init
     image_list = []
@@ -41,14 +128,20 @@ def main():
     timestamp_list = []
     data_loader = None
     crowd_counter = None
+    counter_cache = None
+    people_tracker = None
     output_writer = None
-
-    # Load config from yaml file
-    if os.path.exists(args.config_path):
-        with open(args.config_path, 'r', encoding='utf-8') as file:
-            config = yaml.safe_load(file)
-    else:
-        raise ValueError(f'cannot open {args.config_path}')
+    thumbnail_writer = None
+    checkpoint_writer = None
+    counts_store = None
+    occupancy_aggregator = None
+    heatmap_accumulator = None
+    zone_watcher = None
+    frame_pipeline = None
+    frame_decimator = None
+    video_file = ''
+    start_frame = 0
+    metrics = stage_metrics.NULL_METRICS
 
     # Check config parameter
     if not 'data_source_settings' in config:
@@ -57,18 +150,40 @@ def main():
         raise ValueError('crowd_count settings is not found')
     if not 'output_settings' in config:
         raise ValueError('output settings is not found')
+    if resume and not ('checkpoint_settings' in config
+                       and config['checkpoint_settings'].get('enable', False)):
+        raise ValueError('checkpoint settings is not found or not enabled')
+    startup_report.mark('load_config')
+
+    # Create metrics if enabled
+    if 'metrics_settings' in config \
+        and config['metrics_settings'].get('enable', False):
+        metrics = stage_metrics.StageMetrics(config['metrics_settings'])
+        metrics.start_http_server()
+
+    # Account allocations of each stage if enabled
+    # (created before the data loader so that loading is also traced)
+    if 'memory_profile_settings' in config \
+        and config['memory_profile_settings'].get('enable', False):
+        import memory_profiler
+        metrics = memory_profiler.MemoryProfiler(config['memory_profile_settings'], metrics)
 
     # Select load data method and create instance
+    # (loader modules are imported only for the selected mode)
     if config['data_source_settings']['mode'] == 'console':
+        import console_data_loader
         data_loader = console_data_loader.ConsoleDataLoader(
-            config['data_source_settings']['console_data_settings'])
+            config['data_source_settings']['console_data_settings'], metrics,
+            console_client)
     elif config['data_source_settings']['mode'] == 'local':
+        import local_data_loader
         data_loader = local_data_loader.LocalDataLoader(
-            config['data_source_settings']['local_data_settings'])
+            config['data_source_settings']['local_data_settings'], metrics)
     else:
         raise ValueError(
             f"{config['data_source_settings']['mode']} is not supported")
     image_info = data_loader.get_image_info()
+    startup_report.mark('create_data_loader')
 
     # Load detect config parameter from yaml
     with open(
@@ -76,37 +191,328 @@ def main():
         ) as file:
         crowd_count_params = yaml.safe_load(file)
 
+    # Create cache of counts for repeated detection results
+    if 'cache' in config['crowd_count_settings'] \
+        and config['crowd_count_settings']['cache'].get('enable', False):
+        counter_cache = count_cache.CountCache(config['crowd_count_settings']['cache'])
+
+    # Create tracker for line crossing counts if enabled
+    if 'tracker_settings' in config \
+        and config['tracker_settings'].get('enable', False):
+        people_tracker = tracker.Tracker(config['tracker_settings'])
+
     # Create instance of detect class
-    crowd_counter = crowd_count.CrowdCount(crowd_count_params)
+    crowd_counter = crowd_count.CrowdCount(
+        crowd_count_params, metrics, counter_cache, people_tracker)
     param_info = crowd_counter.get_param_info()
+    startup_report.mark('create_crowd_count')
+
+    # Watch parameter file to reload it while processing
+    if config['crowd_count_settings'].get('reload_interval', 0) > 0:
+        zone_watcher = zone_config.ZoneConfigWatcher(
+            config['crowd_count_settings']['param_file'],
+            crowd_counter.compile_config,
+            config['crowd_count_settings']['reload_interval'])
 
     # Instance creation of output class
     output_writer = crowd_count_output.CrowdCountOutput(
-        config['output_settings'], image_info, param_info)
+        config['output_settings'], image_info, param_info, metrics)
+
+    # Create thumbnail writer if enabled
+    if 'thumbnail_settings' in config \
+        and config['thumbnail_settings'].get('enable', False):
+        thumbnail_writer = thumbnail_output.ThumbnailOutput(
+            config['thumbnail_settings'], image_info, param_info, metrics)
+
+    # Create time indexed store of counts if enabled
+    if 'result_store_settings' in config \
+        and config['result_store_settings'].get('enable', False):
+        counts_store = result_store.ResultStore(
+            config['result_store_settings'], crowd_counter.MAX_AREA_NUM)
+
+    # Create aggregator of occupancy if enabled
+    if 'occupancy_settings' in config \
+        and config['occupancy_settings'].get('enable', False):
+        occupancy_aggregator = occupancy.OccupancyAggregator(
+            config['occupancy_settings'], crowd_counter.get_param_info()['area_num'])
+
+    # Create heatmap accumulator if enabled
+    if 'heatmap_settings' in config \
+        and config['heatmap_settings'].get('enable', False):
+        heatmap_accumulator = heatmap.HeatmapAccumulator(config['heatmap_settings'])
+    startup_report.mark('create_output')
+
+    # components whose state is saved in checkpoint
+    components = {'crowd_count': crowd_counter, 'output': output_writer}
+    if counts_store is not None:
+        components['result_store'] = counts_store
+    if occupancy_aggregator is not None:
+        components['occupancy'] = occupancy_aggregator
+    if heatmap_accumulator is not None:
+        components['heatmap'] = heatmap_accumulator
+    if people_tracker is not None:
+        components['tracker'] = people_tracker
+    if thumbnail_writer is not None:
+        components['thumbnail'] = thumbnail_writer
+
+    # Create checkpoint writer if enabled
+    # (only the settings which affect the output are compared on resume,
+    # reloaded parameters are saved in the state of crowd_count instead)
+    if 'checkpoint_settings' in config \
+        and config['checkpoint_settings'].get('enable', False):
+        checkpoint_writer = checkpoint.Checkpoint(
+            config['checkpoint_settings'],
+            checkpoint.Checkpoint.make_fingerprint([
+                config['data_source_settings'],
+                crowd_count_params if zone_watcher is None else None,
+                config['output_settings']
+            ] + ([config['tracker_settings']] if people_tracker is not None else [])
+              + ([config['decimation_settings']] if 'decimation_settings' in config
+                 and config['decimation_settings'].get('enable', False) else [])))
+
+    # Decode and render video in other processes if enabled
+    # (only local mode reads video files)
+    if 'pipeline_settings' in config \
+        and config['pipeline_settings'].get('enable', False):
+        if config['data_source_settings']['mode'] == 'local':
+            if config['output_settings'].get('output_video', True):
+                video_file = data_loader.defer_images()
+        if not video_file:
+            print('pipeline is used only with video file and video output of local mode')
 
     # Load data
     image_list, meta_list, timestamp_list = data_loader()
+    startup_report.mark('load_data')
+
+    # timestamps are written with the length of the input
+    timestamp_length = data_loader.timestamp_length
+    output_writer.set_timestamp_length(timestamp_length)
+    if thumbnail_writer is not None:
+        thumbnail_writer.set_timestamp_length(timestamp_length)
+    if occupancy_aggregator is not None:
+        occupancy_aggregator.set_timestamp_length(timestamp_length)
+
+    # Skip frames when processing is slower than the input if enabled
+    # (the input rate is known after loading timestamps)
+    if 'decimation_settings' in config \
+        and config['decimation_settings'].get('enable', False):
+        import frame_decimator as decimator
+        frame_decimator = decimator.FrameDecimator(
+            config['decimation_settings'], timestamp_list,
+            config['output_settings'].get('output_video_fps', 0))
+        components['decimation'] = frame_decimator
+
+    # Restore state from checkpoint
+    if resume:
+        saved_checkpoint = checkpoint_writer.load()
+        if saved_checkpoint is None:
+            print('checkpoint is not found, start from the first frame')
+        else:
+            start_frame = saved_checkpoint['frame']
+            if start_frame > len(meta_list):
+                raise ValueError('checkpoint is beyond the end of input data')
+            if len(timestamp_list) > start_frame \
+                and timestamp_util.to_string(timestamp_list[start_frame], timestamp_length) \
+                    != saved_checkpoint['timestamp']:
+                raise ValueError('input data does not match checkpoint')
+            for name, component in components.items():
+                if name in saved_checkpoint['state']:
+                    component.set_state(saved_checkpoint['state'][name])
+            print(f'resume from frame {start_frame}')
+
+    # results of an earlier run are replaced when starting from the first frame
+    if start_frame == 0:
+        if counts_store is not None:
+            counts_store.clear()
+        if occupancy_aggregator is not None:
+            occupancy_aggregator.clear()
+
+    if video_file:
+        frame_pipeline = frame_ring.FramePipeline(
+            config['pipeline_settings'], video_file,
+            data_loader.image_offset + start_frame, config['output_settings'],
+            image_info, crowd_counter.get_param_info(), output_writer.get_state())
+        output_writer.set_video_sink(frame_pipeline)
+        startup_report.mark('start_pipeline')
+
+    if show_startup_report:
+        print(startup_report)
+
+    # Progress bar is imported only when it is shown
+    frames = range(start_frame, len(meta_list))
+    if no_progress:
+        progress = frames
+        write = print
+    else:
+        from tqdm import tqdm
+        progress = tqdm(
+            frames, desc='processing', initial=start_frame, total=len(meta_list))
+        write = tqdm.write
 
     # Detect loop
-    for i, meta in enumerate(tqdm(meta_list, desc='processing')):
+    detect = None
+    loop_start = time.perf_counter()
+    for i in progress:
+        meta = meta_list[i]
+
+        # swap parameters if parameter file was changed
+        if zone_watcher is not None:
+            compiled_config = zone_watcher.take()
+            if compiled_config is not None:
+                crowd_counter.set_zone_config(compiled_config)
+                output_writer.update_param_info(crowd_counter.get_param_info())
+                if thumbnail_writer is not None:
+                    thumbnail_writer.update_param_info(crowd_counter.get_param_info())
+                if occupancy_aggregator is not None:
+                    occupancy_aggregator.set_area_num(
+                        crowd_counter.get_param_info()['area_num'])
 
         # check image data
-        if len(image_list) > i:
+        if frame_pipeline is not None:
+            with metrics.measure('frame_wait'):
+                image = frame_pipeline.next_frame()
+        elif len(image_list) > i:
             image = image_list[i]
         else:
             image = None
 
-        # check timestamp
+        # check timestamp (epoch milliseconds, formatted only by outputs)
         if len(timestamp_list) > i:
-            timestamp = timestamp_list[i]
+            timestamp = int(timestamp_list[i])
         else:
             timestamp = None
 
-        # detect Process
-        detect = crowd_counter(meta)
+        # skip frame when the host falls behind the input
+        if frame_decimator is not None:
+            if not frame_decimator.should_process(i):
+                if frame_pipeline is not None and image is not None:
+                    frame_pipeline.skip_frame(image)
+                metrics.increment('frames_skipped')
+                if checkpoint_writer is not None and checkpoint_writer.is_due(i + 1):
+                    save_checkpoint(
+                        checkpoint_writer, i + 1, timestamp_list, components, timestamp_length)
+                continue
+            # stabilizer and tracker keep their time constants over skipped frames
+            crowd_counter.set_frame_step(frame_decimator.frame_gap)
+            if people_tracker is not None:
+                people_tracker.set_frame_step(frame_decimator.frame_gap)
+            frame_start = time.perf_counter()
+
+        with metrics.measure('frame'):
+            # detect Process
+            detect = crowd_counter(meta)
+
+            # accumulate heatmap of positions and overlay it on the image
+            if heatmap_accumulator is not None:
+                with metrics.measure('heatmap'):
+                    heatmap_accumulator(detect['positiones'])
+                    if image is not None and heatmap_accumulator.overlay_alpha > 0:
+                        # in place, so frames of the pipeline stay in their slot
+                        image[...] = heatmap_accumulator.overlay(image)
+
+            # thumbnail is made before the video overlay is drawn on the image
+            if thumbnail_writer is not None:
+                thumbnail_writer(detect, image, timestamp, i)
+
+            # output Process
+            output_writer(detect, image, timestamp, i)
+
+            # store counts for range queries
+            if counts_store is not None:
+                counts_store.append(timestamp, detect['count'], i)
+
+        # aggregate occupancy (summaries are written to output_file)
+        if occupancy_aggregator is not None:
+            with metrics.measure('occupancy'):
+                occupancy_aggregator(detect['count'], timestamp)
+
+        if frame_decimator is not None:
+            frame_decimator.observe(time.perf_counter() - frame_start)
+
+        metrics.increment('frames')
+        metrics.report_if_due(write)
+
+        # save checkpoint
+        if checkpoint_writer is not None and checkpoint_writer.is_due(i + 1):
+            save_checkpoint(
+                checkpoint_writer, i + 1, timestamp_list, components, timestamp_length)
+
+    # wait until the renderer writes the last frame
+    if frame_pipeline is not None:
+        frame_pipeline.close()
+    output_writer.close()
+    if thumbnail_writer is not None:
+        thumbnail_writer.close()
+    loop_seconds = time.perf_counter() - loop_start
+
+    # Save final checkpoint
+    if checkpoint_writer is not None:
+        save_checkpoint(
+            checkpoint_writer, len(meta_list), timestamp_list, components, timestamp_length)
+
+    if counts_store is not None:
+        counts_store.close()
+
+    # the last interval is emitted after the final checkpoint,
+    # so it is not written twice on resume
+    if occupancy_aggregator is not None:
+        occupancy_aggregator.flush()
+
+    if heatmap_accumulator is not None and heatmap_accumulator.snapshot_dir:
+        heatmap_accumulator.save_snapshot('heatmap_final')
+
+    if zone_watcher is not None:
+        zone_watcher.close()
+
+    if counter_cache is not None:
+        for name, stats in counter_cache.stats().items():
+            print(f"[count_cache] {name:<6} hit_rate={stats['hit_rate']:.3f} "
+                  f"hits={stats['hits']} misses={stats['misses']}")
+
+    if frame_decimator is not None:
+        stats = frame_decimator.stats()
+        print(f"[decimation] processed={stats['processed']} skipped={stats['skipped']} "
+              f"step={stats['step']} latency={stats['latency']*1e3:.2f}ms "
+              f"input_interval={stats['frame_interval']*1e3:.2f}ms")
+
+    # Write final metrics (and memory report)
+    metrics.close()
+    if 'metrics_settings' in config \
+        and config['metrics_settings'].get('enable', False):
+        print(metrics.summary())
+
+    return {
+        'frames': len(meta_list),
+        'start_frame': start_frame,
+        'seconds': loop_seconds,
+        'count': detect['count'] if detect is not None else None,
+        'timestamp': int(timestamp_list[-1]) if len(timestamp_list) else None
+    }
+
+
+def main():
+    """main process
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config_path', type=str, default='config/crowd_count_app.yaml')
+    parser.add_argument('--no_progress', action='store_true',
+                        help='do not show progress bar')
+    parser.add_argument('--startup_report', action='store_true',
+                        help='print elapsed time of each startup phase')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume processing from checkpoint')
+    args = parser.parse_args()
+    startup_report = StartupReport()
+    startup_report.mark('import')
+
+    # Load config from yaml file
+    config = load_config(args.config_path)
 
-        # output Process
-        output_writer(detect, image, timestamp)
+    run(config, args.resume, args.no_progress,
+        startup_report if args.startup_report else None)
 
 
 if __name__ == '__main__':
@@ -16,9 +16,17 @@ limitations under the License.
 
 import os
 import json
-import cv2
+from collections import deque
+from concurrent import futures
 
 import output
+import stage_metrics
+import timestamp_util
+
+
+def _timestamp_string(timestamp, length=timestamp_util.TIMESTAMP_LENGTH):
+    return timestamp_util.to_string(timestamp, length) if timestamp is not None else None
+
 
 class CrowdCountOutput(output.Output) :
     """Output Class for Crowd Count
@@ -27,13 +35,25 @@ class CrowdCountOutput(output.Output) :
         Output (class): Output interface class
     """
 
-    def __init__(self, config, image_info, param_info):
+    RENDER_POLICIES = ('all', 'events')
+
+    # actions of a video frame
+    RENDER_WRITE = 'write'          # write buffered frames and this frame
+    RENDER_KEYFRAME = 'keyframe'    # drop buffered frames and write this frame
+    RENDER_BUFFER = 'buffer'        # keep this frame as pre-roll
+
+    def __init__(self, config, image_info, param_info, metrics=None):
         # Init
         self._counter = 0
+        self._timestamp_length = timestamp_util.TIMESTAMP_LENGTH
+        self._metrics = stage_metrics.NULL_METRICS
+        if metrics is not None:
+            self._metrics = metrics
 
         # Get config param
         output_dir = config['output_dir']
-        self._output_video = image_info['image_flg']
+        # optional: no video, e.g. when only thumbnails are written
+        self._output_video = image_info['image_flg'] and config.get('output_video', True)
 
         # Make output json directory
         self._json_output_dir = os.path.join(output_dir, 'detect/')
@@ -41,115 +61,456 @@ class CrowdCountOutput(output.Output) :
 
         # Output video setting
         if self._output_video is True:
+            # used by close, even if a parameter below is invalid
+            self._video_writer = None
+            self._segment_finisher = None
+            self._pre_roll = deque()
+
             video_output_dir = os.path.join(output_dir, 'video/')
             os.makedirs(video_output_dir, exist_ok=True)
 
-            output_name = image_info['image_name']
-            frame_rate = config['output_video_fps']
+            self._output_name = image_info['image_name']
+            self._video_output_dir = video_output_dir
+            self._frame_rate = config['output_video_fps']
             self._width = config['output_video_width']
             self._height = config['output_video_height']
+            # optional: rotate video file every N frames or seconds of video
+            self._segment_frames = config.get('video_segment_frames', 0)
+            segment_seconds = config.get('video_segment_seconds', 0)
 
-            video_file_name = video_output_dir + output_name + '_crowd_count.mp4'
-            fourcc = cv2.VideoWriter_fourcc('m','p','4','v')
-            self._video_writer = cv2.VideoWriter(
-                video_file_name, fourcc, frame_rate, (self._width, self._height)
-            )
+            # Check parameter
+            if self._segment_frames < 0 or segment_seconds < 0:
+                raise ValueError(
+                    'video_segment_frames and video_segment_seconds must be 0 or more')
+            if self._segment_frames > 0 and segment_seconds > 0:
+                raise ValueError(
+                    'only one of video_segment_frames and video_segment_seconds can be set')
+            if segment_seconds > 0:
+                self._segment_frames = max(1, round(segment_seconds * self._frame_rate))
+
+            # optional: encode only frames around count changes (see _render_action)
+            self._render_policy = config.get('render_policy', 'all')
+            self._render_on_change = config.get('render_on_change', True)
+            self._render_thresholds = config.get('render_thresholds', [])
+            self._render_pre_roll = config.get('render_pre_roll', 30)
+            self._render_post_roll = config.get('render_post_roll', 30)
+            self._render_keyframe_interval = config.get('render_keyframe_interval', 300)
+
+            # Check parameter
+            if self._render_policy not in self.RENDER_POLICIES:
+                raise ValueError(f'render_policy should be one of {self.RENDER_POLICIES}')
+            if self._render_pre_roll < 0 or self._render_post_roll < 0 \
+                or self._render_keyframe_interval < 0:
+                raise ValueError(
+                    'render_pre_roll, render_post_roll and render_keyframe_interval '
+                    'must be 0 or more')
+
+            self._previous_count = None
+            self._post_roll_left = 0
+            self._frames_since_write = 0
+            self._pre_roll_frames = 0
+
+            # video file is opened at the first frame (see set_state)
+            self._video_sink = None
+            self._video_frames = 0
+            self._video_start_frame = 0
+
+            # segments are finished in the background in order
+            self._segment_index_file = os.path.join(
+                video_output_dir, self._output_name + '_crowd_count_segments.jsonl')
+            self._segment = None
+            self._segment_skip = None
+            if self._segment_frames > 0:
+                self._segment_finisher = futures.ThreadPoolExecutor(max_workers=1)
 
             self._param_info = {}
-            self._param_info['area_point_len'] = param_info['area_point_len']
-            self._param_info['area_point'] = param_info['area_point']
-            self._param_info['area_num'] = param_info['area_num']
+            self.update_param_info(param_info)
 
     def __del__(self):
-        if self._output_video is True:
+        self.close()
+
+
+    def close(self):
+        """finish video file
+
+        Frames of pre-roll which were not followed by an event are not written.
+        """
+        if self._output_video is not True:
+            return
+        while self._pre_roll:
+            self._release_frame(self._pre_roll.popleft())
+        if self._segment_finisher is not None:
+            if self._video_writer is not None:
+                self._finish_segment()
+            self._segment_finisher.shutdown(wait=True)
+        elif self._video_writer is not None:
             self._video_writer.release()
+            self._video_writer = None
+
+
+    def set_video_sink(self, video_sink):
+        """render video in another process
+
+        Frames are passed to video_sink (FramePipeline) instead of being
+        rendered here. Only json is written by this instance.
+
+        Args:
+            video_sink (FramePipeline): sink with render, update_param_info
+                and set_timestamp_length
+        """
+        self._video_sink = video_sink
+        self._video_sink.set_timestamp_length(self._timestamp_length)
+
+
+    def set_timestamp_length(self, length):
+        """set length of timestamp strings written to json and segment index
+
+        Args:
+            length (int): length of timestamp strings of the input
+        """
+        self._timestamp_length = length
+        if self._output_video is True and self._video_sink is not None:
+            self._video_sink.set_timestamp_length(length)
+
+
+    def update_param_info(self, param_info):
+        """update area parameter used for overlay
+
+        Args:
+            param_info (dict): inpolygon parameter
+        """
+        if self._output_video is True:
+            self._param_info = {
+                'area_point_len': param_info['area_point_len'],
+                'area_point': param_info['area_point'],
+                'area_num': param_info['area_num']
+            }
+            if self._video_sink is not None:
+                self._video_sink.update_param_info(param_info)
+
+
+    def get_state(self):
+        """get output state for checkpoint
+
+        Returns:
+            dict: output state
+        """
+        state = {'counter': self._counter}
+        if self._output_video is True:
+            state['video_frames'] = self._video_frames
+            if self._render_policy == 'events':
+                state['render'] = {
+                    'previous_count': self._previous_count,
+                    'post_roll_left': self._post_roll_left,
+                    'frames_since_write': self._frames_since_write
+                }
+        return state
+
+
+    def set_state(self, state):
+        """restore output state from checkpoint
+
+        mp4 files cannot be appended, so the video after resume is written
+        to a new file whose name has the index of its first frame.
+        With segments, frames in segments finished before the stop are not
+        written again, and the video continues in a new segment.
+
+        Args:
+            state (dict): output state
+        """
+        self._counter = state['counter']
+        if self._output_video is True:
+            if self._video_writer is not None:
+                raise RuntimeError('state must be set before the first output')
+            self._video_frames = state.get('video_frames', 0)
+            self._video_start_frame = self._video_frames
+            # frames of pre-roll before resume are not kept
+            if 'render' in state:
+                self._previous_count = state['render']['previous_count']
+                self._post_roll_left = state['render']['post_roll_left']
+                self._frames_since_write = state['render']['frames_since_write']
+
 
+    def _open_video_writer(self):
+        import cv2
 
-    def __call__(self, dict_meta, image=None, timestamp=None):
+        video_file_name = self._video_output_dir + self._output_name + '_crowd_count'
+        if self._segment_finisher is not None:
+            # segment is renamed when it is finished, so a file
+            # without '.partial' is always complete
+            video_file_name += f'_{self._video_frames:08d}'
+            self._segment = {
+                'file': os.path.basename(video_file_name) + '.mp4',
+                'first_frame': self._video_frames,
+                'first_timestamp': None,
+                'last_timestamp': None
+            }
+            video_file_name += '.partial'
+        elif self._video_start_frame > 0:
+            video_file_name += f'_from{self._video_start_frame:08d}'
+        video_file_name += '.mp4'
+        fourcc = cv2.VideoWriter_fourcc('m','p','4','v')
+        self._video_writer = cv2.VideoWriter(
+            video_file_name, fourcc, self._frame_rate, (self._width, self._height)
+        )
+
+
+    def _load_segment_index(self):
+        # called once before the first segment,
+        # returns the number of frames which are already in segments
+        entries = []
+        if self._video_start_frame > 0 and os.path.exists(self._segment_index_file):
+            with open(self._segment_index_file, 'r', encoding='utf-8') as file:
+                entries = [json.loads(line) for line in file if line.strip()]
+        # segments before the resumed frame are kept, and frames in
+        # the kept segments are skipped
+        entries = [
+            entry for entry in entries if entry['first_frame'] < self._video_start_frame]
+        with open(self._segment_index_file + '.tmp', 'w', encoding='utf-8') as file:
+            for entry in entries:
+                file.write(json.dumps(entry) + '\n')
+        os.replace(self._segment_index_file + '.tmp', self._segment_index_file)
+        return entries[-1]['last_frame'] + 1 if entries else 0
+
+
+    def _finish_segment(self):
+        segment = {
+            'file': self._segment['file'],
+            'first_frame': self._segment['first_frame'],
+            'last_frame': self._video_frames - 1,
+            'frames': self._video_frames - self._segment['first_frame'],
+            'first_timestamp': _timestamp_string(
+                self._segment['first_timestamp'], self._timestamp_length),
+            'last_timestamp': _timestamp_string(
+                self._segment['last_timestamp'], self._timestamp_length),
+            'fps': self._frame_rate
+        }
+        video_writer = self._video_writer
+        self._video_writer = None
+        self._segment = None
+        self._segment_finisher.submit(self._write_segment, video_writer, segment)
+
+
+    def _write_segment(self, video_writer, segment):
+        # runs in the background thread
+        video_writer.release()
+        video_file_name = os.path.join(self._video_output_dir, segment['file'])
+        os.replace(video_file_name[:-len('.mp4')] + '.partial.mp4', video_file_name)
+        with open(self._segment_index_file, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(segment) + '\n')
+
+
+    def __call__(self, dict_meta, image=None, timestamp=None, frame=None):
         """output crowd count result
 
         Args:
             dict_meta (dict): meta data
             image (numpy.ndarray, optional): image data. Defaults to None.
-            timestamp (str, optional): timestamp string. Defaults to None.
+            timestamp (int, optional): timestamp in epoch milliseconds. Defaults to None.
+            frame (int, optional): frame index in the input, which names the json
+                file without timestamp when frames are skipped.
+                Defaults to None (number of outputs).
         """
 
-        # add timestamp for json output
+        # add timestamp string for json output
         if timestamp is not None:
-            dict_meta['timestamp'] = timestamp
+            dict_meta['timestamp'] = timestamp_util.to_string(
+                timestamp, self._timestamp_length)
 
         # output json
         if timestamp is not None:
-            json_file_name = timestamp
+            json_file_name = dict_meta['timestamp']
         else:
-            json_file_name = f'{self._counter:08d}'
-            self._counter += 1
+            if frame is None:
+                frame = self._counter
+            json_file_name = f'{frame:08d}'
+            self._counter = frame + 1
 
-        with open(
-                self._json_output_dir + json_file_name + '.json', 'w', encoding='utf-8'
-            ) as file:
-            json.dump(dict_meta, file, indent=4)
+        with self._metrics.measure('json_write'):
+            with open(
+                    self._json_output_dir + json_file_name + '.json', 'w', encoding='utf-8'
+                ) as file:
+                json.dump(dict_meta, file, indent=4)
 
         # output movie
         if self._output_video is True and image is not None:
+            action = self._render_action(dict_meta['count'])
+            if self._video_sink is not None:
+                self._video_sink.render(dict_meta, image, timestamp, action)
+                # same number of frames as written by the sink
+                if action == self.RENDER_BUFFER:
+                    self._pre_roll_frames = min(
+                        self._pre_roll_frames + 1, self._render_pre_roll)
+                else:
+                    if action == self.RENDER_WRITE:
+                        self._video_frames += self._pre_roll_frames
+                    self._video_frames += 1
+                    self._pre_roll_frames = 0
+            else:
+                self.write_video(dict_meta, image, timestamp, action)
+
+
+    def write_video(self, dict_meta, image, timestamp=None, action=RENDER_WRITE,
+                    release=None):
+        """render result on image and write it to video
+
+        Args:
+            dict_meta (dict): meta data
+            image (numpy.ndarray): image data
+            timestamp (int, optional): timestamp in epoch milliseconds. Defaults to None.
+            action (str, optional): action of the frame (see _render_action).
+                Defaults to RENDER_WRITE.
+            release (callable, optional): called when the image is no longer used.
+                Defaults to None.
+        """
+        frame = (dict_meta, image, timestamp, release)
+        if action == self.RENDER_BUFFER:
+            if self._render_pre_roll == 0:
+                self._release_frame(frame)
+                return
+            if len(self._pre_roll) == self._render_pre_roll:
+                self._release_frame(self._pre_roll.popleft())
+            self._pre_roll.append(frame)
+            self._metrics.increment('video_frames_skipped')
+            return
+
+        while self._pre_roll:
+            buffered = self._pre_roll.popleft()
+            if action == self.RENDER_WRITE:
+                self._write_frame(*buffered[:3])
+            self._release_frame(buffered)
+        self._write_frame(dict_meta, image, timestamp)
+        self._release_frame(frame)
+
+
+    def _render_action(self, count):
+        # every frame is written without policy
+        if self._render_policy == 'all':
+            return self.RENDER_WRITE
+
+        previous = self._previous_count
+        self._previous_count = list(count)
+        event = previous is None
+        if not event and self._render_on_change:
+            event = previous != count
+        if not event:
+            for area, threshold in enumerate(self._render_thresholds[:len(count)]):
+                if (previous[area] >= threshold) != (count[area] >= threshold):
+                    event = True
+
+        if event:
+            self._post_roll_left = self._render_post_roll
+            action = self.RENDER_WRITE
+        elif self._post_roll_left > 0:
+            self._post_roll_left -= 1
+            action = self.RENDER_WRITE
+        elif self._render_keyframe_interval > 0 \
+            and self._frames_since_write + 1 >= self._render_keyframe_interval:
+            action = self.RENDER_KEYFRAME
+        else:
+            action = self.RENDER_BUFFER
+
+        if action == self.RENDER_BUFFER:
+            self._frames_since_write += 1
+        else:
+            self._frames_since_write = 0
+        return action
+
+
+    @staticmethod
+    def _release_frame(frame):
+        if frame[3] is not None:
+            frame[3]()
 
-            font_scale = min(self._width, self._height) * 0.001 
-
-            for polygon, num_len \
-                in zip(
-                self._param_info['area_point'], self._param_info['area_point_len']):
-                for i in range(num_len-1):
-                    cv2.line(image,
-                        (polygon[i][0], polygon[i][1]),
-                        (polygon[i+1][0], polygon[i+1][1]),
-                        (0, 255, 0), thickness=4
-                    )
+
+    def _write_frame(self, dict_meta, image, timestamp):
+        if self._segment_finisher is not None:
+            if self._segment_skip is None:
+                self._segment_skip = self._load_segment_index()
+            # frame is already in a segment finished before resume
+            if self._video_frames < self._segment_skip:
+                self._video_frames += 1
+                return
+            if self._video_writer is not None \
+                and self._video_frames % self._segment_frames == 0:
+                self._finish_segment()
+
+        with self._metrics.measure('render'):
+            image = self._render(dict_meta, image, timestamp)
+
+        # write video
+        with self._metrics.measure('video_write'):
+            if self._video_writer is None:
+                self._open_video_writer()
+            self._video_writer.write(image)
+        self._video_frames += 1
+
+        if self._segment is not None:
+            if self._segment['first_timestamp'] is None:
+                self._segment['first_timestamp'] = timestamp
+            self._segment['last_timestamp'] = timestamp
+
+
+    def _render(self, dict_meta, image, timestamp):
+        # cv2 is only needed for video output
+        import cv2
+
+        font_scale = min(self._width, self._height) * 0.001 
+
+        for polygon, num_len \
+            in zip(
+            self._param_info['area_point'], self._param_info['area_point_len']):
+            for i in range(num_len-1):
                 cv2.line(image,
-                    (polygon[0][0], polygon[0][1]),
-                    (polygon[num_len-1][0], polygon[num_len-1][1]),
+                    (polygon[i][0], polygon[i][1]),
+                    (polygon[i+1][0], polygon[i+1][1]),
                     (0, 255, 0), thickness=4
                 )
+            cv2.line(image,
+                (polygon[0][0], polygon[0][1]),
+                (polygon[num_len-1][0], polygon[num_len-1][1]),
+                (0, 255, 0), thickness=4
+            )
 
 
-            for bbox, score in zip(dict_meta['bboxes'], dict_meta['bboxes_score']):
-                cv2.rectangle(
-                    image,(bbox['left'],bbox['top']),
-                    (bbox['right'],bbox['bottom']),
-                    (0,0,255),2
-                )
-                cv2.putText(
-                    image, f'{int(score*100)}%', (bbox['left'], bbox['top']-8),
-                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,0,255), 1, cv2.LINE_AA
-                )
+        for bbox, score in zip(dict_meta['bboxes'], dict_meta['bboxes_score']):
+            cv2.rectangle(
+                image,(bbox['left'],bbox['top']),
+                (bbox['right'],bbox['bottom']),
+                (0,0,255),2
+            )
+            cv2.putText(
+                image, f'{int(score*100)}%', (bbox['left'], bbox['top']-8),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,0,255), 1, cv2.LINE_AA
+            )
 
-            for position in dict_meta['positiones']:
-                cv2.drawMarker(image,
-                    position=[position['x'], position['y']],
-                    color=(0, 255, 0),
-                    markerType=cv2.MARKER_CROSS,
-                    markerSize=20,
-                    thickness=2,
-                    line_type=cv2.LINE_4
-                )
+        for position in dict_meta['positiones']:
+            cv2.drawMarker(image,
+                position=[position['x'], position['y']],
+                color=(0, 255, 0),
+                markerType=cv2.MARKER_CROSS,
+                markerSize=20,
+                thickness=2,
+                line_type=cv2.LINE_4
+            )
 
-            for area in range(self._param_info['area_num']):
-                text='Count(area'+str(area+1)+'):'+str(dict_meta['count'][area])
-                (text_width, text_height), baseline = cv2.getTextSize(
-                    text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0
-                ) 
-                cv2.putText(
-                    image, text, (5,((2*text_height)*(area+1))),
-                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,225,0), 1, cv2.LINE_AA
-                )
+        for area in range(self._param_info['area_num']):
+            text='Count(area'+str(area+1)+'):'+str(dict_meta['count'][area])
+            (text_width, text_height), baseline = cv2.getTextSize(
+                text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0
+            ) 
+            cv2.putText(
+                image, text, (5,((2*text_height)*(area+1))),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,225,0), 1, cv2.LINE_AA
+            )
 
-            if timestamp is not None:
-                timestamp_text=timestamp[:4]+'-'+timestamp[4:6]+'-'+timestamp[6:8] \
-                            +' '+timestamp[8:10]+':'+timestamp[10:12]+':'+timestamp[12:14]
-                cv2.putText(
-                    image, timestamp_text, (5, self._height-(2*text_height)),
-                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,225,0), 1, cv2.LINE_AA
-                )
+        if timestamp is not None:
+            timestamp_text = timestamp_util.to_display(timestamp)
+            cv2.putText(
+                image, timestamp_text, (5, self._height-(2*text_height)),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,225,0), 1, cv2.LINE_AA
+            )
 
-            # write video
-            image = cv2.resize(image, (self._width, self._height))
-            self._video_writer.write(image)
+        image = cv2.resize(image, (self._width, self._height))
+
+        return image
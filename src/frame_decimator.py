@@ -0,0 +1,161 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import math
+import numpy as np
+
+
+class FrameDecimator() :
+    """process every Nth frame when the host cannot keep up with the input
+
+    The processing time of each processed frame is smoothed and compared
+    with the time between input frames. Every adjust_interval processed
+    frames, the step N is raised at once to the smallest value for which
+    the smoothed time of one processed frame fits in N input frames at
+    target_load, or lowered by one if a smaller step would fit. So the
+    throughput degrades to every Nth frame instead of the delay growing
+    without bound, and recovers gradually when the load drops.
+
+    Args:
+        config (dict): decimation settings
+        timestamp_list (numpy.ndarray): timestamps in epoch milliseconds
+            used to find the input rate, may be empty
+        default_fps (float): input rate used without timestamps and input_fps
+    """
+
+    def __init__(self, config, timestamp_list, default_fps):
+
+        # Get parameter from config
+        self._input_fps = config.get('input_fps', 0)
+        self._target_load = config.get('target_load', 0.9)
+        self._max_step = config.get('max_step', 8)
+        self._latency_smoothing = config.get('latency_smoothing', 0.1)
+        self._adjust_interval = config.get('adjust_interval', 30)
+
+        # Check parameter
+        if self._input_fps < 0:
+            raise ValueError('input_fps must be 0 or more')
+        if not 0 < self._target_load <= 1:
+            raise ValueError('target_load must be set in the range of 0 (exclusive) to 1')
+        if self._max_step < 1 or self._adjust_interval < 1:
+            raise ValueError('max_step and adjust_interval must be 1 or more')
+        if not 0 < self._latency_smoothing <= 1:
+            raise ValueError('latency_smoothing must be set in the range of 0 (exclusive) to 1')
+
+        # seconds between input frames
+        self.frame_interval = self._find_frame_interval(timestamp_list, default_fps)
+
+        self.step = 1
+        self.frame_gap = 1
+        self._latency = None
+        self._last_frame = None
+        self._processed = 0
+        self._skipped = 0
+
+    def _find_frame_interval(self, timestamp_list, default_fps):
+        if self._input_fps > 0:
+            return 1.0 / self._input_fps
+        if len(timestamp_list) >= 2:
+            intervals = np.diff(np.asarray(timestamp_list, dtype=np.int64))
+            interval = float(np.median(intervals)) / 1000.0
+            if interval > 0:
+                return interval
+        if default_fps <= 0:
+            raise ValueError('input_fps must be set when the input rate is unknown')
+        return 1.0 / default_fps
+
+    def should_process(self, frame):
+        """check if a frame is processed or skipped
+
+        Args:
+            frame (int): frame index
+
+        Returns:
+            bool: True if the frame is processed, frame_gap is then the number
+                of frames since the previous processed frame
+        """
+        if self._last_frame is not None:
+            gap = frame - self._last_frame
+            if 0 < gap < self.step:
+                self._skipped += 1
+                return False
+            self.frame_gap = max(gap, 1)
+        self._last_frame = frame
+        return True
+
+    def observe(self, seconds):
+        """record processing time of a processed frame
+
+        Args:
+            seconds (float): processing time of the frame
+        """
+        if self._latency is None:
+            self._latency = seconds
+        else:
+            self._latency += self._latency_smoothing * (seconds - self._latency)
+        self._processed += 1
+        if self._processed % self._adjust_interval == 0:
+            self._adjust()
+
+    def _adjust(self):
+        # smallest step whose input time covers one processed frame
+        required = math.ceil(self._latency / (self.frame_interval * self._target_load))
+        required = min(max(required, 1), self._max_step)
+        if required > self.step:
+            self.step = required
+        elif required < self.step:
+            # lower one step at a time to avoid switching back and forth
+            self.step -= 1
+
+    def stats(self):
+        """get statistics of decimation
+
+        Returns:
+            dict: processed and skipped frames, current step and smoothed latency
+        """
+        return {
+            'processed': self._processed,
+            'skipped': self._skipped,
+            'step': self.step,
+            'latency': self._latency if self._latency is not None else 0.0,
+            'frame_interval': self.frame_interval
+        }
+
+    def get_state(self):
+        """get decimation state for checkpoint
+
+        Returns:
+            dict: decimation state
+        """
+        return {
+            'step': self.step,
+            'latency': self._latency,
+            'last_frame': self._last_frame,
+            'processed': self._processed,
+            'skipped': self._skipped
+        }
+
+    def set_state(self, state):
+        """restore decimation state from checkpoint
+
+        Args:
+            state (dict): decimation state
+        """
+        self.step = state['step']
+        self._latency = state['latency']
+        self._last_frame = state['last_frame']
+        self._processed = state['processed']
+        self._skipped = state['skipped']
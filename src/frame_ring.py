@@ -0,0 +1,342 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import queue
+import functools
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+# processes are spawned on every platform, so they do not inherit threads
+_CONTEXT = multiprocessing.get_context('spawn')
+
+
+class FrameRing() :
+    """ring of preallocated frame slots in shared memory
+
+    A slot is acquired by the producer, written in place and handed to
+    other processes by its index, so frames are never pickled. The slot
+    returns to the ring when the last consumer releases it. When all slots
+    are in use, acquire waits, which limits the frames in flight.
+
+    The ring can be passed to child processes, which attach to the same
+    shared memory.
+
+    Args:
+        slot_num (int): number of slots
+        shape (tuple): shape of a frame
+        dtype (str, optional): type of a frame. Defaults to 'uint8'.
+    """
+
+    def __init__(self, slot_num, shape, dtype='uint8'):
+
+        # Check parameter
+        if slot_num < 1:
+            raise ValueError('slot_num must be 1 or more')
+
+        self._slot_num = slot_num
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._slot_size = int(np.prod(self._shape)) * self._dtype.itemsize
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=max(1, slot_num * self._slot_size))
+        self._owner = True
+        self._free = _CONTEXT.Queue()
+        for slot in range(slot_num):
+            self._free.put(slot)
+        self._frames = self._map_frames()
+
+    def __getstate__(self):
+        return {
+            'slot_num': self._slot_num, 'shape': self._shape, 'dtype': self._dtype.str,
+            'name': self._memory.name, 'free': self._free
+        }
+
+    def __setstate__(self, state):
+        self._slot_num = state['slot_num']
+        self._shape = state['shape']
+        self._dtype = np.dtype(state['dtype'])
+        self._slot_size = int(np.prod(self._shape)) * self._dtype.itemsize
+        self._memory = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+        self._free = state['free']
+        self._frames = self._map_frames()
+
+    @property
+    def slot_num(self):
+        """int: number of slots"""
+        return self._slot_num
+
+    @property
+    def shape(self):
+        """tuple: shape of a frame"""
+        return self._shape
+
+    def acquire(self, timeout=None):
+        """take a free slot
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to None (no limit).
+
+        Returns:
+            int: slot index, None if no slot became free in time
+        """
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        """return a slot to the ring
+
+        Args:
+            slot (int): slot index
+        """
+        self._free.put(slot)
+
+    def view(self, slot):
+        """get frame of a slot without copy
+
+        Args:
+            slot (int): slot index
+
+        Returns:
+            numpy.ndarray: frame in shared memory
+        """
+        return self._frames[slot]
+
+    def slot_of(self, frame):
+        """find the slot of a frame returned by view
+
+        Args:
+            frame (numpy.ndarray): frame
+
+        Returns:
+            int: slot index, None if the frame is not in the ring
+        """
+        if not isinstance(frame, np.ndarray):
+            return None
+        offset = frame.__array_interface__['data'][0] \
+            - self._frames.__array_interface__['data'][0]
+        if offset < 0 or offset % self._slot_size != 0 \
+            or offset // self._slot_size >= self._slot_num:
+            return None
+        return offset // self._slot_size
+
+    def close(self):
+        """detach from shared memory, and free it in the creating process
+
+        """
+        self._frames = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def _map_frames(self):
+        return np.ndarray(
+            (self._slot_num,) + self._shape, dtype=self._dtype, buffer=self._memory.buf)
+
+
+def _decode_worker(video_file, skip_frames, ring, ready, stop):
+    # cv2 is only needed in the decoder process
+    import cv2
+
+    cap = cv2.VideoCapture(video_file)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f'cannot open {video_file}')
+        for _ in range(skip_frames):
+            if not cap.grab():
+                break
+
+        while not stop.is_set():
+            slot = ring.acquire(timeout=0.1)
+            if slot is None:
+                continue
+            frame = ring.view(slot)
+            # decode into the slot when the size matches
+            ret, image = cap.read(frame)
+            if not ret:
+                ring.release(slot)
+                break
+            if image.shape != frame.shape:
+                raise ValueError(
+                    f'frame size {image.shape} is different from {frame.shape}')
+            if image is not frame:
+                frame[...] = image
+            ready.put(slot)
+    except Exception as error:  # pylint: disable=broad-except
+        ready.put(error)
+    finally:
+        cap.release()
+        ready.put(None)
+        ring.close()
+
+
+def _render_worker(output_config, image_info, param_info, state, ring, requests):
+    import crowd_count_output
+
+    output_writer = crowd_count_output.CrowdCountOutput(
+        output_config, image_info, param_info)
+    output_writer.set_state(state)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        if request[0] == 'param':
+            output_writer.update_param_info(request[1])
+            continue
+        if request[0] == 'timestamp_length':
+            output_writer.set_timestamp_length(request[1])
+            continue
+        _, slot, dict_meta, timestamp, action = request
+        # slot is kept while the frame is in pre-roll
+        output_writer.write_video(
+            dict_meta, ring.view(slot), timestamp, action,
+            functools.partial(ring.release, slot))
+    output_writer.close()
+    ring.close()
+
+
+class FramePipeline() :
+    """decode and render video in separate processes
+
+    The decoder process writes frames of the video into a FrameRing and
+    sends their slot indexes. The main process counts with the frames in
+    place, and the renderer process draws on the same slots and writes
+    the output video. Only slot indexes and detection results are passed
+    through queues.
+
+    Args:
+        config (dict): pipeline settings
+        video_file (str): input video
+        skip_frames (int): number of frames to skip at the beginning
+        output_config (dict): output settings
+        image_info (dict): information of image
+        param_info (dict): inpolygon parameter
+        output_state (dict): state of output for the name of video file
+    """
+
+    def __init__(self, config, video_file, skip_frames,
+                 output_config, image_info, param_info, output_state):
+
+        # Get parameter from config
+        slot_num = config.get('slots', 8)
+
+        # Check parameter
+        if slot_num < 2:
+            raise ValueError('slots must be 2 or more')
+        if output_config.get('render_policy', 'all') == 'events' \
+            and slot_num < output_config.get('render_pre_roll', 30) + 2:
+            raise ValueError('slots must be larger than render_pre_roll + 1')
+
+        # frame size is known before decoding
+        import cv2
+        cap = cv2.VideoCapture(video_file)
+        if not cap.isOpened():
+            raise ValueError(f'cannot open {video_file}')
+        shape = (
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        cap.release()
+
+        self._ring = FrameRing(slot_num, shape)
+        self._ready = _CONTEXT.Queue()
+        self._requests = _CONTEXT.Queue()
+        self._stop = _CONTEXT.Event()
+        self._finished = False
+        self._decoder = _CONTEXT.Process(
+            target=_decode_worker,
+            args=(video_file, skip_frames, self._ring, self._ready, self._stop),
+            daemon=True)
+        self._renderer = _CONTEXT.Process(
+            target=_render_worker,
+            args=(output_config, image_info, param_info, output_state,
+                  self._ring, self._requests),
+            daemon=True)
+        self._decoder.start()
+        self._renderer.start()
+
+    def next_frame(self):
+        """get next decoded frame
+
+        Returns:
+            numpy.ndarray: frame in shared memory, None at the end of video
+        """
+        if self._finished:
+            return None
+        slot = self._ready.get()
+        if isinstance(slot, Exception):
+            raise RuntimeError('decoder process failed') from slot
+        if slot is None:
+            self._finished = True
+            return None
+        return self._ring.view(slot)
+
+    def render(self, dict_meta, image, timestamp, action):
+        """send a frame to the renderer process
+
+        Args:
+            dict_meta (dict): detect result
+            image (numpy.ndarray): frame returned by next_frame
+            timestamp (int): timestamp in epoch milliseconds
+            action (str): action of the frame (see CrowdCountOutput.write_video)
+        """
+        slot = self._ring.slot_of(image)
+        if slot is None:
+            raise ValueError('image is not a frame of the pipeline')
+        self._requests.put(('frame', slot, dict_meta, timestamp, action))
+
+    def skip_frame(self, image):
+        """return a frame which is not rendered to the ring
+
+        Args:
+            image (numpy.ndarray): frame returned by next_frame
+        """
+        slot = self._ring.slot_of(image)
+        if slot is None:
+            raise ValueError('image is not a frame of the pipeline')
+        self._ring.release(slot)
+
+    def update_param_info(self, param_info):
+        """send area parameter used for overlay to the renderer process
+
+        Args:
+            param_info (dict): inpolygon parameter
+        """
+        self._requests.put(('param', param_info))
+
+    def set_timestamp_length(self, length):
+        """send length of timestamp strings to the renderer process
+
+        Args:
+            length (int): length of timestamp strings of the input
+        """
+        self._requests.put(('timestamp_length', length))
+
+    def close(self):
+        """wait for rendered frames and stop processes
+
+        """
+        self._requests.put(None)
+        self._renderer.join()
+        self._stop.set()
+        # frames decoded after the last meta data are not used
+        while not self._finished:
+            self._finished = self._ready.get() is None
+        self._decoder.join()
+        self._ring.close()
+        if self._renderer.exitcode != 0:
+            raise RuntimeError('renderer process failed')
@@ -0,0 +1,205 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+from collections import deque
+import numpy as np
+
+# rescale the grid before the weight of new points overflows
+_MAX_WEIGHT = 1e100
+
+
+class HeatmapAccumulator() :
+    """accumulate projected positions into a density grid
+
+    Each frame adds its points to a fixed grid, so the cost depends on
+    the number of points and not on the grid size.
+    mode 'cumulative' keeps all frames, 'decay' multiplies the grid by
+    decay every frame (done lazily by growing the weight of new points),
+    and 'window' keeps only the last window_frames frames.
+
+    Args:
+        config (dict): heatmap settings
+    """
+
+    MODES = ('cumulative', 'decay', 'window')
+
+    def __init__(self, config):
+
+        # Get parameter from config
+        self._image_width = config.get('image_width', 1920)
+        self._image_height = config.get('image_height', 1080)
+        self._cell_size = config.get('cell_size', 20)
+        self._mode = config.get('mode', 'decay')
+        self._decay = config.get('decay', 0.999)
+        self._window_frames = config.get('window_frames', 300)
+        self._snapshot_dir = config.get('snapshot_dir', '')
+        self._snapshot_interval = config.get('snapshot_interval', 0)
+        self._snapshot_image = config.get('snapshot_image', False)
+        self._overlay_alpha = config.get('overlay_alpha', 0.0)
+
+        # Check parameter
+        if self._cell_size < 1:
+            raise ValueError('cell_size must be 1 or more')
+        if self._mode not in self.MODES:
+            raise ValueError(f'mode should be one of {self.MODES}')
+        if not 0.0 < self._decay <= 1.0:
+            raise ValueError('decay must be set in the range of 0 (excluded) to 1')
+        if self._window_frames < 1:
+            raise ValueError('window_frames must be 1 or more')
+        if not 0.0 <= self._overlay_alpha <= 1.0:
+            raise ValueError('overlay_alpha must be set in the range of 0 to 1')
+
+        self._grid_width = -(-self._image_width // self._cell_size)
+        self._grid_height = -(-self._image_height // self._cell_size)
+        self._grid = np.zeros(self._grid_width * self._grid_height, dtype=np.float64)
+        self._weight = 1.0
+        self._window = deque()
+        self._frame = 0
+
+        if self._snapshot_dir:
+            os.makedirs(self._snapshot_dir, exist_ok=True)
+
+    @property
+    def snapshot_dir(self):
+        """str: directory of snapshots, empty if not saved"""
+        return self._snapshot_dir
+
+    @property
+    def overlay_alpha(self):
+        """float: blend ratio of heatmap on video, 0 if not overlaid"""
+        return self._overlay_alpha
+
+    def __call__(self, positiones):
+        """add positions of one frame
+
+        Args:
+            positiones (list): list of points (x, y) or dicts with 'x' and 'y'
+        """
+        if len(positiones) > 0 and isinstance(positiones[0], dict):
+            positiones = [(position['x'], position['y']) for position in positiones]
+        cells = self._cells(positiones)
+
+        if self._mode == 'decay':
+            # grid * decay is the same as the next points weighted by 1 / decay
+            self._weight /= self._decay
+            if self._weight > _MAX_WEIGHT:
+                self._grid /= self._weight
+                self._weight = 1.0
+            np.add.at(self._grid, cells, self._weight)
+        else:
+            np.add.at(self._grid, cells, 1.0)
+            if self._mode == 'window':
+                self._window.append(cells)
+                if len(self._window) > self._window_frames:
+                    np.subtract.at(self._grid, self._window.popleft(), 1.0)
+
+        self._frame += 1
+        if self._snapshot_dir and self._snapshot_interval > 0 \
+            and self._frame % self._snapshot_interval == 0:
+            self.save_snapshot()
+
+    def snapshot(self):
+        """get current heatmap
+
+        Returns:
+            numpy.ndarray: density of each cell, shape (grid height, grid width)
+        """
+        grid = self._grid / self._weight if self._mode == 'decay' else self._grid.copy()
+        return grid.reshape(self._grid_height, self._grid_width)
+
+    def save_snapshot(self, file_name=None):
+        """save current heatmap to snapshot_dir
+
+        Args:
+            file_name (str, optional): file name without extension.
+                Defaults to heatmap_<frame>.
+
+        Returns:
+            str: path of saved npy file
+        """
+        if file_name is None:
+            file_name = f'heatmap_{self._frame:08d}'
+        file_path = os.path.join(self._snapshot_dir, file_name + '.npy')
+        heatmap = self.snapshot()
+        np.save(file_path, heatmap)
+        if self._snapshot_image:
+            # cv2 is only needed for images
+            import cv2
+            cv2.imwrite(
+                os.path.join(self._snapshot_dir, file_name + '.png'),
+                self._colorize(heatmap))
+        return file_path
+
+    def overlay(self, image):
+        """blend heatmap on image
+
+        Args:
+            image (numpy.ndarray): image data
+
+        Returns:
+            numpy.ndarray: blended image
+        """
+        import cv2
+
+        color = cv2.resize(
+            self._colorize(self.snapshot()), (image.shape[1], image.shape[0]),
+            interpolation=cv2.INTER_LINEAR)
+        return cv2.addWeighted(
+            image, 1.0 - self._overlay_alpha, color, self._overlay_alpha, 0.0)
+
+    def get_state(self):
+        """get heatmap state for checkpoint
+
+        Returns:
+            dict: heatmap state (grid before division by weight, so that
+                resumed results are identical)
+        """
+        return {
+            'frame': self._frame,
+            'grid': self._grid.tolist(),
+            'weight': self._weight,
+            'window': [cells.tolist() for cells in self._window]
+        }
+
+    def set_state(self, state):
+        """restore heatmap state from checkpoint
+
+        Args:
+            state (dict): heatmap state
+        """
+        grid = np.asarray(state['grid'], dtype=np.float64)
+        if grid.shape != self._grid.shape:
+            raise ValueError('heatmap size does not match checkpoint')
+        self._frame = state['frame']
+        self._grid = grid
+        self._weight = state.get('weight', 1.0)
+        self._window = deque(
+            np.asarray(cells, dtype=np.intp) for cells in state['window'])
+
+    def _cells(self, positiones):
+        points = np.asarray(positiones, dtype=np.int64).reshape(-1, 2)
+        column = np.clip(points[:, 0] // self._cell_size, 0, self._grid_width - 1)
+        row = np.clip(points[:, 1] // self._cell_size, 0, self._grid_height - 1)
+        return (row * self._grid_width + column).astype(np.intp)
+
+    def _colorize(self, heatmap):
+        import cv2
+
+        peak = heatmap.max()
+        scaled = heatmap / peak if peak > 0 else heatmap
+        return cv2.applyColorMap(
+            (scaled * 255.0).astype(np.uint8), cv2.COLORMAP_JET)
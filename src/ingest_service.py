@@ -0,0 +1,511 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import re
+import json
+import time
+import struct
+import signal
+import asyncio
+import argparse
+import yaml
+
+import crowd_count
+import stage_metrics
+
+# message of tcp ingest and publish:
+# uint32 header length, uint32 payload length, header (JSON), payload
+MESSAGE_HEADER = struct.Struct('<II')
+MAX_HEADER_SIZE = 64 * 1024
+MAX_PAYLOAD_SIZE = 16 * 1024 * 1024
+
+_HTTP_PATH = re.compile(r'^/devices/([^/]+)/meta$')
+_HTTP_REASONS = {
+    200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'
+}
+
+
+def encode_message(header, payload):
+    """encode one tcp message
+
+    Args:
+        header (dict): message header (device_id, timestamp, sequence)
+        payload (bytes): serialized meta data
+
+    Returns:
+        bytes: encoded message
+    """
+    header_bytes = json.dumps(header).encode('utf-8')
+    return MESSAGE_HEADER.pack(len(header_bytes), len(payload)) + header_bytes + payload
+
+
+async def read_message(reader):
+    """read one tcp message
+
+    Args:
+        reader (asyncio.StreamReader): stream reader
+
+    Returns:
+        dict: message header, None at end of stream
+        bytes: serialized meta data
+    """
+    try:
+        prefix = await reader.readexactly(MESSAGE_HEADER.size)
+    except asyncio.IncompleteReadError as error:
+        if error.partial:
+            raise ValueError('message is truncated') from error
+        return None, None
+    header_size, payload_size = MESSAGE_HEADER.unpack(prefix)
+    if header_size > MAX_HEADER_SIZE or payload_size > MAX_PAYLOAD_SIZE:
+        raise ValueError('message is too large')
+    header = json.loads(await reader.readexactly(header_size))
+    payload = await reader.readexactly(payload_size)
+    return header, payload
+
+
+class ResultSink() :
+    """bounded queue of results for one consumer
+
+    publish never waits: when the consumer falls behind and the queue is
+    full, the oldest result is dropped, so a slow sink cannot stall
+    counting or the other sinks.
+
+    Args:
+        name (str): sink name
+        queue_size (int): maximum number of queued results
+    """
+
+    def __init__(self, name, queue_size):
+        self.name = name
+        self.dropped = 0
+        self._queue = asyncio.Queue(queue_size)
+
+    def publish(self, line):
+        """queue one result
+
+        Args:
+            line (bytes): result as a JSON line
+        """
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(line)
+
+    async def run(self):
+        """write queued results until cancelled
+
+        """
+        while True:
+            line = await self._queue.get()
+            await self.write(line)
+
+    async def write(self, line):
+        """write one result
+
+        Args:
+            line (bytes): result as a JSON line
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """write the remaining results
+
+        """
+        while not self._queue.empty():
+            await self.write(self._queue.get_nowait())
+
+
+class FileSink(ResultSink) :
+    """append results to a JSON lines file
+
+    Args:
+        file_path (str): output file
+        queue_size (int): maximum number of queued results
+    """
+
+    def __init__(self, file_path, queue_size):
+        super().__init__(f'file:{file_path}', queue_size)
+        output_dir = os.path.dirname(file_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self._file = open(file_path, 'ab')
+
+    async def write(self, line):
+        self._file.write(line)
+        if self._queue.empty():
+            self._file.flush()
+
+    async def close(self):
+        await super().close()
+        self._file.close()
+
+
+class StreamSink(ResultSink) :
+    """send results to a subscriber connection
+
+    Args:
+        writer (asyncio.StreamWriter): subscriber connection
+        queue_size (int): maximum number of queued results
+    """
+
+    def __init__(self, writer, queue_size):
+        super().__init__(f"subscriber:{writer.get_extra_info('peername')}", queue_size)
+        self._writer = writer
+
+    async def write(self, line):
+        self._writer.write(line)
+        await self._writer.drain()
+
+
+class IngestService() :
+    """count serialized meta data pushed by many devices
+
+    Messages are received over tcp (length-prefixed) or http (POST
+    /devices/<device_id>/meta), queued in a bounded queue and counted in
+    arrival order with one CrowdCount per device. Results are published
+    as JSON lines to the result file and to subscribers of publish_port.
+
+    When the ingest queue is full, overflow selects the behavior:
+    'block' stops reading from the senders (backpressure), 'drop_oldest'
+    drops the oldest queued message and 'reject' drops the new message
+    (http answers 503).
+
+    Args:
+        config (dict): ingest service settings
+        crowd_count_params (dict): crowd count parameters
+        metrics (StageMetrics, optional): metrics. Defaults to None.
+    """
+
+    OVERFLOWS = ('block', 'drop_oldest', 'reject')
+
+    def __init__(self, config, crowd_count_params, metrics=None):
+
+        # Get parameter from config
+        self._host = config.get('host', '127.0.0.1')
+        self._tcp_port = config.get('tcp_port', 0)
+        self._http_port = config.get('http_port', 0)
+        self._publish_port = config.get('publish_port', 0)
+        self._result_file = config.get('result_file', '')
+        self._queue_size = config.get('queue_size', 1024)
+        self._overflow = config.get('overflow', 'drop_oldest')
+        self._sink_queue_size = config.get('sink_queue_size', 1024)
+        self._max_devices = config.get('max_devices', 1000)
+
+        # Check parameter
+        if self._overflow not in self.OVERFLOWS:
+            raise ValueError(f'overflow should be one of {self.OVERFLOWS}')
+        if self._queue_size < 1 or self._sink_queue_size < 1:
+            raise ValueError('queue_size and sink_queue_size must be 1 or more')
+
+        self._metrics = stage_metrics.NULL_METRICS
+        if metrics is not None:
+            self._metrics = metrics
+        # fail at start instead of at the first message
+        crowd_count.CrowdCount.compile_config(crowd_count_params)
+        self._crowd_count_params = crowd_count_params
+        self._counters = {}
+        self._queue = None
+        self._sinks = []
+        self._servers = []
+        self._tasks = []
+        self._stats = {
+            'received': 0, 'processed': 0, 'dropped': 0, 'rejected': 0, 'errors': 0
+        }
+
+    @property
+    def ports(self):
+        """dict: listening port of each server (useful with port 0 in tests)"""
+        return {
+            name: server.sockets[0].getsockname()[1] for name, server in self._servers}
+
+    def stats(self):
+        """get service statistics
+
+        Returns:
+            dict: message counts, queue length, devices and dropped results of sinks
+        """
+        stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize() if self._queue is not None else 0
+        stats['devices'] = len(self._counters)
+        stats['sinks'] = {sink.name: sink.dropped for sink in self._sinks}
+        return stats
+
+    async def start(self):
+        """start servers and worker
+
+        """
+        self._queue = asyncio.Queue(self._queue_size)
+        if self._result_file:
+            self._add_sink(FileSink(self._result_file, self._sink_queue_size))
+        self._tasks.append(asyncio.ensure_future(self._worker()))
+
+        for name, port, handler in (
+                ('tcp', self._tcp_port, self._handle_tcp),
+                ('http', self._http_port, self._handle_http),
+                ('publish', self._publish_port, self._handle_subscriber)):
+            if port is None or port < 0:
+                continue
+            server = await asyncio.start_server(handler, self._host, port)
+            self._servers.append((name, server))
+
+    async def close(self):
+        """stop servers, count queued messages and flush sinks
+
+        """
+        for _, server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._queue is not None:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for sink in self._sinks:
+            await sink.close()
+
+    async def submit(self, device_id, payload, header=None):
+        """queue one message
+
+        Args:
+            device_id (str): device id
+            payload (bytes): serialized meta data
+            header (dict, optional): message header. Defaults to None.
+
+        Returns:
+            bool: False if the message was rejected
+        """
+        if header is None:
+            header = {}
+        self._stats['received'] += 1
+        if device_id not in self._counters and len(self._counters) >= self._max_devices:
+            self._stats['rejected'] += 1
+            return False
+
+        item = (device_id, payload, header, time.perf_counter())
+        if self._overflow == 'block':
+            await self._queue.put(item)
+        elif self._queue.full():
+            if self._overflow == 'reject':
+                self._stats['rejected'] += 1
+                return False
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self._stats['dropped'] += 1
+            self._queue.put_nowait(item)
+        else:
+            self._queue.put_nowait(item)
+        return True
+
+    def _add_sink(self, sink):
+        self._sinks.append(sink)
+        task = asyncio.ensure_future(sink.run())
+        self._tasks.append(task)
+        return task
+
+    def _counter(self, device_id):
+        counter = self._counters.get(device_id)
+        if counter is None:
+            counter = crowd_count.CrowdCount(self._crowd_count_params, self._metrics)
+            self._counters[device_id] = counter
+        return counter
+
+    async def _worker(self):
+        metrics = self._metrics
+        while True:
+            device_id, payload, header, received = await self._queue.get()
+            try:
+                detect = self._counter(device_id)(payload)
+            except Exception as error:  # pylint: disable=broad-except
+                # broken data of one device must not stop the service
+                self._stats['errors'] += 1
+                print(f'[ingest] {device_id}: {error}')
+                self._queue.task_done()
+                continue
+
+            result = {
+                'device_id': device_id,
+                'timestamp': header.get('timestamp'),
+                'sequence': header.get('sequence'),
+                'count': detect['count']
+            }
+            if 'line_count' in detect:
+                result['line_count'] = detect['line_count']
+            if 'class_count' in detect:
+                result['class_count'] = detect['class_count']
+            line = (json.dumps(result) + '\n').encode('utf-8')
+            for sink in self._sinks:
+                sink.publish(line)
+
+            self._stats['processed'] += 1
+            metrics.observe('ingest_latency', time.perf_counter() - received)
+            self._queue.task_done()
+
+            # let connections run between messages
+            await asyncio.sleep(0)
+
+    async def _handle_tcp(self, reader, writer):
+        try:
+            while True:
+                header, payload = await read_message(reader)
+                if header is None:
+                    break
+                await self.submit(str(header.get('device_id', '')), payload, header)
+        except (ValueError, ConnectionError) as error:
+            print(f'[ingest] tcp connection closed: {error}')
+        finally:
+            writer.close()
+
+    async def _handle_subscriber(self, reader, writer):
+        sink = StreamSink(writer, self._sink_queue_size)
+        task = self._add_sink(sink)
+        try:
+            # subscribers do not send data, wait until they disconnect
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            task.cancel()
+            self._sinks.remove(sink)
+            self._tasks.remove(task)
+            writer.close()
+
+    async def _handle_http(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body_size = int(headers.get('content-length', '0'))
+                if body_size > MAX_PAYLOAD_SIZE:
+                    await self._http_response(writer, 413, {'error': 'payload too large'})
+                    break
+                body = await reader.readexactly(body_size)
+
+                status, response = await self._http_route(method, path, headers, body)
+                await self._http_response(writer, status, response)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError) as error:
+            print(f'[ingest] http connection closed: {error}')
+        finally:
+            writer.close()
+
+    async def _http_route(self, method, path, headers, body):
+        if path == '/stats':
+            if method != 'GET':
+                return 405, {'error': 'method not allowed'}
+            return 200, self.stats()
+        match = _HTTP_PATH.match(path)
+        if match is None:
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'method not allowed'}
+        header = {
+            'device_id': match.group(1),
+            'timestamp': headers.get('x-timestamp'),
+            'sequence': headers.get('x-sequence')
+        }
+        if await self.submit(match.group(1), body, header):
+            return 202, {'queued': True}
+        return 503, {'queued': False}
+
+    @staticmethod
+    async def _http_response(writer, status, response):
+        body = json.dumps(response).encode('utf-8')
+        writer.write(
+            f'HTTP/1.1 {status} {_HTTP_REASONS[status]}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def _serve(service, metrics):
+    await service.start()
+    print(f'[ingest] listening {service.ports}')
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stop.set)
+        except NotImplementedError:
+            pass
+
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            metrics.report_if_due()
+
+    await service.close()
+    print(f'[ingest] {service.stats()}')
+
+
+def main():
+    """ingest service main process
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config_path', type=str, default='config/crowd_count_app.yaml')
+    args = parser.parse_args()
+
+    # Load config from yaml file
+    if os.path.exists(args.config_path):
+        with open(args.config_path, 'r', encoding='utf-8') as file:
+            config = yaml.safe_load(file)
+    else:
+        raise ValueError(f'cannot open {args.config_path}')
+
+    # Check config parameter
+    if not 'crowd_count_settings' in config:
+        raise ValueError('crowd_count settings is not found')
+    if not 'ingest_service_settings' in config:
+        raise ValueError('ingest service settings is not found')
+
+    with open(
+            config['crowd_count_settings']['param_file'], 'r', encoding='utf-8'
+        ) as file:
+        crowd_count_params = yaml.safe_load(file)
+
+    metrics = stage_metrics.NULL_METRICS
+    if 'metrics_settings' in config \
+        and config['metrics_settings'].get('enable', False):
+        metrics = stage_metrics.StageMetrics(config['metrics_settings'])
+        metrics.start_http_server()
+
+    service = IngestService(
+        config['ingest_service_settings'], crowd_count_params, metrics)
+    asyncio.run(_serve(service, metrics))
+
+    metrics.close()
+    if metrics is not stage_metrics.NULL_METRICS:
+        print(metrics.summary())
+
+
+if __name__ == '__main__':
+    main()
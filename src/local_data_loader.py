@@ -15,23 +15,14 @@ limitations under the License.
 """
 
 import os
-import sys
-import ast
-import pandas as pd
-import cv2
-import flatbuffers
+import csv
+import numpy as np
 
 import data_loader
-
-sys.path.append(os.path.join(os.path.dirname(__file__),'.'))
-sys.path.append(
-    os.path.join(os.path.dirname(__file__),'smart_camera_interface_schema'))
-
-import smart_camera_interface_schema.SmartCamera.BoundingBox as SBoundingBox
-import smart_camera_interface_schema.SmartCamera.BoundingBox2d as SBoundingBox2d
-import smart_camera_interface_schema.SmartCamera.GeneralObject as SGeneralObject
-import smart_camera_interface_schema.SmartCamera.ObjectDetectionData as SObjectDetectionData
-import smart_camera_interface_schema.SmartCamera.ObjectDetectionTop as SObjectDetectionTop
+import meta_archive
+import meta_serializer
+import stage_metrics
+import timestamp_util
 
 class LocalDataLoader(data_loader.DataLoader) :
     """load data from local file
@@ -40,18 +31,38 @@ class LocalDataLoader(data_loader.DataLoader) :
         DataLoader (class): load data interface class
     """
 
-    def __init__(self, config):
+    def __init__(self, config, metrics=None):
 
         # Init
         self._video_file = ''
         self._meta_file = ''
         self._image_data_list = []
         self._meta_data_list = []
-        self._meta_time_list = []
+        self._meta_time_list = np.empty(0, dtype=np.int64)
+        # timestamps are written with the length of the input
+        self._timestamp_length = timestamp_util.TIMESTAMP_LENGTH
+        self._metrics = stage_metrics.NULL_METRICS
+        if metrics is not None:
+            self._metrics = metrics
+        # one builder is reused for all frames
+        self._serializer = meta_serializer.MetaSerializer()
 
         # Get parameter from config
         self._video_file = config['video_file']
         self._meta_file = config['meta_file']
+        # optional: 'csv' (default) or 'archive' of meta_archive
+        self._meta_format = config.get('meta_format', 'csv')
+        # optional: frame range of archive (last frame is included)
+        self._first_frame = config.get('first_frame', None)
+        self._last_frame = config.get('last_frame', None)
+        self._archive = None
+        # video is decoded by FramePipeline instead (see defer_images)
+        self._defer_images = False
+        self._image_offset = 0
+
+        # Check parameter
+        if self._meta_format not in ('csv', 'archive'):
+            raise ValueError(f'{self._meta_format} is not supported')
 
     def __call__(self):
         """load data from local file
@@ -59,15 +70,19 @@ class LocalDataLoader(data_loader.DataLoader) :
         Returns:
             list: list of image data
             list: list of meta data
-            list: list of timestamp
+            numpy.ndarray: timestamps in epoch milliseconds (empty if not recorded)
         """
 
         # get images from video file
-        if isinstance(self._video_file, str) and self._video_file:
+        if isinstance(self._video_file, str) and self._video_file \
+            and not self._defer_images:
             self._get_images()
 
-        # get meta datas from text file
-        self._get_meta_data_list()
+        # get meta datas from text file or archive
+        if self._meta_format == 'archive':
+            self._get_archive_meta_data_list()
+        else:
+            self._get_meta_data_list()
 
         return self._image_data_list, self._meta_data_list, self._meta_time_list
 
@@ -94,7 +109,31 @@ class LocalDataLoader(data_loader.DataLoader) :
         return image_info
 
 
+    def defer_images(self):
+        """do not decode video, images are read by FramePipeline
+
+        Returns:
+            str: video file, empty if there is no video
+        """
+        if isinstance(self._video_file, str) and self._video_file:
+            self._defer_images = True
+            return self._video_file
+        return ''
+
+    @property
+    def image_offset(self):
+        """int: index in the video of the image of the first meta data"""
+        return self._image_offset
+
+    @property
+    def timestamp_length(self):
+        """int: length of timestamp strings of the input"""
+        return self._timestamp_length
+
+
     def _get_images(self):
+        # cv2 is only needed when a video file is given
+        import cv2
 
         cap = cv2.VideoCapture(self._video_file)
 
@@ -104,7 +143,8 @@ class LocalDataLoader(data_loader.DataLoader) :
 
         # get image data from video
         while True:
-            ret, frame = cap.read()
+            with self._metrics.measure('loader_decode'):
+                ret, frame = cap.read()
 
             if ret:
                 self._image_data_list.append(frame)
@@ -121,60 +161,42 @@ class LocalDataLoader(data_loader.DataLoader) :
         # read meta data from csv file
         # Column 1 is frame number
         # Column 2 is inference result string
-        data_frame = pd.read_csv(self._meta_file, index_col=0)
-
-        # csv loop
-        for _, row_data in data_frame.iterrows():
-            # Extract inference data
-            str_meta = row_data.values.tolist()[0]
-            # string to dictionary
-            dict_meta = ast.literal_eval(str_meta)
-
-            # dictionary to flatbuffers
-            serialize_meta = self._serialize_meta_data(dict_meta)
+        with self._metrics.measure('loader_fetch'):
+            with open(self._meta_file, 'r', encoding='utf-8', newline='') as file:
+                rows = list(csv.reader(file))
+
+        # csv loop (first row is header)
+        for row_data in rows[1:]:
+            if not row_data:
+                continue
+            with self._metrics.measure('loader_decode'):
+                # Extract inference data
+                str_meta = row_data[1]
+                # string to dictionary
+                dict_meta = meta_serializer.parse_meta_string(str_meta)
+
+                # dictionary to flatbuffers
+                serialize_meta = self._serialize_meta_data(dict_meta)
             self._meta_data_list.append(serialize_meta)
 
+    def _get_archive_meta_data_list(self):
+        # records are zero-copy slices of the memory mapped archive
+        with self._metrics.measure('loader_fetch'):
+            self._archive = meta_archive.MetaArchive(self._meta_file)
+            start, stop = self._archive.frame_range(
+                self._first_frame, self._last_frame)
+            self._meta_data_list = self._archive.read(start, stop)
+            timestamps = self._archive.timestamps(start, stop)
+
+        # timestamps are used only if recorded
+        if any(timestamps):
+            self._meta_time_list = timestamp_util.parse_array(timestamps)
+            self._timestamp_length = timestamp_util.get_length(timestamps)
+
+        # images at the same positions as the selected records
+        self._image_offset = start
+        if self._image_data_list and start > 0:
+            self._image_data_list = self._image_data_list[start:]
+
     def _serialize_meta_data(self, dict_meta):
-        general_obj_list = []
-        builder = flatbuffers.Builder(0)
-        for dict_general_object in dict_meta['perception']['object_detection_list']:
-            SBoundingBox2d.Start(builder)
-            SBoundingBox2d.AddLeft(
-                builder, dict_general_object['bounding_box']['left'])
-            SBoundingBox2d.AddTop(
-                builder, dict_general_object['bounding_box']['top'])
-            SBoundingBox2d.AddRight(
-                builder, dict_general_object['bounding_box']['right'])
-            SBoundingBox2d.AddBottom(
-                builder, dict_general_object['bounding_box']['bottom'])
-            body_bounding_box_fbs = SBoundingBox2d.End(builder)
-
-            SGeneralObject.Start(builder)
-            SGeneralObject.AddClassId(builder, dict_general_object['class_id'])
-            SGeneralObject.AddBoundingBoxType(
-                builder, SBoundingBox.BoundingBox().BoundingBox2d)
-            SGeneralObject.AddBoundingBox(builder, body_bounding_box_fbs)
-            SGeneralObject.AddScore(
-                builder, dict_general_object['score'])
-            general_obj = SGeneralObject.End(builder)
-            general_obj_list.append(general_obj)
-
-        SObjectDetectionData.StartObjectDetectionListVector(
-            builder, len(general_obj_list))
-        for counted_general_obj in general_obj_list:
-            builder.PrependUOffsetTRelative(counted_general_obj)
-        counted_general_obj_list_fb = builder.EndVector(len(general_obj_list))
-
-        SObjectDetectionData.Start(builder)
-        SObjectDetectionData.AddObjectDetectionList(
-            builder, counted_general_obj_list_fb)
-        object_buf = SObjectDetectionData.End(builder)
-
-        SObjectDetectionTop.Start(builder)
-        SObjectDetectionTop.AddPerception(builder, object_buf)
-        buf = SObjectDetectionTop.End(builder)
-        builder.Finish(buf)
-
-        serialize_meta = builder.Output()
-
-        return serialize_meta
+        return self._serializer(dict_meta)
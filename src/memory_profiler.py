@@ -0,0 +1,297 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import threading
+import tracemalloc
+import numpy as np
+
+
+def rss_bytes():
+    """get resident set size of this process
+
+    Returns:
+        int: bytes, 0 if unknown
+    """
+    try:
+        with open('/proc/self/statm', 'r', encoding='utf-8') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _StageMemory() :
+    """allocation statistics of one stage
+
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.retained = 0
+        self.allocated_peak = 0
+        self.max_peak = 0
+        self.max_retained = 0
+
+    def add(self, retained, peak):
+        self.calls += 1
+        self.retained += retained
+        self.allocated_peak += peak
+        self.max_peak = max(self.max_peak, peak)
+        self.max_retained = max(self.max_retained, retained)
+
+    def to_dict(self):
+        calls = max(self.calls, 1)
+        return {
+            'calls': self.calls,
+            'retained_bytes': self.retained,
+            'retained_bytes_per_call': self.retained / calls,
+            'max_retained_bytes': self.max_retained,
+            'peak_bytes_per_call': self.allocated_peak / calls,
+            'max_peak_bytes': self.max_peak
+        }
+
+
+class _MemoryTimer() :
+    """context manager of a stage timer with allocation accounting
+
+    """
+
+    def __init__(self, profiler, stage, timer):
+        self._profiler = profiler
+        self._stage = stage
+        self._timer = timer
+
+    def __enter__(self):
+        self._profiler.enter(self._stage)
+        self._timer.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._timer.__exit__(exc_type, exc_value, traceback)
+        self._profiler.exit(self._stage)
+        return False
+
+
+class MemoryProfiler() :
+    """account memory allocations of each stage with tracemalloc
+
+    The profiler wraps metrics, so every stage measured by the pipeline
+    also records the bytes it retains (traced memory after the stage minus
+    before) and its peak (highest traced memory during the stage above
+    the start). Nested stages are included in the stages around them.
+    The traced memory and RSS after each 'frame' stage are sampled to
+    estimate growth per frame, and snapshots are compared to list the
+    source lines whose allocations grew most.
+
+    Allocations are traced in the main thread only, tracing makes the
+    processing several times slower.
+
+    Args:
+        config (dict): memory profile settings
+        metrics (StageMetrics): metrics to wrap
+    """
+
+    def __init__(self, config, metrics):
+
+        # Get parameter from config
+        self._report_file = config.get('report_file', 'output/memory_profile.json')
+        self._snapshot_interval = config.get('snapshot_interval', 100)
+        self._top_n = config.get('top_n', 20)
+        self._traceback_frames = config.get('traceback_frames', 1)
+        self._sample_interval = config.get('sample_interval', 10)
+
+        # Check parameter
+        if self._snapshot_interval < 0:
+            raise ValueError('snapshot_interval must be 0 or more')
+        if self._top_n < 1 or self._traceback_frames < 1 or self._sample_interval < 1:
+            raise ValueError('top_n, traceback_frames and sample_interval must be 1 or more')
+
+        self._metrics = metrics
+        self._thread = threading.get_ident()
+        self._stages = {}
+        self._stack = []
+        self._frames = 0
+        self._timeline = []
+        self._snapshots = []
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self._traceback_frames)
+        self._snapshots.append((0, self._take_snapshot()))
+
+    def __getattr__(self, name):
+        # everything except measure and close is done by the wrapped metrics
+        return getattr(self._metrics, name)
+
+    def measure(self, stage):
+        """measure latency and allocations of a stage
+
+        Args:
+            stage (str): stage name
+
+        Returns:
+            context manager: records elapsed time and allocations on exit
+        """
+        if threading.get_ident() != self._thread:
+            return self._metrics.measure(stage)
+        return _MemoryTimer(self, stage, self._metrics.measure(stage))
+
+    def enter(self, stage):
+        """start accounting of a stage
+
+        Args:
+            stage (str): stage name
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            # keep the peak of the outer stage before it is reset
+            self._stack[-1][2] = max(self._stack[-1][2], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([stage, current, current])
+
+    def exit(self, stage):
+        """finish accounting of a stage
+
+        Args:
+            stage (str): stage name
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        name, start, stage_peak = self._stack.pop()
+        if name != stage:
+            raise RuntimeError(f'stage {stage} is closed inside {name}')
+        stage_peak = max(stage_peak, peak)
+        if self._stack:
+            self._stack[-1][2] = max(self._stack[-1][2], stage_peak)
+
+        memory = self._stages.get(stage)
+        if memory is None:
+            memory = self._stages[stage] = _StageMemory()
+        memory.add(current - start, stage_peak - start)
+
+        if stage == 'frame':
+            self._frames += 1
+            if self._frames % self._sample_interval == 0:
+                self._timeline.append((self._frames, current, rss_bytes()))
+            if self._snapshot_interval > 0 and self._frames % self._snapshot_interval == 0:
+                self._snapshots.append((self._frames, self._take_snapshot()))
+
+    def report(self):
+        """make memory report
+
+        Returns:
+            dict: allocations of each stage, growth per frame and top growing lines
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        report = {
+            'frames': self._frames,
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'rss_bytes': rss_bytes(),
+            'stages': {
+                stage: memory.to_dict() for stage, memory in sorted(self._stages.items())},
+            'timeline': [
+                {'frame': frame, 'traced_bytes': traced, 'rss_bytes': rss}
+                for frame, traced, rss in self._timeline]
+        }
+
+        # least squares slope of memory per frame
+        if len(self._timeline) >= 2:
+            timeline = np.asarray(self._timeline, dtype=np.float64)
+            report['traced_bytes_per_frame'] = float(
+                np.polyfit(timeline[:, 0], timeline[:, 1], 1)[0])
+            report['rss_bytes_per_frame'] = float(
+                np.polyfit(timeline[:, 0], timeline[:, 2], 1)[0])
+
+        # lines whose allocations grew between the first and later snapshots
+        if len(self._snapshots) >= 2:
+            first_frame, first = self._snapshots[0]
+            last_frame, last = self._snapshots[-1]
+            steady_frame, steady = self._snapshots[min(1, len(self._snapshots) - 1)]
+            report['top_growth'] = self._compare(last, first, first_frame, last_frame)
+            # growth after the first interval excludes loading and warm up
+            if len(self._snapshots) >= 3:
+                report['top_growth_after_warmup'] = self._compare(
+                    last, steady, steady_frame, last_frame)
+        return report
+
+    def close(self):
+        """write report, stop tracing and close wrapped metrics
+
+        """
+        self._snapshots.append((self._frames, self._take_snapshot()))
+        report = self.report()
+        tracemalloc.stop()
+        if self._report_file:
+            report_dir = os.path.dirname(self._report_file)
+            if report_dir:
+                os.makedirs(report_dir, exist_ok=True)
+            with open(self._report_file, 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=4)
+        print(self.format_report(report))
+        self._metrics.close()
+
+    @staticmethod
+    def format_report(report):
+        """format memory report for console
+
+        Args:
+            report (dict): report
+
+        Returns:
+            str: summary text
+        """
+        lines = [
+            f"[memory] frames {report['frames']} traced {report['traced_bytes'] / 2**20:.1f}MB "
+            f"peak {report['traced_peak_bytes'] / 2**20:.1f}MB "
+            f"rss {report['rss_bytes'] / 2**20:.1f}MB"]
+        if 'traced_bytes_per_frame' in report:
+            lines.append(
+                f"[memory] growth per frame traced {report['traced_bytes_per_frame']:.0f}B "
+                f"rss {report['rss_bytes_per_frame']:.0f}B")
+        lines.append(
+            '[memory] stage                     calls   retained/call   peak/call   max peak')
+        for stage, memory in report['stages'].items():
+            lines.append(
+                f"[memory] {stage:<24} {memory['calls']:>7} "
+                f"{memory['retained_bytes_per_call']:>14.0f}B "
+                f"{memory['peak_bytes_per_call']:>10.0f}B "
+                f"{memory['max_peak_bytes']:>9}B")
+        for growth in report.get('top_growth', [])[:5]:
+            lines.append(
+                f"[memory] growth {growth['size_diff']:>+12}B {growth['location']}")
+        return '\n'.join(lines)
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>')])
+
+    def _compare(self, snapshot, base, base_frame, frame):
+        statistics = snapshot.compare_to(base, 'traceback' if self._traceback_frames > 1 else 'lineno')
+        return [
+            {
+                'location': ' <- '.join(
+                    f'{trace.filename}:{trace.lineno}' for trace in statistic.traceback),
+                'size_diff': statistic.size_diff,
+                'count_diff': statistic.count_diff,
+                'size': statistic.size,
+                'from_frame': base_frame,
+                'to_frame': frame
+            }
+            for statistic in statistics[:self._top_n] if statistic.size_diff != 0]
@@ -0,0 +1,326 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import csv
+import mmap
+import argparse
+import tempfile
+import numpy as np
+
+import meta_serializer
+
+# sidecar index, one entry per record of the archive
+# offset and length point to the flatbuffers data after the length prefix
+INDEX_DTYPE = np.dtype([
+    ('frame', '<i8'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+    ('timestamp', 'S32')
+])
+
+
+def get_index_file(archive_file):
+    """get default sidecar index file of archive
+
+    Args:
+        archive_file (str): archive file
+
+    Returns:
+        str: index file
+    """
+    return archive_file + '.idx'
+
+
+def _load_index(index_file):
+    if not os.path.exists(index_file):
+        raise ValueError(f'cannot open {index_file}')
+    index = np.load(index_file, allow_pickle=False)
+    if index.dtype != INDEX_DTYPE:
+        raise ValueError(f'{index_file} is not an index of meta archive')
+    return index
+
+
+class MetaArchiveWriter() :
+    """append serialized meta data to archive
+
+    The archive is the length-prefixed file of meta_serializer. Records are
+    only appended, and the sidecar index is replaced atomically on flush.
+    Data after the last indexed record (an interrupted append) is dropped
+    when an existing archive is opened. An existing archive without its
+    index is not opened, since frames and timestamps are only in the index.
+
+    Args:
+        archive_file (str): archive file
+        index_file (str, optional): index file. Defaults to archive_file + '.idx'.
+    """
+
+    def __init__(self, archive_file, index_file=None):
+        if index_file is None:
+            index_file = get_index_file(archive_file)
+        self._archive_file = archive_file
+        self._index_file = index_file
+
+        entries = []
+        end = 0
+        if os.path.exists(archive_file) and os.path.getsize(archive_file) > 0:
+            # the archive is truncated to the end of the indexed records only
+            index = _load_index(index_file)
+            entries = index.tolist()
+            if len(index) > 0:
+                last = index[-1]
+                end = int(last['offset']) + int(last['length'])
+                if end > os.path.getsize(archive_file):
+                    raise ValueError(f'{archive_file} is shorter than its index')
+                end += -end % meta_serializer.RECORD_ALIGN
+
+        self._entries = entries
+        self._file = open(archive_file, 'ab')
+        self._file.truncate(end)
+        self._offset = end
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, frame, serialize_meta, timestamp=''):
+        """append one record
+
+        Args:
+            frame (int): frame number, larger than the previous one
+            serialize_meta (bytes): serialized meta data
+            timestamp (str, optional): timestamp of meta data. Defaults to ''.
+        """
+        if self._entries and frame <= self._entries[-1][0]:
+            raise ValueError(f'frame {frame} is not larger than the previous frame')
+        timestamp = (timestamp or '').encode('ascii')
+        if len(timestamp) > INDEX_DTYPE['timestamp'].itemsize:
+            raise ValueError(f'timestamp {timestamp} is too long')
+
+        size = meta_serializer.write_record(self._file, serialize_meta)
+        self._entries.append((
+            frame,
+            self._offset + meta_serializer.LENGTH_PREFIX_SIZE,
+            len(serialize_meta),
+            timestamp))
+        self._offset += size
+
+    def flush(self):
+        """write archive and index to file
+
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        index = np.array(self._entries, dtype=INDEX_DTYPE)
+        directory = os.path.dirname(os.path.abspath(self._index_file))
+        fd, tmp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.save(file, index, allow_pickle=False)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_file, self._index_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def close(self):
+        """flush and close archive
+
+        """
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+
+class MetaArchive() :
+    """read serialized meta data from archive
+
+    The archive is mapped to memory and records are returned as memoryview
+    slices of the map, so no data is copied until it is decoded.
+
+    Args:
+        archive_file (str): archive file
+        index_file (str, optional): index file. Defaults to archive_file + '.idx'.
+    """
+
+    def __init__(self, archive_file, index_file=None):
+        if index_file is None:
+            index_file = get_index_file(archive_file)
+        if not os.path.exists(archive_file):
+            raise ValueError(f'cannot open {archive_file}')
+
+        self._index = _load_index(index_file)
+        self._frames = self._index['frame']
+
+        with open(archive_file, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size > 0:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+            else:
+                self._map = None
+                self._view = memoryview(b'')
+
+        if len(self._index) > 0:
+            last = self._index[-1]
+            if int(last['offset']) + int(last['length']) > size:
+                raise ValueError(f'{archive_file} is shorter than its index')
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, position):
+        """get record at position
+
+        Args:
+            position (int): position of record
+
+        Returns:
+            memoryview: serialized meta data
+        """
+        offset = int(self._index['offset'][position])
+        return self._view[offset:offset + int(self._index['length'][position])]
+
+    @property
+    def frames(self):
+        """numpy.ndarray: frame numbers of all records"""
+        return self._frames
+
+    def read(self, start=0, stop=None):
+        """get records of position range
+
+        Args:
+            start (int, optional): first position. Defaults to 0.
+            stop (int, optional): position after the last. Defaults to None (end).
+
+        Returns:
+            list: list of serialized meta data (memoryview)
+        """
+        view = self._view
+        entries = self._index[start:stop]
+        return [
+            view[offset:offset + length]
+            for offset, length in zip(
+                entries['offset'].tolist(), entries['length'].tolist())]
+
+    def timestamps(self, start=0, stop=None):
+        """get timestamps of position range
+
+        Args:
+            start (int, optional): first position. Defaults to 0.
+            stop (int, optional): position after the last. Defaults to None (end).
+
+        Returns:
+            list: list of timestamp ('' if not recorded)
+        """
+        return [
+            timestamp.decode('ascii')
+            for timestamp in self._index['timestamp'][start:stop].tolist()]
+
+    def frame_range(self, first_frame=None, last_frame=None):
+        """get position range of frame numbers
+
+        Args:
+            first_frame (int, optional): first frame number. Defaults to None (first).
+            last_frame (int, optional): last frame number (included). Defaults to None (last).
+
+        Returns:
+            int: first position
+            int: position after the last
+        """
+        start = 0
+        stop = len(self._frames)
+        if first_frame is not None:
+            start = int(np.searchsorted(self._frames, first_frame, side='left'))
+        if last_frame is not None:
+            stop = int(np.searchsorted(self._frames, last_frame, side='right'))
+        return start, max(start, stop)
+
+    def close(self):
+        """close memory map
+
+        All records returned by this archive must be released before.
+        """
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def convert_csv(meta_file, archive_file, schema='object_detection_top'):
+    """convert csv file of LocalDataLoader to archive
+
+    Args:
+        meta_file (str): input csv file
+        archive_file (str): output archive file
+        schema (str, optional): 'object_detection_top' or 'compact'.
+            Defaults to 'object_detection_top'.
+
+    Returns:
+        int: number of frames
+    """
+    if not os.path.exists(meta_file):
+        raise ValueError(f'cannot open {meta_file}')
+
+    serializer = meta_serializer.MetaSerializer(schema)
+    for file_path in (archive_file, get_index_file(archive_file)):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    # Column 1 is frame number
+    # Column 2 is inference result string
+    with open(meta_file, 'r', encoding='utf-8', newline='') as file, \
+        MetaArchiveWriter(archive_file) as writer:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row_data in reader:
+            if not row_data:
+                continue
+            writer.append(
+                int(row_data[0]),
+                serializer(meta_serializer.parse_meta_string(row_data[1])))
+        frame_num = len(writer)
+    return frame_num
+
+
+def main():
+    """convert csv file of LocalDataLoader to meta archive
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('meta_file', type=str)
+    parser.add_argument('archive_file', type=str)
+    parser.add_argument('--schema', type=str, default='object_detection_top',
+                        choices=meta_serializer.MetaSerializer.SCHEMAS)
+    args = parser.parse_args()
+
+    frame_num = convert_csv(args.meta_file, args.archive_file, args.schema)
+    print(f'{frame_num} frames are written to {args.archive_file}')
+
+
+if __name__ == '__main__':
+    main()
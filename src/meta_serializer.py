@@ -0,0 +1,399 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import csv
+import ast
+import json
+import struct
+import argparse
+import importlib.metadata
+import numpy as np
+import flatbuffers
+
+import compact_meta
+
+sys.path.append(os.path.join(os.path.dirname(__file__),'.'))
+sys.path.append(
+    os.path.join(os.path.dirname(__file__),'smart_camera_interface_schema'))
+
+import smart_camera_interface_schema.SmartCamera.BoundingBox as SBoundingBox
+import smart_camera_interface_schema.SmartCamera.BoundingBox2d as SBoundingBox2d
+import smart_camera_interface_schema.SmartCamera.GeneralObject as SGeneralObject
+import smart_camera_interface_schema.SmartCamera.ObjectDetectionData as SObjectDetectionData
+import smart_camera_interface_schema.SmartCamera.ObjectDetectionTop as SObjectDetectionTop
+
+# Builder fields are reset and written directly (without the generated
+# builders) only with the flatbuffers versions whose Builder is known
+BULK_FLATBUFFERS_VERSIONS = ('1.11', '1.12')
+
+
+def _get_flatbuffers_version():
+    try:
+        return importlib.metadata.version('flatbuffers')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+FLATBUFFERS_VERSION = _get_flatbuffers_version()
+BULK_SUPPORTED = FLATBUFFERS_VERSION is not None \
+    and '.'.join(FLATBUFFERS_VERSION.split('.')[:2]) in BULK_FLATBUFFERS_VERSIONS
+
+# record of length-prefixed file: uint32 length, payload, padding to RECORD_ALIGN
+RECORD_ALIGN = 8
+_LENGTH = struct.Struct('<I')
+LENGTH_PREFIX_SIZE = _LENGTH.size
+
+# GeneralObject table written in bulk
+# vtable: [vtable size, object size, class_id, bounding_box_type, bounding_box, score]
+_GENERAL_OBJECT_VTABLE = np.array([12, 20, 4, 16, 8, 12], dtype='<u2')
+_GENERAL_OBJECT_DTYPE = np.dtype([
+    ('vtable', '<i4'),
+    ('class_id', '<u4'),
+    ('bounding_box', '<u4'),
+    ('score', '<f4'),
+    ('bounding_box_type', 'u1'),
+    ('pad', 'u1', (3,))
+])
+
+# BoundingBox2d table written in bulk
+# vtable: [vtable size, object size, left, top, right, bottom]
+_BOUNDING_BOX_VTABLE = np.array([12, 20, 4, 8, 12, 16], dtype='<u2')
+_BOUNDING_BOX_DTYPE = np.dtype([
+    ('vtable', '<i4'),
+    ('box', '<i4', (4,))
+])
+
+_VTABLES_SIZE = _GENERAL_OBJECT_VTABLE.nbytes + _BOUNDING_BOX_VTABLE.nbytes
+_VTABLES_BYTES = _GENERAL_OBJECT_VTABLE.tobytes() + _BOUNDING_BOX_VTABLE.tobytes()
+
+
+def parse_meta_string(str_meta):
+    """parse inference result string of csv file
+
+    The strings are usually JSON, which is parsed much faster than Python
+    literals. Python literal strings are still accepted.
+
+    Args:
+        str_meta (str): inference result string
+
+    Returns:
+        dict: inference result
+    """
+    try:
+        return json.loads(str_meta)
+    except ValueError:
+        return ast.literal_eval(str_meta)
+
+
+def dict_to_arrays(dict_meta):
+    """convert inference result dict to arrays
+
+    Args:
+        dict_meta (dict): inference result
+
+    Returns:
+        list: bounding boxes (left, top, right, bottom)
+        list: scores
+        list: class ids
+    """
+    object_list = dict_meta['perception']['object_detection_list']
+    bboxes = [
+        [general_object['bounding_box']['left'],
+         general_object['bounding_box']['top'],
+         general_object['bounding_box']['right'],
+         general_object['bounding_box']['bottom']]
+        for general_object in object_list]
+    scores = [general_object['score'] for general_object in object_list]
+    class_ids = [general_object['class_id'] for general_object in object_list]
+    return bboxes, scores, class_ids
+
+
+class MetaSerializer() :
+    """serialize inference results to flatbuffers with one reused builder
+
+    The builder is allocated once and reset for each frame, and all
+    detections of a frame are written as one block of bytes. Both depend on
+    the fields of flatbuffers.Builder, so with other versions than
+    BULK_FLATBUFFERS_VERSIONS each frame is written with the generated
+    builders instead (slower, same result).
+
+    Args:
+        schema (str, optional): 'object_detection_top' or 'compact'.
+            Defaults to 'object_detection_top'.
+        initial_size (int, optional): initial builder size. Defaults to 65536.
+        bulk (bool, optional): write in bulk. Defaults to BULK_SUPPORTED.
+    """
+
+    SCHEMAS = ('object_detection_top', 'compact')
+
+    def __init__(self, schema='object_detection_top', initial_size=65536, bulk=None):
+        if schema not in self.SCHEMAS:
+            raise ValueError(f'{schema} is not supported')
+        self._bulk = BULK_SUPPORTED if bulk is None else bulk
+        if schema == 'compact' and not self._bulk:
+            raise RuntimeError(
+                f'compact schema requires flatbuffers {BULK_FLATBUFFERS_VERSIONS}, '
+                f'not {FLATBUFFERS_VERSION}')
+        self._schema = schema
+        self._builder = flatbuffers.Builder(initial_size)
+
+    def __call__(self, dict_meta):
+        """serialize inference result dict
+
+        Args:
+            dict_meta (dict): inference result
+
+        Returns:
+            bytes: serialized meta data
+        """
+        return self.serialize_arrays(*dict_to_arrays(dict_meta))
+
+    def serialize_arrays(self, bboxes, scores, class_ids):
+        """serialize inference result arrays
+
+        Detections are stored in reverse order in the vector, the same as
+        LocalDataLoader has always done, so decoded order is unchanged.
+
+        Args:
+            bboxes (array_like): bounding boxes (left, top, right, bottom), shape (N, 4)
+            scores (array_like): scores, shape (N,)
+            class_ids (array_like): class ids, shape (N,)
+
+        Returns:
+            bytes: serialized meta data
+        """
+        if not self._bulk:
+            return serialize_generated(bboxes, scores, class_ids)
+        builder = self._reset_builder()
+        if self._schema == 'compact':
+            return compact_meta.serialize_compact(
+                np.asarray(bboxes).reshape(-1, 4)[::-1],
+                np.asarray(scores)[::-1],
+                np.asarray(class_ids)[::-1],
+                builder)
+        return self._serialize_object_detection_top(builder, bboxes, scores, class_ids)
+
+    def serialize_csv(self, meta_file, output_file):
+        """serialize csv file of LocalDataLoader to length-prefixed file
+
+        Args:
+            meta_file (str): input csv file
+            output_file (str): output file
+
+        Returns:
+            int: number of frames
+        """
+        frame_num = 0
+        with open(meta_file, 'r', encoding='utf-8', newline='') as file, \
+            open(output_file, 'wb') as out_file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for row_data in reader:
+                if not row_data:
+                    continue
+                write_record(out_file, self(parse_meta_string(row_data[1])))
+                frame_num += 1
+        return frame_num
+
+    def _reset_builder(self):
+        # flatbuffers 1.11 has no Builder.Clear, reset bookkeeping directly.
+        # All bytes below head are written again, so Bytes is not cleared.
+        builder = self._builder
+        builder.current_vtable = None
+        builder.head = flatbuffers.number_types.UOffsetTFlags.py_type(len(builder.Bytes))
+        builder.minalign = 1
+        builder.objectEnd = None
+        builder.vtables = []
+        builder.nested = False
+        builder.finished = False
+        return builder
+
+    def _serialize_object_detection_top(self, builder, bboxes, scores, class_ids):
+        boxes = np.asarray(bboxes, dtype='<i4').reshape(-1, 4)
+        box_num = boxes.shape[0]
+
+        # block of [2 vtables][N GeneralObject][N BoundingBox2d]
+        general_object_start = _VTABLES_SIZE
+        bounding_box_start = general_object_start + box_num * _GENERAL_OBJECT_DTYPE.itemsize
+        block_size = bounding_box_start + box_num * _BOUNDING_BOX_DTYPE.itemsize
+        if box_num > 0:
+            index = np.arange(box_num, dtype=np.int64)
+
+            general_objects = np.zeros(box_num, dtype=_GENERAL_OBJECT_DTYPE)
+            general_objects['vtable'] = general_object_start \
+                + index * _GENERAL_OBJECT_DTYPE.itemsize
+            general_objects['class_id'] = np.asarray(class_ids, dtype='<u4')
+            general_objects['bounding_box'] = \
+                bounding_box_start - general_object_start - 8
+            general_objects['score'] = np.asarray(scores, dtype='<f4')
+            general_objects['bounding_box_type'] = SBoundingBox.BoundingBox().BoundingBox2d
+
+            bounding_boxes = np.empty(box_num, dtype=_BOUNDING_BOX_DTYPE)
+            bounding_boxes['vtable'] = bounding_box_start \
+                + index * _BOUNDING_BOX_DTYPE.itemsize - _GENERAL_OBJECT_VTABLE.nbytes
+            bounding_boxes['box'] = boxes
+
+            builder.Prep(4, block_size)
+            builder.head = builder.Head() - block_size
+            builder.Bytes[builder.Head():builder.Head() + block_size] = \
+                _VTABLES_BYTES + general_objects.tobytes() + bounding_boxes.tobytes()
+        block_offset = builder.Offset()
+
+        # vector of offsets to GeneralObject, last object first
+        SObjectDetectionData.StartObjectDetectionListVector(builder, box_num)
+        if box_num > 0:
+            builder.head = builder.Head() - 4 * box_num
+            element_offset = builder.Offset() - 4 * np.arange(box_num, dtype=np.int64)
+            general_object_offset = block_offset - general_object_start \
+                - _GENERAL_OBJECT_DTYPE.itemsize * index[::-1]
+            builder.Bytes[builder.Head():builder.Head() + 4 * box_num] = \
+                (element_offset - general_object_offset).astype('<u4').tobytes()
+        general_obj_list_fb = builder.EndVector(box_num)
+
+        SObjectDetectionData.Start(builder)
+        SObjectDetectionData.AddObjectDetectionList(builder, general_obj_list_fb)
+        object_buf = SObjectDetectionData.End(builder)
+
+        SObjectDetectionTop.Start(builder)
+        SObjectDetectionTop.AddPerception(builder, object_buf)
+        buf = SObjectDetectionTop.End(builder)
+        builder.Finish(buf)
+
+        return builder.Output()
+
+
+def serialize_generated(bboxes, scores, class_ids):
+    """serialize inference result arrays with the generated builders
+
+    This is the way LocalDataLoader used to serialize each frame, and works
+    with any flatbuffers version.
+
+    Args:
+        bboxes (array_like): bounding boxes (left, top, right, bottom), shape (N, 4)
+        scores (array_like): scores, shape (N,)
+        class_ids (array_like): class ids, shape (N,)
+
+    Returns:
+        bytes: serialized meta data
+    """
+    boxes = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4).tolist()
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1).tolist()
+    class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1).tolist()
+
+    general_obj_list = []
+    builder = flatbuffers.Builder(0)
+    for box, score, class_id in zip(boxes, scores, class_ids):
+        SBoundingBox2d.Start(builder)
+        SBoundingBox2d.AddLeft(builder, box[0])
+        SBoundingBox2d.AddTop(builder, box[1])
+        SBoundingBox2d.AddRight(builder, box[2])
+        SBoundingBox2d.AddBottom(builder, box[3])
+        body_bounding_box_fbs = SBoundingBox2d.End(builder)
+
+        SGeneralObject.Start(builder)
+        SGeneralObject.AddClassId(builder, class_id)
+        SGeneralObject.AddBoundingBoxType(
+            builder, SBoundingBox.BoundingBox().BoundingBox2d)
+        SGeneralObject.AddBoundingBox(builder, body_bounding_box_fbs)
+        SGeneralObject.AddScore(builder, score)
+        general_obj_list.append(SGeneralObject.End(builder))
+
+    SObjectDetectionData.StartObjectDetectionListVector(
+        builder, len(general_obj_list))
+    for general_obj in general_obj_list:
+        builder.PrependUOffsetTRelative(general_obj)
+    general_obj_list_fb = builder.EndVector(len(general_obj_list))
+
+    SObjectDetectionData.Start(builder)
+    SObjectDetectionData.AddObjectDetectionList(builder, general_obj_list_fb)
+    object_buf = SObjectDetectionData.End(builder)
+
+    SObjectDetectionTop.Start(builder)
+    SObjectDetectionTop.AddPerception(builder, object_buf)
+    buf = SObjectDetectionTop.End(builder)
+    builder.Finish(buf)
+
+    return builder.Output()
+
+
+def write_record(file, serialize_meta):
+    """write one record of length-prefixed file
+
+    Args:
+        file (file object): output file opened in binary mode
+        serialize_meta (bytes): serialized meta data
+
+    Returns:
+        int: number of bytes written
+    """
+    length = len(serialize_meta)
+    padding = -(_LENGTH.size + length) % RECORD_ALIGN
+    file.write(_LENGTH.pack(length))
+    file.write(serialize_meta)
+    if padding:
+        file.write(b'\0' * padding)
+    return _LENGTH.size + length + padding
+
+
+def read_records(file_path):
+    """read records of length-prefixed file
+
+    Args:
+        file_path (str): length-prefixed file
+
+    Yields:
+        bytes: serialized meta data
+    """
+    with open(file_path, 'rb') as file:
+        while True:
+            header = file.read(_LENGTH.size)
+            if not header:
+                break
+            if len(header) < _LENGTH.size:
+                raise ValueError(f'{file_path} is truncated')
+            length = _LENGTH.unpack(header)[0]
+            serialize_meta = file.read(length)
+            if len(serialize_meta) < length:
+                raise ValueError(f'{file_path} is truncated')
+            file.read(-(_LENGTH.size + length) % RECORD_ALIGN)
+            yield serialize_meta
+
+
+def main():
+    """convert csv file of LocalDataLoader to length-prefixed flatbuffers file
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('meta_file', type=str)
+    parser.add_argument('output_file', type=str)
+    parser.add_argument('--schema', type=str, default='object_detection_top',
+                        choices=MetaSerializer.SCHEMAS)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.meta_file):
+        raise ValueError(f'cannot open {args.meta_file}')
+
+    frame_num = MetaSerializer(args.schema).serialize_csv(
+        args.meta_file, args.output_file)
+    print(f'{frame_num} frames are written to {args.output_file}')
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,9 @@ limitations under the License.
 
 import os
 import sys
+import numpy as np
+
+import compact_meta
 
 sys.path.append(os.path.join(os.path.dirname(__file__),'.'))
 sys.path.append(
@@ -54,7 +57,8 @@ class ObjectDetectionProcessor() :
     def deserialize_meta_data(self, serialize_meta):
         """Deserialize input meta data
 
-        schema of input meta data is SmartCamera.ObjectDetection
+        schema of input meta data is SmartCamera.ObjectDetectionTop
+        or SmartCamera.ObjectDetectionCompact
 
         Args:
             serialize_meta (bytes): serialized meta data
@@ -64,7 +68,14 @@ class ObjectDetectionProcessor() :
         """
 
         array_meta = []
-        if serialize_meta is not None:
+        if serialize_meta is not None \
+            and compact_meta.get_schema_version(serialize_meta) \
+                == compact_meta.SCHEMA_VERSION_COMPACT:
+            bboxes, scores, class_ids = compact_meta.decode_compact(serialize_meta)
+            array_meta = [
+                [pos, conf, class_id] for pos, conf, class_id
+                in zip(bboxes.tolist(), scores.tolist(), class_ids.tolist())]
+        elif serialize_meta is not None:
             object_fb = SObjectDetectionTop.ObjectDetectionTop.GetRootAs(
                 serialize_meta, 0)
             if object_fb.Perception() is not None:
@@ -85,3 +96,30 @@ class ObjectDetectionProcessor() :
                         class_id = gen_obj.ClassId()
                         array_meta.append([pos,conf,class_id])
         return array_meta
+
+
+    def deserialize_meta_arrays(self, serialize_meta):
+        """Deserialize input meta data to arrays
+
+        ObjectDetectionCompact is returned as views of the input buffer.
+
+        Args:
+            serialize_meta (bytes): serialized meta data
+
+        Returns:
+            numpy.ndarray: bounding boxes (left, top, right, bottom), shape (N, 4)
+            numpy.ndarray: scores, shape (N,)
+            numpy.ndarray: class ids, shape (N,)
+        """
+
+        if serialize_meta is not None \
+            and compact_meta.get_schema_version(serialize_meta) \
+                == compact_meta.SCHEMA_VERSION_COMPACT:
+            return compact_meta.decode_compact(serialize_meta)
+
+        array_meta = self.deserialize_meta_data(serialize_meta)
+        bboxes = np.array(
+            [info[0] for info in array_meta], dtype=np.int32).reshape(-1, 4)
+        scores = np.array([info[1] for info in array_meta], dtype=np.float32)
+        class_ids = np.array([info[2] for info in array_meta], dtype=np.uint32)
+        return bboxes, scores, class_ids
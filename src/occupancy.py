@@ -0,0 +1,368 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import math
+from collections import deque
+
+import timestamp_util
+
+
+class RollingWindow() :
+    """rolling statistics of the last N counts
+
+    Each push is O(1) (amortized): the sum is updated by the value
+    entering and leaving, the maximum is kept by a monotonic deque, and
+    percentiles are read from a histogram of the counts in the window.
+    Counts are small non-negative integers, so the histogram is exact
+    and its size is bounded by the largest count.
+
+    Args:
+        size (int): number of values in the window
+    """
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError('window size must be 1 or more')
+        self._size = size
+        self._values = deque()
+        self._total = 0
+        self._max_candidates = deque()
+        self._histogram = []
+        self._index = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def push(self, value):
+        """add a count and drop the oldest one if the window is full
+
+        Args:
+            value (int): count
+        """
+        value = int(value)
+        if value < 0:
+            raise ValueError('count must be 0 or more')
+
+        # drop oldest
+        if len(self._values) == self._size:
+            oldest = self._values.popleft()
+            self._total -= oldest
+            self._histogram[oldest] -= 1
+            if self._max_candidates[0][0] == self._index - self._size:
+                self._max_candidates.popleft()
+
+        # add newest
+        self._values.append(value)
+        self._total += value
+        if value >= len(self._histogram):
+            self._histogram.extend([0] * (value + 1 - len(self._histogram)))
+        self._histogram[value] += 1
+        while self._max_candidates and self._max_candidates[-1][1] <= value:
+            self._max_candidates.pop()
+        self._max_candidates.append((self._index, value))
+        self._index += 1
+
+    def mean(self):
+        """mean of the window
+
+        Returns:
+            float: mean, 0 if empty
+        """
+        if not self._values:
+            return 0.0
+        return self._total / len(self._values)
+
+    def max(self):
+        """maximum of the window
+
+        Returns:
+            int: maximum, 0 if empty
+        """
+        if not self._max_candidates:
+            return 0
+        return self._max_candidates[0][1]
+
+    def percentile(self, percent):
+        """percentile of the window (nearest rank)
+
+        Args:
+            percent (float): percentile in the range of 0 to 100
+
+        Returns:
+            int: percentile, 0 if empty
+        """
+        if not self._values:
+            return 0
+        rank = max(1, math.ceil(percent / 100.0 * len(self._values)))
+        cumulative = 0
+        for value, frequency in enumerate(self._histogram):
+            cumulative += frequency
+            if cumulative >= rank:
+                return value
+        return len(self._histogram) - 1
+
+    def get_state(self):
+        """get window state for checkpoint
+
+        Returns:
+            list: counts in the window, oldest first
+        """
+        return list(self._values)
+
+    def set_state(self, values):
+        """restore window state from checkpoint
+
+        Args:
+            values (list): counts in the window, oldest first
+        """
+        self.__init__(self._size)
+        for value in values:
+            self.push(value)
+
+
+class _IntervalStats() :
+    __slots__ = ['frames', 'total', 'min', 'max', 'occupied']
+
+    def __init__(self, frames=0, total=0, minimum=0, maximum=0, occupied=0):
+        self.frames = frames
+        self.total = total
+        self.min = minimum
+        self.max = maximum
+        self.occupied = occupied
+
+    def add(self, value):
+        if self.frames == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.frames += 1
+        self.total += value
+        if value > 0:
+            self.occupied += 1
+
+
+class OccupancyAggregator() :
+    """aggregate stabilized counts of each area in real time
+
+    Rolling windows (mean, max and percentiles of the last window_frames)
+    and interval statistics (frames, min, max, mean, occupied ratio and
+    person-frames) are updated with each frame, and a summary is emitted
+    every interval_frames.
+
+    Args:
+        config (dict): occupancy settings
+        area_num (int): number of areas
+    """
+
+    def __init__(self, config, area_num):
+
+        # Get parameter from config
+        self._window_frames = config.get('window_frames', 300)
+        self._interval_frames = config.get('interval_frames', 300)
+        self._percentiles = config.get('percentiles', [50, 90])
+        self._output_file = config.get('output_file', '')
+        self._area_num = area_num
+
+        # Check parameter
+        if self._interval_frames < 1:
+            raise ValueError('interval_frames must be 1 or more')
+        for percent in self._percentiles:
+            if not 0 <= percent <= 100:
+                raise ValueError('percentiles must be set in the range of 0 to 100')
+
+        self._windows = [RollingWindow(self._window_frames) for _ in range(area_num)]
+        self._intervals = [_IntervalStats() for _ in range(area_num)]
+        self._interval_length = 0
+        self._frame = 0
+        self._interval_start = None
+        self._interval_end = None
+        self._timestamped = False
+        self._timestamp_length = timestamp_util.TIMESTAMP_LENGTH
+
+        if self._output_file:
+            output_dir = os.path.dirname(self._output_file)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+
+    def __call__(self, count, timestamp=None):
+        """add counts of one frame
+
+        Args:
+            count (list): stabilized count of each area
+            timestamp (int, optional): timestamp in epoch milliseconds. Defaults to None.
+
+        Returns:
+            dict: interval summary if an interval ended, otherwise None
+        """
+        # interval is identified by timestamps, or frame indexes without them
+        self._timestamped = timestamp is not None
+        position = timestamp if timestamp is not None else self._frame
+        if self._interval_start is None:
+            self._interval_start = position
+        self._interval_end = position
+
+        for area in range(self._area_num):
+            value = count[area] if area < len(count) else 0
+            self._windows[area].push(value)
+            self._intervals[area].add(value)
+        self._frame += 1
+        self._interval_length += 1
+
+        if self._interval_length >= self._interval_frames:
+            return self._emit()
+        return None
+
+    def set_area_num(self, area_num):
+        """change number of areas (when parameters are reloaded)
+
+        Added areas start with empty windows and intervals, removed areas
+        are no longer summarized.
+
+        Args:
+            area_num (int): number of areas
+        """
+        self._windows = self._windows[:area_num] + [
+            RollingWindow(self._window_frames)
+            for _ in range(area_num - len(self._windows))]
+        self._intervals = self._intervals[:area_num] + [
+            _IntervalStats() for _ in range(area_num - len(self._intervals))]
+        self._area_num = area_num
+
+    def set_timestamp_length(self, length):
+        """set length of timestamp strings of interval summaries
+
+        Args:
+            length (int): length of timestamp strings of the input
+        """
+        self._timestamp_length = length
+
+    def clear(self):
+        """remove summaries of an earlier run from output_file
+
+        """
+        if self._output_file and os.path.exists(self._output_file):
+            with open(self._output_file, 'w', encoding='utf-8'):
+                pass
+
+    def rolling(self, area):
+        """get rolling window statistics of an area
+
+        Args:
+            area (int): area index
+
+        Returns:
+            dict: mean, max and percentiles of the window
+        """
+        window = self._windows[area]
+        stats = {
+            'frames': len(window),
+            'mean': window.mean(),
+            'max': window.max()
+        }
+        for percent in self._percentiles:
+            stats[f'p{percent:g}'] = window.percentile(percent)
+        return stats
+
+    def flush(self):
+        """emit summary of the unfinished interval
+
+        Returns:
+            dict: interval summary, None if no frame is left
+        """
+        if self._interval_start is None:
+            return None
+        return self._emit()
+
+    def get_state(self):
+        """get aggregator state for checkpoint
+
+        Returns:
+            dict: aggregator state
+        """
+        output_size = 0
+        if self._output_file and os.path.exists(self._output_file):
+            output_size = os.path.getsize(self._output_file)
+        return {
+            'frame': self._frame,
+            'interval_start': self._interval_start,
+            'interval_end': self._interval_end,
+            'timestamped': self._timestamped,
+            'interval_frames': self._interval_length,
+            'output_size': output_size,
+            'windows': [window.get_state() for window in self._windows],
+            'intervals': [
+                [stats.frames, stats.total, stats.min, stats.max, stats.occupied]
+                for stats in self._intervals]
+        }
+
+    def set_state(self, state):
+        """restore aggregator state from checkpoint
+
+        Summaries written after the checkpoint are removed from output_file.
+
+        Args:
+            state (dict): aggregator state
+        """
+        self._frame = state['frame']
+        self._interval_start = state['interval_start']
+        self._interval_end = state['interval_end']
+        self._timestamped = state.get('timestamped', False)
+        if self._output_file and os.path.exists(self._output_file):
+            with open(self._output_file, 'a', encoding='utf-8') as file:
+                file.truncate(state['output_size'])
+        self.set_area_num(len(state['windows']))
+        for window, values in zip(self._windows, state['windows']):
+            window.set_state(values)
+        self._intervals = [_IntervalStats(*stats) for stats in state['intervals']]
+        self._interval_length = state.get(
+            'interval_frames', self._intervals[0].frames if self._intervals else 0)
+
+    def _emit(self):
+        areas = []
+        for area in range(self._area_num):
+            stats = self._intervals[area]
+            areas.append({
+                'frames': stats.frames,
+                'min': stats.min,
+                'max': stats.max,
+                'mean': stats.total / stats.frames if stats.frames else 0.0,
+                'occupied_ratio': stats.occupied / stats.frames if stats.frames else 0.0,
+                'person_frames': stats.total,
+                'rolling': self.rolling(area)
+            })
+        summary = {
+            'start': self._position_string(self._interval_start),
+            'end': self._position_string(self._interval_end),
+            'areas': areas}
+
+        self._intervals = [_IntervalStats() for _ in range(self._area_num)]
+        self._interval_length = 0
+        self._interval_start = None
+        self._interval_end = None
+        self._timestamped = False
+
+        if self._output_file:
+            with open(self._output_file, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(summary) + '\n')
+        return summary
+
+    def _position_string(self, position):
+        # timestamps are written as strings of Console, frame indexes as they are
+        if self._timestamped and isinstance(position, int):
+            return timestamp_util.to_string(position, self._timestamp_length)
+        return position
@@ -0,0 +1,511 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import re
+import glob
+import json
+import argparse
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+import timestamp_util
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+
+_SEGMENT_PATTERN = re.compile(r'segment_(\d{8})_(-?\d+)_(-?\d+)_(\d+)\.npz$')
+
+
+def timestamp_to_ms(timestamp):
+    """convert timestamp string of Console to epoch milliseconds
+
+    Args:
+        timestamp (str): timestamp in "yyyyMMddHHmmssfff" format (UTC)
+
+    Returns:
+        int: milliseconds from 1970-01-01 00:00:00 UTC
+    """
+    return timestamp_util.parse(timestamp)
+
+
+def _save_npz(file_path, **arrays):
+    # write to temporary file and replace, so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, file_path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+class _Rollup() :
+    """count, sum, min and max of each area per time bucket
+
+    """
+
+    def __init__(self, bucket_ms, area_num):
+        self.bucket_ms = bucket_ms
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.frames = np.zeros((0, area_num), dtype=np.int64)
+        self.total = np.zeros((0, area_num), dtype=np.float64)
+        self.minimum = np.zeros((0, area_num), dtype=np.float64)
+        self.maximum = np.zeros((0, area_num), dtype=np.float64)
+
+    def add(self, timestamps, counts):
+        if len(timestamps) == 0:
+            return
+        area_num = counts.shape[1]
+        starts, inverse = np.unique(
+            timestamps // self.bucket_ms * self.bucket_ms, return_inverse=True)
+        valid = ~np.isnan(counts)
+        bucket_area = (inverse[:, None], np.arange(area_num)[None, :])
+
+        frames = np.zeros((len(starts), area_num), dtype=np.int64)
+        np.add.at(frames, bucket_area, valid)
+        total = np.zeros((len(starts), area_num), dtype=np.float64)
+        np.add.at(total, bucket_area, np.where(valid, counts, 0.0))
+        minimum = np.full((len(starts), area_num), np.inf)
+        np.minimum.at(minimum, bucket_area, np.where(valid, counts, np.inf))
+        maximum = np.full((len(starts), area_num), -np.inf)
+        np.maximum.at(maximum, bucket_area, np.where(valid, counts, -np.inf))
+
+        self._merge(starts, frames, total, minimum, maximum)
+
+    def _merge(self, starts, frames, total, minimum, maximum):
+        merged_starts = np.union1d(self.starts, starts)
+        area_num = frames.shape[1]
+        merged_frames = np.zeros((len(merged_starts), area_num), dtype=np.int64)
+        merged_total = np.zeros((len(merged_starts), area_num), dtype=np.float64)
+        merged_minimum = np.full((len(merged_starts), area_num), np.inf)
+        merged_maximum = np.full((len(merged_starts), area_num), -np.inf)
+        for (bucket_starts, bucket_frames, bucket_total, bucket_minimum,
+             bucket_maximum) in (
+                (self.starts, self.frames, self.total, self.minimum, self.maximum),
+                (starts, frames, total, minimum, maximum)):
+            position = np.searchsorted(merged_starts, bucket_starts)
+            merged_frames[position] += bucket_frames
+            merged_total[position] += bucket_total
+            merged_minimum[position] = np.minimum(merged_minimum[position], bucket_minimum)
+            merged_maximum[position] = np.maximum(merged_maximum[position], bucket_maximum)
+        self.starts = merged_starts
+        self.frames = merged_frames
+        self.total = merged_total
+        self.minimum = merged_minimum
+        self.maximum = merged_maximum
+
+    def range(self, start_ms, end_ms):
+        # buckets whose start is in [start_ms, end_ms)
+        first = np.searchsorted(self.starts, start_ms, side='left')
+        last = np.searchsorted(self.starts, end_ms, side='left')
+        return slice(first, last)
+
+    def save(self, file_path):
+        _save_npz(
+            file_path, starts=self.starts, frames=self.frames, total=self.total,
+            minimum=self.minimum, maximum=self.maximum)
+
+    def load(self, file_path):
+        with np.load(file_path) as data:
+            self.starts = data['starts']
+            self.frames = data['frames']
+            self.total = data['total']
+            self.minimum = data['minimum']
+            self.maximum = data['maximum']
+
+
+class ResultStore() :
+    """time indexed store of per-area counts
+
+    Counts are appended to a buffer and written as segments of arrays
+    sorted by timestamp. Range queries find segments and rows by binary
+    search, and summaries are served from per-minute and per-hour rollups,
+    so only the partial minutes at both ends of a range read raw rows.
+    Queries see the rows written by flush (called every segment_frames
+    and at close). Buffered rows are saved in the checkpoint state, so
+    checkpoints do not cut segments short.
+
+    Args:
+        config (dict): result store settings
+        area_num (int): maximum number of areas
+    """
+
+    def __init__(self, config, area_num):
+
+        # Get parameter from config
+        self._store_dir = config['store_dir']
+        self._segment_frames = config.get('segment_frames', 3600)
+        # time of results without timestamp (local data)
+        start_timestamp = config.get('start_timestamp', '')
+        self._start_ms = timestamp_to_ms(start_timestamp) if start_timestamp else 0
+        self._frame_interval_ms = config.get('frame_interval_ms', 1000)
+        self._area_num = area_num
+
+        # Check parameter
+        if self._segment_frames < 1:
+            raise ValueError('segment_frames must be 1 or more')
+        if self._frame_interval_ms < 0:
+            raise ValueError('frame_interval_ms must be 0 or more')
+
+        os.makedirs(self._store_dir, exist_ok=True)
+
+        self._buffer_timestamps = []
+        self._buffer_counts = []
+        self._segment_cache = OrderedDict()
+        self._rollups = {
+            'minute': _Rollup(MINUTE_MS, area_num),
+            'hour': _Rollup(HOUR_MS, area_num)
+        }
+        self._load_segment_index()
+        for name, rollup in self._rollups.items():
+            rollup_file = self._rollup_file(name)
+            if os.path.exists(rollup_file):
+                rollup.load(rollup_file)
+
+    def __len__(self):
+        return int(self._segment_rows.sum()) + len(self._buffer_timestamps)
+
+    def append(self, timestamp, count, frame=None):
+        """append counts of one frame
+
+        Args:
+            timestamp (str or int): timestamp string, epoch milliseconds,
+                or None to use start_timestamp and frame_interval_ms
+            count (list): count of each area
+            frame (int, optional): frame index in the input, used for the time
+                of frames without timestamp. Defaults to None (number of rows).
+        """
+        if timestamp is None:
+            if frame is None:
+                frame = len(self)
+            timestamp_ms = self._start_ms + frame * self._frame_interval_ms
+        elif isinstance(timestamp, str):
+            timestamp_ms = timestamp_to_ms(timestamp)
+        else:
+            timestamp_ms = int(timestamp)
+
+        row = [np.nan] * self._area_num
+        row[:len(count)] = count
+        self._buffer_timestamps.append(timestamp_ms)
+        self._buffer_counts.append(row)
+
+        if len(self._buffer_timestamps) >= self._segment_frames:
+            self.flush()
+
+    def flush(self):
+        """write buffered rows as a segment and update rollups
+
+        """
+        if not self._buffer_timestamps:
+            return
+        timestamps = np.array(self._buffer_timestamps, dtype=np.int64)
+        counts = np.array(self._buffer_counts, dtype=np.float32)
+        self._buffer_timestamps = []
+        self._buffer_counts = []
+
+        # rows are sorted in a segment, segments may overlap in time
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        counts = counts[order]
+
+        sequence = len(self._segment_files)
+        segment_file = os.path.join(
+            self._store_dir,
+            f'segment_{sequence:08d}_{timestamps[0]}_{timestamps[-1]}_{len(timestamps)}.npz')
+        _save_npz(segment_file, timestamps=timestamps, counts=counts)
+        self._add_segment(segment_file, timestamps[0], timestamps[-1], len(timestamps))
+
+        for name, rollup in self._rollups.items():
+            rollup.add(timestamps, counts)
+            rollup.save(self._rollup_file(name))
+
+    def close(self):
+        """write buffered rows
+
+        """
+        self.flush()
+
+    def clear(self):
+        """remove all segments and rollups, to start a new store
+
+        """
+        for file_path in self._segment_files + [
+                self._rollup_file(name) for name in self._rollups]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        self._buffer_timestamps = []
+        self._buffer_counts = []
+        self._segment_cache.clear()
+        self._load_segment_index()
+        self._rollups = {
+            name: _Rollup(rollup.bucket_ms, self._area_num)
+            for name, rollup in self._rollups.items()
+        }
+
+    def get_state(self):
+        """get store state for checkpoint
+
+        Returns:
+            dict: rows in segments and buffered rows (NaN counts as None)
+        """
+        return {
+            'rows': int(self._segment_rows.sum()),
+            'buffer_timestamps': list(self._buffer_timestamps),
+            'buffer_counts': [
+                [None if value != value else value for value in row]
+                for row in self._buffer_counts]
+        }
+
+    def set_state(self, state):
+        """restore store state from checkpoint
+
+        Segments written after the checkpoint are removed, rollups are
+        rebuilt from the remaining segments and buffered rows are restored.
+
+        Args:
+            state (dict): store state
+        """
+        rows = state['rows']
+        self._buffer_timestamps = list(state.get('buffer_timestamps', []))
+        self._buffer_counts = [
+            [np.nan if value is None else value for value in row]
+            for row in state.get('buffer_counts', [])]
+        if int(self._segment_rows.sum()) == rows:
+            return
+
+        ends = np.concatenate([[0], np.cumsum(self._segment_rows)])
+        keep = int(np.searchsorted(ends, rows))
+        if keep >= len(ends) or ends[keep] != rows:
+            raise ValueError('result store does not match checkpoint')
+        for segment_file in self._segment_files[keep:]:
+            os.remove(segment_file)
+        self._segment_cache.clear()
+        self._load_segment_index()
+        self._rebuild_rollups()
+
+    def query(self, area, start_ms, end_ms):
+        """get counts of an area in time range
+
+        Args:
+            area (int): area index
+            start_ms (int): start time in epoch milliseconds (included)
+            end_ms (int): end time in epoch milliseconds (excluded)
+
+        Returns:
+            numpy.ndarray: timestamps in epoch milliseconds
+            numpy.ndarray: counts (NaN where the area was not defined)
+        """
+        timestamps_list = []
+        counts_list = []
+        for position in self._segments_in_range(start_ms, end_ms):
+            timestamps, counts = self._read_segment(position)
+            first = np.searchsorted(timestamps, start_ms, side='left')
+            last = np.searchsorted(timestamps, end_ms, side='left')
+            timestamps_list.append(timestamps[first:last])
+            counts_list.append(counts[first:last, area])
+
+        if not timestamps_list:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        timestamps = np.concatenate(timestamps_list)
+        counts = np.concatenate(counts_list)
+        if len(timestamps_list) > 1:
+            order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
+            counts = counts[order]
+        return timestamps, counts
+
+    def rollup(self, area, start_ms, end_ms, resolution='minute'):
+        """get precomputed summaries of an area per minute or hour
+
+        Args:
+            area (int): area index
+            start_ms (int): start time in epoch milliseconds (included)
+            end_ms (int): end time in epoch milliseconds (excluded)
+            resolution (str, optional): 'minute' or 'hour'. Defaults to 'minute'.
+
+        Returns:
+            dict: bucket start times and frames, min, max and mean per bucket
+        """
+        if resolution not in self._rollups:
+            raise ValueError(f'{resolution} is not supported')
+        rollup = self._rollups[resolution]
+        bucket_slice = rollup.range(start_ms, end_ms)
+        frames = rollup.frames[bucket_slice, area]
+        total = rollup.total[bucket_slice, area]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(frames > 0, total / frames, np.nan)
+        return {
+            'start': rollup.starts[bucket_slice],
+            'frames': frames,
+            'min': np.where(frames > 0, rollup.minimum[bucket_slice, area], np.nan),
+            'max': np.where(frames > 0, rollup.maximum[bucket_slice, area], np.nan),
+            'mean': mean
+        }
+
+    def summary(self, area, start_ms, end_ms):
+        """get min, max and mean of an area in time range
+
+        Whole hours are read from the hour rollup, whole minutes from the
+        minute rollup, and the rest from raw rows.
+
+        Args:
+            area (int): area index
+            start_ms (int): start time in epoch milliseconds (included)
+            end_ms (int): end time in epoch milliseconds (excluded)
+
+        Returns:
+            dict: frames, min, max and mean (None if there is no frame)
+        """
+        frames, total, minimum, maximum = self._summarize(
+            area, start_ms, end_ms, ('hour', 'minute'))
+        if frames == 0:
+            return {'frames': 0, 'min': None, 'max': None, 'mean': None}
+        return {
+            'frames': int(frames),
+            'min': float(minimum),
+            'max': float(maximum),
+            'mean': float(total / frames)
+        }
+
+    def _summarize(self, area, start_ms, end_ms, levels):
+        if start_ms >= end_ms:
+            return 0, 0.0, np.inf, -np.inf
+        if not levels:
+            _, counts = self.query(area, start_ms, end_ms)
+            counts = counts[~np.isnan(counts)].astype(np.float64)
+            if len(counts) == 0:
+                return 0, 0.0, np.inf, -np.inf
+            return len(counts), counts.sum(), counts.min(), counts.max()
+
+        rollup = self._rollups[levels[0]]
+        inner_start = -(-start_ms // rollup.bucket_ms) * rollup.bucket_ms
+        inner_end = end_ms // rollup.bucket_ms * rollup.bucket_ms
+        if inner_start >= inner_end:
+            return self._summarize(area, start_ms, end_ms, levels[1:])
+
+        bucket_slice = rollup.range(inner_start, inner_end)
+        parts = [
+            (rollup.frames[bucket_slice, area].sum(),
+             rollup.total[bucket_slice, area].sum(),
+             rollup.minimum[bucket_slice, area].min(initial=np.inf),
+             rollup.maximum[bucket_slice, area].max(initial=-np.inf)),
+            self._summarize(area, start_ms, inner_start, levels[1:]),
+            self._summarize(area, inner_end, end_ms, levels[1:])
+        ]
+        return (
+            sum(part[0] for part in parts),
+            sum(part[1] for part in parts),
+            min(part[2] for part in parts),
+            max(part[3] for part in parts))
+
+    def _rollup_file(self, name):
+        return os.path.join(self._store_dir, f'rollup_{name}.npz')
+
+    def _load_segment_index(self):
+        entries = []
+        for segment_file in glob.glob(os.path.join(self._store_dir, 'segment_*.npz')):
+            match = _SEGMENT_PATTERN.search(os.path.basename(segment_file))
+            if match is not None:
+                entries.append((
+                    int(match.group(1)), segment_file,
+                    int(match.group(2)), int(match.group(3)), int(match.group(4))))
+        entries.sort()
+        self._segment_files = [entry[1] for entry in entries]
+        self._segment_first = np.array([entry[2] for entry in entries], dtype=np.int64)
+        self._segment_last = np.array([entry[3] for entry in entries], dtype=np.int64)
+        self._segment_rows = np.array([entry[4] for entry in entries], dtype=np.int64)
+
+    def _add_segment(self, segment_file, first, last, rows):
+        self._segment_files.append(segment_file)
+        self._segment_first = np.append(self._segment_first, first)
+        self._segment_last = np.append(self._segment_last, last)
+        self._segment_rows = np.append(self._segment_rows, rows)
+
+    def _segments_in_range(self, start_ms, end_ms):
+        return np.flatnonzero(
+            (self._segment_first < end_ms) & (self._segment_last >= start_ms))
+
+    def _read_segment(self, position):
+        segment_file = self._segment_files[position]
+        cached = self._segment_cache.get(segment_file)
+        if cached is not None:
+            self._segment_cache.move_to_end(segment_file)
+            return cached
+        with np.load(segment_file) as data:
+            cached = (data['timestamps'], data['counts'])
+        self._segment_cache[segment_file] = cached
+        if len(self._segment_cache) > 8:
+            self._segment_cache.popitem(last=False)
+        return cached
+
+    def _rebuild_rollups(self):
+        self._rollups = {
+            name: _Rollup(rollup.bucket_ms, self._area_num)
+            for name, rollup in self._rollups.items()
+        }
+        for position in range(len(self._segment_files)):
+            timestamps, counts = self._read_segment(position)
+            for rollup in self._rollups.values():
+                rollup.add(timestamps, counts)
+        for name, rollup in self._rollups.items():
+            rollup.save(self._rollup_file(name))
+
+
+def main():
+    """query result store
+
+    """
+
+    # Get argument
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store_dir', type=str)
+    parser.add_argument('--area', type=int, default=0)
+    parser.add_argument('--start', type=str, required=True,
+                        help='yyyyMMddHHmmssfff (included)')
+    parser.add_argument('--end', type=str, required=True,
+                        help='yyyyMMddHHmmssfff (excluded)')
+    parser.add_argument('--resolution', type=str, default='',
+                        choices=['', 'minute', 'hour'],
+                        help='print rollup per minute or hour instead of summary')
+    parser.add_argument('--area_num', type=int, default=4)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.store_dir):
+        raise ValueError(f'cannot open {args.store_dir}')
+
+    store = ResultStore({'store_dir': args.store_dir}, args.area_num)
+    start_ms = timestamp_to_ms(args.start)
+    end_ms = timestamp_to_ms(args.end)
+    if args.resolution:
+        # NaN (no frame in bucket) is written as null
+        result = {
+            key: [None if value != value else value for value in values.tolist()]
+            for key, values in store.rollup(
+                args.area, start_ms, end_ms, args.resolution).items()}
+    else:
+        result = store.summary(args.area, start_ms, end_ms)
+    print(json.dumps(result, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# automatically generated by the FlatBuffers compiler, do not modify
+
+# namespace: SmartCamera
+
+import flatbuffers
+from flatbuffers.compat import import_numpy
+np = import_numpy()
+
+class BoundingBox2dStruct(object):
+    __slots__ = ['_tab']
+
+    @classmethod
+    def SizeOf(cls):
+        return 16
+
+    # BoundingBox2dStruct
+    def Init(self, buf, pos):
+        self._tab = flatbuffers.table.Table(buf, pos)
+
+    # BoundingBox2dStruct
+    def Left(self): return self._tab.Get(flatbuffers.number_types.Int32Flags, self._tab.Pos + flatbuffers.number_types.UOffsetTFlags.py_type(0))
+    # BoundingBox2dStruct
+    def Top(self): return self._tab.Get(flatbuffers.number_types.Int32Flags, self._tab.Pos + flatbuffers.number_types.UOffsetTFlags.py_type(4))
+    # BoundingBox2dStruct
+    def Right(self): return self._tab.Get(flatbuffers.number_types.Int32Flags, self._tab.Pos + flatbuffers.number_types.UOffsetTFlags.py_type(8))
+    # BoundingBox2dStruct
+    def Bottom(self): return self._tab.Get(flatbuffers.number_types.Int32Flags, self._tab.Pos + flatbuffers.number_types.UOffsetTFlags.py_type(12))
+
+def CreateBoundingBox2dStruct(builder, left, top, right, bottom):
+    builder.Prep(4, 16)
+    builder.PrependInt32(bottom)
+    builder.PrependInt32(right)
+    builder.PrependInt32(top)
+    builder.PrependInt32(left)
+    return builder.Offset()
\ No newline at end of file
@@ -0,0 +1,136 @@
+# automatically generated by the FlatBuffers compiler, do not modify
+
+# namespace: SmartCamera
+
+import flatbuffers
+from flatbuffers.compat import import_numpy
+np = import_numpy()
+
+class ObjectDetectionCompact(object):
+    __slots__ = ['_tab']
+
+    @classmethod
+    def GetRootAs(cls, buf, offset=0):
+        n = flatbuffers.encode.Get(flatbuffers.packer.uoffset, buf, offset)
+        x = ObjectDetectionCompact()
+        x.Init(buf, n + offset)
+        return x
+
+    @classmethod
+    def GetRootAsObjectDetectionCompact(cls, buf, offset=0):
+        """This method is deprecated. Please switch to GetRootAs."""
+        return cls.GetRootAs(buf, offset)
+    # ObjectDetectionCompact
+    def Init(self, buf, pos):
+        self._tab = flatbuffers.table.Table(buf, pos)
+
+    # ObjectDetectionCompact
+    def BoundingBoxes(self, j):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(4))
+        if o != 0:
+            x = self._tab.Vector(o)
+            x += flatbuffers.number_types.UOffsetTFlags.py_type(j) * 16
+            from SmartCamera.BoundingBox2dStruct import BoundingBox2dStruct
+            obj = BoundingBox2dStruct()
+            obj.Init(self._tab.Bytes, x)
+            return obj
+        return None
+
+    # ObjectDetectionCompact
+    def BoundingBoxesLength(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(4))
+        if o != 0:
+            return self._tab.VectorLen(o)
+        return 0
+
+    # ObjectDetectionCompact
+    def BoundingBoxesIsNone(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(4))
+        return o == 0
+
+    # ObjectDetectionCompact
+    def Scores(self, j):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(6))
+        if o != 0:
+            a = self._tab.Vector(o)
+            return self._tab.Get(flatbuffers.number_types.Float32Flags, a + flatbuffers.number_types.UOffsetTFlags.py_type(j * 4))
+        return 0
+
+    # ObjectDetectionCompact
+    def ScoresAsNumpy(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(6))
+        if o != 0:
+            return self._tab.GetVectorAsNumpy(flatbuffers.number_types.Float32Flags, o)
+        return 0
+
+    # ObjectDetectionCompact
+    def ScoresLength(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(6))
+        if o != 0:
+            return self._tab.VectorLen(o)
+        return 0
+
+    # ObjectDetectionCompact
+    def ScoresIsNone(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(6))
+        return o == 0
+
+    # ObjectDetectionCompact
+    def ClassIds(self, j):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        if o != 0:
+            a = self._tab.Vector(o)
+            return self._tab.Get(flatbuffers.number_types.Uint32Flags, a + flatbuffers.number_types.UOffsetTFlags.py_type(j * 4))
+        return 0
+
+    # ObjectDetectionCompact
+    def ClassIdsAsNumpy(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        if o != 0:
+            return self._tab.GetVectorAsNumpy(flatbuffers.number_types.Uint32Flags, o)
+        return 0
+
+    # ObjectDetectionCompact
+    def ClassIdsLength(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        if o != 0:
+            return self._tab.VectorLen(o)
+        return 0
+
+    # ObjectDetectionCompact
+    def ClassIdsIsNone(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(8))
+        return o == 0
+
+def Start(builder): builder.StartObject(3)
+def ObjectDetectionCompactStart(builder):
+    """This method is deprecated. Please switch to Start."""
+    return Start(builder)
+def AddBoundingBoxes(builder, boundingBoxes): builder.PrependUOffsetTRelativeSlot(0, flatbuffers.number_types.UOffsetTFlags.py_type(boundingBoxes), 0)
+def ObjectDetectionCompactAddBoundingBoxes(builder, boundingBoxes):
+    """This method is deprecated. Please switch to AddBoundingBoxes."""
+    return AddBoundingBoxes(builder, boundingBoxes)
+def StartBoundingBoxesVector(builder, numElems): return builder.StartVector(16, numElems, 4)
+def ObjectDetectionCompactStartBoundingBoxesVector(builder, numElems):
+    """This method is deprecated. Please switch to Start."""
+    return StartBoundingBoxesVector(builder, numElems)
+def AddScores(builder, scores): builder.PrependUOffsetTRelativeSlot(1, flatbuffers.number_types.UOffsetTFlags.py_type(scores), 0)
+def ObjectDetectionCompactAddScores(builder, scores):
+    """This method is deprecated. Please switch to AddScores."""
+    return AddScores(builder, scores)
+def StartScoresVector(builder, numElems): return builder.StartVector(4, numElems, 4)
+def ObjectDetectionCompactStartScoresVector(builder, numElems):
+    """This method is deprecated. Please switch to Start."""
+    return StartScoresVector(builder, numElems)
+def AddClassIds(builder, classIds): builder.PrependUOffsetTRelativeSlot(2, flatbuffers.number_types.UOffsetTFlags.py_type(classIds), 0)
+def ObjectDetectionCompactAddClassIds(builder, classIds):
+    """This method is deprecated. Please switch to AddClassIds."""
+    return AddClassIds(builder, classIds)
+def StartClassIdsVector(builder, numElems): return builder.StartVector(4, numElems, 4)
+def ObjectDetectionCompactStartClassIdsVector(builder, numElems):
+    """This method is deprecated. Please switch to Start."""
+    return StartClassIdsVector(builder, numElems)
+def End(builder): return builder.EndObject()
+def ObjectDetectionCompactEnd(builder):
+    """This method is deprecated. Please switch to End."""
+    return End(builder)
\ No newline at end of file
@@ -0,0 +1,337 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+
+
+class LatencyHistogram() :
+    """latency histogram with fixed exponential buckets
+
+    Buckets are fixed at creation so that recording a value is one
+    bisect and a few additions, cheap enough to keep on in production.
+    """
+
+    # upper bounds in seconds, 1us to about 16s
+    BUCKET_BOUNDS = tuple(1e-6 * (2 ** i) for i in range(25))
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BUCKET_BOUNDS) + 1)
+
+    def observe(self, value):
+        """record one latency value
+
+        Args:
+            value (float): latency in seconds
+        """
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+        self.buckets[bisect.bisect_left(self.BUCKET_BOUNDS, value)] += 1
+
+    def percentile(self, ratio):
+        """estimate percentile from the buckets
+
+        Args:
+            ratio (float): percentile in the range of 0 to 1
+
+        Returns:
+            float: upper bound of the bucket holding the percentile
+        """
+        if self.count == 0:
+            return 0.0
+        rank = ratio * self.count
+        cumulative = 0
+        for index, bucket in enumerate(self.buckets):
+            cumulative += bucket
+            if cumulative >= rank and bucket > 0:
+                if index < len(self.BUCKET_BOUNDS):
+                    return min(self.BUCKET_BOUNDS[index], self.max)
+                break
+        return self.max
+
+    def to_dict(self):
+        """get histogram as dict
+
+        Returns:
+            dict: statistics and bucket counts
+        """
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': mean,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': list(self.buckets)
+        }
+
+
+class _StageTimer() :
+    __slots__ = ['_metrics', '_stage', '_start']
+
+    def __init__(self, metrics, stage):
+        self._metrics = metrics
+        self._stage = stage
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.observe(self._stage, time.perf_counter() - self._start)
+        return False
+
+
+class _NullTimer() :
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class StageMetrics() :
+    """latency histograms and counters for each pipeline stage
+
+    Args:
+        config (dict, optional): metrics settings. Defaults to None.
+    """
+
+    def __init__(self, config=None):
+        # Init
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._http_server = None
+        self._start_time = time.time()
+
+        # Get parameter from config
+        if config is None:
+            config = {}
+        self._summary_interval = config.get('summary_interval', 0)
+        self._dump_file = config.get('dump_file', '')
+        self._http_port = config.get('http_port', 0)
+        self._next_summary = time.perf_counter() + self._summary_interval
+
+        if self._summary_interval < 0:
+            raise ValueError('summary_interval must be 0 or more')
+
+    def measure(self, stage):
+        """measure latency of a stage
+
+        Args:
+            stage (str): stage name
+
+        Returns:
+            context manager: records elapsed time on exit
+        """
+        return _StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        """record latency of a stage
+
+        Args:
+            stage (str): stage name
+            seconds (float): latency in seconds
+        """
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram())
+        histogram.observe(seconds)
+
+    def increment(self, name, value=1):
+        """increment a counter
+
+        Args:
+            name (str): counter name
+            value (int, optional): increment value. Defaults to 1.
+        """
+        if name not in self._counters:
+            with self._lock:
+                self._counters.setdefault(name, 0)
+        self._counters[name] += value
+
+    def to_dict(self):
+        """get all metrics as dict
+
+        Returns:
+            dict: histograms and counters
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        return {
+            'uptime': time.time() - self._start_time,
+            'stages': {
+                stage: histogram.to_dict() for stage, histogram in histograms.items()},
+            'counters': counters
+        }
+
+    def summary(self):
+        """get human readable summary
+
+        Returns:
+            str: one line per stage and counter
+        """
+        metrics_dict = self.to_dict()
+        lines = [f"[metrics] uptime {metrics_dict['uptime']:.1f}s"]
+        for stage, stats in metrics_dict['stages'].items():
+            lines.append(
+                f"[metrics] {stage:<24} n={stats['count']:<8d} "
+                f"mean={stats['mean']*1e3:.3f}ms p50={stats['p50']*1e3:.3f}ms "
+                f"p99={stats['p99']*1e3:.3f}ms max={stats['max']*1e3:.3f}ms")
+        for name, value in metrics_dict['counters'].items():
+            lines.append(f'[metrics] {name:<24} {value}')
+        return '\n'.join(lines)
+
+    def report_if_due(self, write=print):
+        """write summary when summary_interval has elapsed
+
+        Args:
+            write (function, optional): output function. Defaults to print.
+        """
+        if self._summary_interval <= 0:
+            return
+        now = time.perf_counter()
+        if now >= self._next_summary:
+            self._next_summary = now + self._summary_interval
+            write(self.summary())
+
+    def dump(self, file_path=None):
+        """write metrics as json file
+
+        Args:
+            file_path (str, optional): output file. Defaults to dump_file in config.
+        """
+        if file_path is None:
+            file_path = self._dump_file
+        if not file_path:
+            return
+        dir_name = os.path.dirname(file_path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=4)
+
+    def to_prometheus(self):
+        """get metrics in Prometheus text exposition format
+
+        Returns:
+            str: metrics text
+        """
+        metrics_dict = self.to_dict()
+        lines = ['# TYPE crowd_count_stage_seconds histogram']
+        for stage, stats in metrics_dict['stages'].items():
+            cumulative = 0
+            for bound, bucket in zip(
+                    LatencyHistogram.BUCKET_BOUNDS + ('+Inf',), stats['buckets']):
+                cumulative += bucket
+                lines.append(
+                    f'crowd_count_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} '
+                    f'{cumulative}')
+            lines.append(
+                f'crowd_count_stage_seconds_sum{{stage="{stage}"}} {stats["total"]}')
+            lines.append(
+                f'crowd_count_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines.append('# TYPE crowd_count_events_total counter')
+        for name, value in metrics_dict['counters'].items():
+            lines.append(f'crowd_count_events_total{{name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port=None):
+        """serve Prometheus text on localhost
+
+        Args:
+            port (int, optional): port number. Defaults to http_port in config.
+        """
+        if port is None:
+            port = self._http_port
+        if not port or self._http_server is not None:
+            return
+
+        # http.server is only needed for this endpoint
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer(('127.0.0.1', port), _MetricsHandler)
+        threading.Thread(
+            target=self._http_server.serve_forever, daemon=True).start()
+
+    def close(self):
+        """stop http server and write dump file
+
+        """
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+        self.dump()
+
+
+class NullMetrics(StageMetrics) :
+    """metrics which records nothing
+
+    Args:
+        StageMetrics (class): latency histograms and counters
+    """
+
+    _NULL_TIMER = _NullTimer()
+
+    def measure(self, stage):
+        return self._NULL_TIMER
+
+    def observe(self, stage, seconds):
+        pass
+
+    def increment(self, name, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
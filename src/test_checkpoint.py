@@ -0,0 +1,87 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+
+import pytest
+
+import checkpoint
+
+
+def _make_checkpoint(tmp_path, fingerprint='a', interval_frames=10):
+    return checkpoint.Checkpoint({
+        'checkpoint_file': str(tmp_path / 'state' / 'checkpoint.json'),
+        'interval_frames': interval_frames}, fingerprint)
+
+
+def test_save_and_load(tmp_path):
+    state = {'crowd_count': {'stabilizer': [1.5, 2.0]}, 'output': {'counter': 30}}
+    _make_checkpoint(tmp_path).save(30, '20230101000001000', state)
+
+    saved = _make_checkpoint(tmp_path).load()
+    assert saved['frame'] == 30
+    assert saved['timestamp'] == '20230101000001000'
+    assert saved['state'] == state
+
+
+def test_load_without_file(tmp_path):
+    assert _make_checkpoint(tmp_path).load() is None
+
+
+def test_different_fingerprint_is_rejected(tmp_path):
+    _make_checkpoint(tmp_path, 'a').save(10, None, {})
+    with pytest.raises(ValueError, match='different configuration'):
+        _make_checkpoint(tmp_path, 'b').load()
+
+
+def test_different_version_is_rejected(tmp_path):
+    writer = _make_checkpoint(tmp_path)
+    writer.save(10, None, {})
+    checkpoint_file = tmp_path / 'state' / 'checkpoint.json'
+    saved = json.loads(checkpoint_file.read_text(encoding='utf-8'))
+    saved['version'] = checkpoint.Checkpoint.VERSION + 1
+    checkpoint_file.write_text(json.dumps(saved), encoding='utf-8')
+    with pytest.raises(ValueError, match='version'):
+        writer.load()
+
+
+def test_failed_save_keeps_previous_checkpoint(tmp_path):
+    writer = _make_checkpoint(tmp_path)
+    writer.save(10, None, {'output': {'counter': 10}})
+    with pytest.raises(TypeError):
+        writer.save(20, None, {'output': {'counter': object()}})
+
+    assert writer.load()['frame'] == 10
+    assert os.listdir(tmp_path / 'state') == ['checkpoint.json']
+
+
+def test_fingerprint():
+    settings = [{'mode': 'local', 'meta_file': 'a.csv'}, None]
+    assert checkpoint.Checkpoint.make_fingerprint(settings) \
+        == checkpoint.Checkpoint.make_fingerprint([{'meta_file': 'a.csv', 'mode': 'local'}, None])
+    assert checkpoint.Checkpoint.make_fingerprint(settings) \
+        != checkpoint.Checkpoint.make_fingerprint([{'mode': 'local', 'meta_file': 'b.csv'}, None])
+
+
+def test_interval(tmp_path):
+    writer = _make_checkpoint(tmp_path, interval_frames=10)
+    assert [frame for frame in range(1, 31) if writer.is_due(frame)] == [10, 20, 30]
+
+    with pytest.raises(ValueError):
+        _make_checkpoint(tmp_path, interval_frames=0)
+    with pytest.raises(ValueError):
+        checkpoint.Checkpoint({'checkpoint_file': ''}, 'a')
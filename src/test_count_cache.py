@@ -0,0 +1,118 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+import count_cache
+import crowd_count
+import meta_serializer
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_hit_and_miss():
+    cache = count_cache.CountCache()
+    key = cache.meta_key(b'meta')
+    assert key == cache.meta_key(b'meta')
+    assert key != cache.meta_key(b'other meta')
+
+    assert cache.get_meta(key) is None
+    cache.put_meta(key, 'result')
+    assert cache.get_meta(key) == 'result'
+    stats = cache.stats()
+    assert stats['meta'] == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 1}
+    assert stats['point'] == {'hits': 0, 'misses': 0, 'hit_rate': 0.0, 'entries': 0}
+
+
+def test_least_recently_used_is_evicted():
+    cache = count_cache.CountCache({'max_entries': 2})
+    cache.put_meta(b'a', 1)
+    cache.put_meta(b'b', 2)
+    # a is used, so b is the least recently used one
+    assert cache.get_meta(b'a') == 1
+    cache.put_meta(b'c', 3)
+    assert cache.get_meta(b'b') is None
+    assert cache.get_meta(b'a') == 1
+    assert cache.get_meta(b'c') == 3
+    assert cache.stats()['meta']['entries'] == 2
+
+
+def test_point_key():
+    cache = count_cache.CountCache()
+    assert cache.point_key([(30, 40), (10, 20)]) == cache.point_key([(10, 20), (30, 40)])
+    assert cache.point_key([(10, 20)]) != cache.point_key([(11, 20)])
+
+    quantized = count_cache.CountCache({'point_quantum': 4})
+    assert quantized.point_key([(8, 20)]) == quantized.point_key([(11, 23)])
+    assert quantized.point_key([(8, 20)]) != quantized.point_key([(12, 20)])
+
+
+def test_point_cache_can_be_disabled():
+    cache = count_cache.CountCache({'point_quantum': 0})
+    key = cache.point_key([(10, 20)])
+    assert key is None
+    cache.put_points(key, (1, [1]))
+    assert cache.get_points(key) is None
+    assert cache.stats()['point']['entries'] == 0
+
+
+def test_clear():
+    cache = count_cache.CountCache()
+    cache.put_meta(b'a', 1)
+    key = cache.point_key([(10, 20)])
+    cache.put_points(key, (1, [1]))
+    cache.clear()
+    assert cache.get_meta(b'a') is None
+    assert cache.get_points(key) is None
+
+
+@pytest.mark.parametrize('config', [{'max_entries': 0}, {'point_quantum': -1}])
+def test_invalid_parameter(config):
+    with pytest.raises(ValueError):
+        count_cache.CountCache(config)
+
+
+def test_counts_match_without_cache():
+    with open(os.path.join(ROOT_DIR, 'config', 'local_default_param.yaml'),
+              'r', encoding='utf-8') as file:
+        params = yaml.safe_load(file)
+
+    # frames repeat, and some repeat with other scores only
+    random = np.random.default_rng(0)
+    serializer = meta_serializer.MetaSerializer()
+    frames = []
+    for _ in range(20):
+        left_top = random.integers(400, 1600, size=(8, 2))
+        bboxes = np.concatenate([left_top, left_top + [60, 200]], axis=1)
+        frames.append((bboxes, random.random(8).astype(np.float32), np.zeros(8, dtype=int)))
+    frames += frames[:5]
+    frames += [(bboxes, scores[::-1].copy(), class_ids)
+               for bboxes, scores, class_ids in frames[5:10]]
+    metas = [serializer.serialize_arrays(*frame) for frame in frames]
+
+    cache = count_cache.CountCache()
+    cached_counter = crowd_count.CrowdCount(params, count_cache=cache)
+    counter = crowd_count.CrowdCount(params)
+    for meta in metas:
+        assert cached_counter(meta) == counter(meta)
+    stats = cache.stats()
+    assert stats['meta']['hits'] == 5
+    assert stats['point']['hits'] == 5
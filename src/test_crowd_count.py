@@ -0,0 +1,144 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import copy
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+import crowd_count
+import meta_serializer
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLASSES = [
+    {'class_id': 0, 'name': 'person'},
+    {'class_id': 2, 'name': 'car', 'min_detect_score': 0.5, 'min_height': 20, 'max_height': 300}
+]
+
+
+def _load_params():
+    with open(os.path.join(ROOT_DIR, 'config', 'local_default_param.yaml'),
+              'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+def _make_frames(frame_num, seed=0):
+    random = np.random.default_rng(seed)
+    frames = []
+    for _ in range(frame_num):
+        box_num = random.integers(0, 40)
+        left_top = random.integers(400, 1700, size=(box_num, 2))
+        size = random.integers(10, 400, size=(box_num, 2))
+        bboxes = np.concatenate([left_top, np.minimum(left_top + size, 1079)], axis=1)
+        scores = random.random(box_num).astype(np.float32)
+        class_ids = random.choice([0, 1, 2, 5], size=box_num)
+        frames.append((bboxes, scores, class_ids))
+    return frames
+
+
+def _class_params(params, class_param):
+    # counting only one class with its thresholds is the same as counting the class
+    class_params = copy.deepcopy(params)
+    remove = class_params['remove_low_conf']
+    for name in ('min_detect_score', 'min_height', 'max_height'):
+        remove[name] = class_param.get(name, remove[name])
+    return class_params
+
+
+def test_class_count_matches_counting_each_class():
+    params = _load_params()
+    class_config = dict(params, classes=CLASSES)
+    serializer = meta_serializer.MetaSerializer()
+    counter = crowd_count.CrowdCount(class_config)
+    class_counters = [
+        crowd_count.CrowdCount(_class_params(params, class_param)) for class_param in CLASSES]
+    total_counter = crowd_count.CrowdCount(params)
+
+    for bboxes, scores, class_ids in _make_frames(30):
+        result = counter(serializer.serialize_arrays(bboxes, scores, class_ids))
+
+        # count and the other outputs are the same as without classes
+        expected = total_counter(serializer.serialize_arrays(bboxes, scores, class_ids))
+        assert {key: value for key, value in result.items() if key != 'class_count'} \
+            == expected
+
+        expected_class_count = []
+        for class_param, class_counter in zip(CLASSES, class_counters):
+            selected = class_ids == class_param['class_id']
+            expected_class_count.append(class_counter(serializer.serialize_arrays(
+                bboxes[selected], scores[selected], class_ids[selected]))['count'])
+        assert result['class_count'] == expected_class_count
+
+
+def test_no_class_count_without_classes():
+    serializer = meta_serializer.MetaSerializer()
+    result = crowd_count.CrowdCount(_load_params())(
+        serializer.serialize_arrays(*_make_frames(1)[0]))
+    assert 'class_count' not in result
+
+
+def test_class_state_is_restored():
+    params = dict(_load_params(), classes=CLASSES)
+    serializer = meta_serializer.MetaSerializer()
+    metas = [serializer.serialize_arrays(*frame) for frame in _make_frames(20, seed=1)]
+
+    counter = crowd_count.CrowdCount(params)
+    results = [counter(meta) for meta in metas]
+
+    counter = crowd_count.CrowdCount(params)
+    for meta in metas[:10]:
+        counter(meta)
+    restored = crowd_count.CrowdCount(params)
+    restored.set_state(counter.get_state())
+    assert [restored(meta) for meta in metas[10:]] == results[10:]
+
+
+def test_class_state_is_reset_when_classes_change():
+    params = _load_params()
+    serializer = meta_serializer.MetaSerializer()
+    metas = [serializer.serialize_arrays(*frame) for frame in _make_frames(10, seed=2)]
+
+    counter = crowd_count.CrowdCount(dict(params, classes=CLASSES))
+    for meta in metas[:5]:
+        counter(meta)
+    # the car class starts again from the current count
+    counter.set_zone_config(counter.compile_config(dict(params, classes=CLASSES[1:])))
+    fresh_counter = crowd_count.CrowdCount(dict(params, classes=CLASSES[1:]))
+    for meta in metas[5:]:
+        assert counter(meta)['class_count'] == fresh_counter(meta)['class_count']
+
+
+def test_class_rows():
+    compiled = crowd_count.CrowdCount.compile_config(
+        dict(_load_params(), classes=[{'class_id': 7}, {'class_id': 2}, {'class_id': 4}]))
+    np.testing.assert_array_equal(
+        compiled.class_rows(np.array([2, 3, 7, 4, 0, 9])), [1, -1, 0, 2, -1, -1])
+    assert compiled.class_names == ('7', '2', '4')
+
+
+@pytest.mark.parametrize('classes', [
+    [{'class_id': -1}],
+    [{'class_id': 'person'}],
+    [{'class_id': 0}, {'class_id': 0}],
+    [{'class_id': 0, 'min_height': 100, 'max_height': 50}],
+])
+def test_invalid_classes(classes):
+    with pytest.raises(RuntimeError):
+        crowd_count.CrowdCount.compile_config(dict(_load_params(), classes=classes))
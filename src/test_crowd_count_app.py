@@ -0,0 +1,144 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+
+import pytest
+
+import checkpoint
+import crowd_count_app
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _make_config(output_dir):
+    return {
+        'data_source_settings': {
+            'mode': 'local',
+            'local_data_settings': {
+                'video_file': '',
+                'meta_file': os.path.join(ROOT_DIR, 'input', 'sample.csv')
+            }
+        },
+        'crowd_count_settings': {
+            'param_file': os.path.join(ROOT_DIR, 'config', 'local_default_param.yaml')
+        },
+        'output_settings': {
+            'output_dir': str(output_dir),
+            'output_video_fps': 30,
+            'output_video_width': 1920,
+            'output_video_height': 1080
+        }
+    }
+
+
+def _read_json_files(output_dir):
+    detect_dir = os.path.join(str(output_dir), 'detect')
+    results = {}
+    for name in os.listdir(detect_dir):
+        with open(os.path.join(detect_dir, name), 'r', encoding='utf-8') as file:
+            results[name] = json.load(file)
+    return results
+
+
+def test_json_files_of_decimation_are_named_by_input_frame(tmp_path):
+    crowd_count_app.run(_make_config(tmp_path / 'full'), no_progress=True)
+
+    # the input rate is far above the processing rate, so every 4th frame
+    # is processed from the second frame on
+    config = _make_config(tmp_path / 'decimated')
+    config['decimation_settings'] = {
+        'enable': True, 'input_fps': 1000000, 'max_step': 4, 'adjust_interval': 1}
+    crowd_count_app.run(config, no_progress=True)
+
+    full = _read_json_files(tmp_path / 'full')
+    decimated = _read_json_files(tmp_path / 'decimated')
+    assert sorted(decimated) == [f'{frame:08d}.json' for frame in range(0, len(full), 4)]
+    for name, result in decimated.items():
+        assert result['bboxes'] == full[name]['bboxes']
+
+
+class _Stop(Exception):
+    pass
+
+
+def _read_state(checkpoint_file):
+    with open(checkpoint_file, 'r', encoding='utf-8') as file:
+        return json.load(file)['state']
+
+
+def test_resume_from_checkpoint_matches_full_run(tmp_path, monkeypatch):
+    def make_config(name):
+        config = _make_config(tmp_path / name)
+        config['checkpoint_settings'] = {
+            'enable': True, 'checkpoint_file': str(tmp_path / f'{name}.json'),
+            'interval_frames': 10}
+        return config
+    crowd_count_app.run(make_config('full'), no_progress=True)
+    full = _read_json_files(tmp_path / 'full')
+
+    # stop the run right after the checkpoint 10 frames before the end
+    # (the stabilizer forgets a difference of state over a longer run)
+    config = make_config('resumed')
+    stop_frame = len(full) - 10
+    save = checkpoint.Checkpoint.save
+
+    def save_and_stop(self, frame, timestamp, state):
+        save(self, frame, timestamp, state)
+        if frame == stop_frame:
+            raise _Stop()
+    monkeypatch.setattr(checkpoint.Checkpoint, 'save', save_and_stop)
+    with pytest.raises(_Stop):
+        crowd_count_app.run(config, no_progress=True)
+    monkeypatch.setattr(checkpoint.Checkpoint, 'save', save)
+    assert len(_read_json_files(tmp_path / 'resumed')) == stop_frame
+
+    crowd_count_app.run(config, resume=True, no_progress=True)
+    assert _read_json_files(tmp_path / 'resumed') == full
+    # the stabilizer ends in the same state
+    assert _read_state(tmp_path / 'resumed.json') == _read_state(tmp_path / 'full.json')
+
+
+def test_short_timestamps_of_input_are_kept(tmp_path):
+    import meta_archive
+    import meta_serializer
+
+    archive_file = str(tmp_path / 'meta.fba')
+    serializer = meta_serializer.MetaSerializer()
+    timestamps = [f'2023010100{minute:02d}{second:02d}'
+                  for minute in range(2) for second in range(60)]
+    with meta_archive.MetaArchiveWriter(archive_file) as writer:
+        for frame, timestamp in enumerate(timestamps):
+            writer.append(frame, serializer.serialize_arrays(
+                [[100, 100, 200, 300]], [0.9], [0]), timestamp)
+
+    config = _make_config(tmp_path / 'output')
+    local_settings = config['data_source_settings']['local_data_settings']
+    local_settings['meta_file'] = archive_file
+    local_settings['meta_format'] = 'archive'
+    config['occupancy_settings'] = {
+        'enable': True, 'interval_frames': 60,
+        'output_file': str(tmp_path / 'occupancy.jsonl')}
+    crowd_count_app.run(config, no_progress=True)
+
+    results = _read_json_files(tmp_path / 'output')
+    assert sorted(results) == [timestamp + '.json' for timestamp in timestamps]
+    assert results[timestamps[5] + '.json']['timestamp'] == timestamps[5]
+    with open(tmp_path / 'occupancy.jsonl', 'r', encoding='utf-8') as file:
+        summary = json.loads(file.readline())
+    assert (summary['start'], summary['end']) == (timestamps[0], timestamps[59])
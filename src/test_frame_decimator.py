@@ -0,0 +1,118 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+import pytest
+
+import frame_decimator
+
+
+def _make_decimator(**config):
+    settings = {'input_fps': 30, 'target_load': 1.0, 'latency_smoothing': 1.0,
+                'adjust_interval': 5, 'max_step': 8}
+    settings.update(config)
+    return frame_decimator.FrameDecimator(settings, np.zeros(0, dtype=np.int64), 0)
+
+
+def _run(decimator, frames, latency):
+    # frames processed with the processing time of latency(frame)
+    processed = []
+    for frame in frames:
+        if decimator.should_process(frame):
+            processed.append((frame, decimator.frame_gap))
+            decimator.observe(latency(frame))
+    return processed
+
+
+def test_frame_interval():
+    timestamps = np.array([0, 100, 200, 300, 500], dtype=np.int64)
+    assert frame_decimator.FrameDecimator({}, timestamps, 30).frame_interval == 0.1
+    assert frame_decimator.FrameDecimator({'input_fps': 20}, timestamps, 30).frame_interval \
+        == 0.05
+    assert frame_decimator.FrameDecimator({}, timestamps[:1], 25).frame_interval == 0.04
+    with pytest.raises(ValueError, match='input_fps'):
+        frame_decimator.FrameDecimator({}, timestamps[:1], 0)
+
+
+def test_every_frame_is_processed_when_fast_enough():
+    decimator = _make_decimator()
+    processed = _run(decimator, range(100), lambda frame: 0.02)
+    assert [frame for frame, _ in processed] == list(range(100))
+    assert decimator.stats()['skipped'] == 0
+
+
+def test_step_follows_load():
+    decimator = _make_decimator()
+    # 0.09s of processing covers 2.7 frames of 30fps
+    processed = _run(decimator, range(40), lambda frame: 0.09)
+    assert processed[:7] == [(0, 1), (1, 1), (2, 1), (3, 1), (4, 1), (7, 3), (10, 3)]
+    assert decimator.step == 3
+
+    # the step is lowered by one every adjust_interval processed frames
+    # (16 frames are processed before, the next adjustment is after the 20th)
+    processed = _run(decimator, range(40, 100), lambda frame: 0.01)
+    steps = [gap for _, gap in processed]
+    assert steps[:4] == [3] * 4
+    assert steps[4:9] == [2] * 5
+    assert set(steps[9:]) == {1}
+    assert decimator.step == 1
+
+
+def test_max_step():
+    decimator = _make_decimator(max_step=4)
+    _run(decimator, range(100), lambda frame: 1.0)
+    assert decimator.step == 4
+
+
+def test_target_load():
+    # 0.05s is 1.5 frames, or 3 frames at 50% load
+    decimator = _make_decimator(target_load=0.5)
+    _run(decimator, range(10), lambda frame: 0.05)
+    assert decimator.step == 3
+
+
+def test_gap_of_frames_not_given():
+    decimator = _make_decimator()
+    processed = _run(decimator, [0, 1, 5, 6], lambda frame: 0.01)
+    assert processed == [(0, 1), (1, 1), (5, 4), (6, 1)]
+
+
+def test_resume_from_state():
+    def latency(frame):
+        return 0.2 if frame % 50 < 25 else 0.01
+
+    full = _make_decimator()
+    expected = _run(full, range(200), latency)
+
+    decimator = _make_decimator()
+    processed = _run(decimator, range(100), latency)
+    restored = _make_decimator()
+    restored.set_state(decimator.get_state())
+    assert processed + _run(restored, range(100, 200), latency) == expected
+    assert restored.stats() == full.stats()
+
+
+@pytest.mark.parametrize('config', [
+    {'input_fps': -1},
+    {'target_load': 0},
+    {'target_load': 1.5},
+    {'max_step': 0},
+    {'adjust_interval': 0},
+    {'latency_smoothing': 0},
+])
+def test_invalid_parameter(config):
+    with pytest.raises(ValueError):
+        _make_decimator(**config)
@@ -0,0 +1,69 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import heatmap
+
+
+FRAME_NUM = 200
+
+
+def _make_frames():
+    random = np.random.default_rng(0)
+    return [random.integers(0, 1920, size=(random.integers(0, 30), 2)).tolist()
+            for _ in range(FRAME_NUM)]
+
+
+@pytest.mark.parametrize('mode', heatmap.HeatmapAccumulator.MODES)
+def test_resume_is_identical(mode):
+    config = {'mode': mode, 'decay': 0.9, 'window_frames': 50, 'cell_size': 40}
+    frames = _make_frames()
+
+    expected = heatmap.HeatmapAccumulator(config)
+    for positiones in frames:
+        expected(positiones)
+
+    accumulator = heatmap.HeatmapAccumulator(config)
+    for positiones in frames[:120]:
+        accumulator(positiones)
+    state = json.loads(json.dumps(accumulator.get_state()))
+
+    resumed = heatmap.HeatmapAccumulator(config)
+    resumed.set_state(state)
+    for positiones in frames[120:]:
+        resumed(positiones)
+
+    np.testing.assert_array_equal(resumed.snapshot(), expected.snapshot())
+
+
+def test_decay():
+    accumulator = heatmap.HeatmapAccumulator({'mode': 'decay', 'decay': 0.5, 'cell_size': 10})
+    accumulator([(5, 5)])
+    accumulator([])
+    accumulator([(15, 5), (15, 5)])
+    np.testing.assert_allclose(accumulator.snapshot()[0, :2], [0.25, 2.0])
+
+
+def test_window():
+    accumulator = heatmap.HeatmapAccumulator(
+        {'mode': 'window', 'window_frames': 2, 'cell_size': 10})
+    for positiones in [[(5, 5)], [(5, 5)], [(15, 5)]]:
+        accumulator(positiones)
+    np.testing.assert_array_equal(accumulator.snapshot()[0, :2], [1.0, 1.0])
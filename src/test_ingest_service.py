@@ -0,0 +1,153 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+import yaml
+
+import ingest_service
+import meta_serializer
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_params():
+    with open(os.path.join(ROOT_DIR, 'config', 'local_default_param.yaml'),
+              'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+def _make_service(tmp_path, **config):
+    # servers are not started unless a test sets their port
+    settings = {
+        'tcp_port': -1, 'http_port': -1, 'publish_port': -1,
+        'result_file': str(tmp_path / 'results.jsonl')}
+    settings.update(config)
+    return ingest_service.IngestService(settings, _load_params())
+
+
+def _payload():
+    return meta_serializer.MetaSerializer().serialize_arrays(
+        [[700, 500, 760, 700]], [0.9], [0])
+
+
+def _read_results(tmp_path):
+    with open(tmp_path / 'results.jsonl', 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+async def _submit_all(service, messages):
+    # no other task runs between submits unless the queue blocks
+    await service.start()
+    accepted = [await service.submit(device_id, payload, {'sequence': sequence})
+                for sequence, (device_id, payload) in enumerate(messages)]
+    await service.close()
+    return accepted
+
+
+def test_drop_oldest(tmp_path):
+    service = _make_service(tmp_path, queue_size=2, overflow='drop_oldest')
+    accepted = asyncio.run(_submit_all(service, [('camera', _payload())] * 5))
+    assert accepted == [True] * 5
+    assert [result['sequence'] for result in _read_results(tmp_path)] == [3, 4]
+    stats = service.stats()
+    assert (stats['received'], stats['processed'], stats['dropped']) == (5, 2, 3)
+
+
+def test_reject(tmp_path):
+    service = _make_service(tmp_path, queue_size=2, overflow='reject')
+    accepted = asyncio.run(_submit_all(service, [('camera', _payload())] * 5))
+    assert accepted == [True, True, False, False, False]
+    assert [result['sequence'] for result in _read_results(tmp_path)] == [0, 1]
+    stats = service.stats()
+    assert (stats['received'], stats['processed'], stats['rejected']) == (5, 2, 3)
+
+
+def test_block(tmp_path):
+    service = _make_service(tmp_path, queue_size=2, overflow='block')
+    accepted = asyncio.run(_submit_all(service, [('camera', _payload())] * 5))
+    assert accepted == [True] * 5
+    assert [result['sequence'] for result in _read_results(tmp_path)] == [0, 1, 2, 3, 4]
+    stats = service.stats()
+    assert (stats['processed'], stats['dropped'], stats['rejected']) == (5, 0, 0)
+
+
+def test_devices_are_counted_separately(tmp_path):
+    async def run():
+        await service.start()
+        accepted = []
+        for device_id, payload in [
+                ('camera1', _payload()), ('camera2', _payload()),
+                ('camera3', _payload()), ('camera1', b'broken')]:
+            accepted.append(await service.submit(device_id, payload))
+            # devices are known when their first message is counted
+            while service.stats()['queued'] > 0:
+                await asyncio.sleep(0.01)
+        await service.close()
+        return accepted
+
+    service = _make_service(tmp_path, max_devices=2)
+    assert asyncio.run(run()) == [True, True, False, True]
+    results = _read_results(tmp_path)
+    assert [result['device_id'] for result in results] == ['camera1', 'camera2']
+    assert results[0]['count'] == results[1]['count']
+    stats = service.stats()
+    assert (stats['devices'], stats['rejected'], stats['errors']) == (2, 1, 1)
+
+
+def test_tcp_and_subscriber(tmp_path):
+    async def run():
+        service = _make_service(tmp_path, tcp_port=0, publish_port=0)
+        await service.start()
+        ports = service.ports
+        subscriber_reader, subscriber_writer = await asyncio.open_connection(
+            '127.0.0.1', ports['publish'])
+        # the subscriber is registered when its connection is handled
+        while len(service.stats()['sinks']) < 2:
+            await asyncio.sleep(0.01)
+
+        _, sender = await asyncio.open_connection('127.0.0.1', ports['tcp'])
+        for sequence in range(3):
+            sender.write(ingest_service.encode_message(
+                {'device_id': 'camera', 'timestamp': '20230101000000000',
+                 'sequence': sequence}, _payload()))
+        await sender.drain()
+        lines = [json.loads(await asyncio.wait_for(subscriber_reader.readline(), 5))
+                 for _ in range(3)]
+
+        # connections end before the service
+        sender.close()
+        subscriber_writer.close()
+        while len(service.stats()['sinks']) > 1:
+            await asyncio.sleep(0.01)
+        await service.close()
+        return lines
+
+    lines = asyncio.run(run())
+    assert [line['sequence'] for line in lines] == [0, 1, 2]
+    assert lines[0]['timestamp'] == '20230101000000000'
+    assert _read_results(tmp_path) == lines
+
+
+def test_invalid_parameter():
+    with pytest.raises(ValueError):
+        ingest_service.IngestService({'overflow': 'wait'}, _load_params())
+    with pytest.raises(ValueError):
+        ingest_service.IngestService({'queue_size': 0}, _load_params())
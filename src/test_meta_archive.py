@@ -0,0 +1,105 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+
+import pytest
+
+import meta_archive
+
+
+def _records(frames):
+    return [(frame, f'meta {frame}'.encode('ascii') * (frame % 5 + 1)) for frame in frames]
+
+
+def _read_all(archive_file):
+    # records are copied, so that the map can be closed
+    archive = meta_archive.MetaArchive(archive_file)
+    frames = archive.frames.tolist()
+    records = [bytes(record) for record in archive.read()]
+    timestamps = archive.timestamps()
+    archive.close()
+    return frames, records, timestamps
+
+
+def test_append_and_reopen(tmp_path):
+    archive_file = str(tmp_path / 'meta.fba')
+    with meta_archive.MetaArchiveWriter(archive_file) as writer:
+        for frame, record in _records(range(0, 10)):
+            writer.append(frame, record, f'2023010100000{frame}')
+
+    # reopened archive is appended to
+    with meta_archive.MetaArchiveWriter(archive_file) as writer:
+        assert len(writer) == 10
+        for frame, record in _records(range(10, 15)):
+            writer.append(frame, record)
+
+    frames, records, timestamps = _read_all(archive_file)
+    assert frames == list(range(15))
+    assert records == [record for _, record in _records(range(15))]
+    assert timestamps[:2] == ['20230101000000', '20230101000001']
+    assert timestamps[10:] == [''] * 5
+
+
+def test_interrupted_append_is_dropped(tmp_path):
+    archive_file = str(tmp_path / 'meta.fba')
+    with meta_archive.MetaArchiveWriter(archive_file) as writer:
+        for frame, record in _records(range(3)):
+            writer.append(frame, record)
+    # record written after the last flush of the index
+    with open(archive_file, 'ab') as file:
+        file.write(b'\x10\x00\x00\x00partial')
+
+    with meta_archive.MetaArchiveWriter(archive_file) as writer:
+        writer.append(3, b'next')
+
+    frames, records, _ = _read_all(archive_file)
+    assert frames == [0, 1, 2, 3]
+    assert records[-1] == b'next'
+
+
+def test_missing_index_is_not_truncated(tmp_path):
+    archive_file = str(tmp_path / 'meta.fba')
+    with meta_archive.MetaArchiveWriter(archive_file) as writer:
+        writer.append(0, b'record')
+    size = os.path.getsize(archive_file)
+    os.remove(meta_archive.get_index_file(archive_file))
+
+    with pytest.raises(ValueError):
+        meta_archive.MetaArchiveWriter(archive_file)
+    assert os.path.getsize(archive_file) == size
+
+
+def test_frames_must_increase(tmp_path):
+    with meta_archive.MetaArchiveWriter(str(tmp_path / 'meta.fba')) as writer:
+        writer.append(5, b'record')
+        with pytest.raises(ValueError):
+            writer.append(5, b'record')
+
+
+def test_frame_range(tmp_path):
+    archive_file = str(tmp_path / 'meta.fba')
+    with meta_archive.MetaArchiveWriter(archive_file) as writer:
+        for frame in range(0, 20, 2):
+            writer.append(frame, b'record')
+
+    archive = meta_archive.MetaArchive(archive_file)
+    try:
+        assert archive.frame_range() == (0, 10)
+        assert archive.frame_range(3, 9) == (2, 5)
+        assert archive.frame_range(30) == (10, 10)
+    finally:
+        archive.close()
@@ -0,0 +1,88 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+import pytest
+
+import meta_serializer
+import object_detection_processor
+
+
+def _decode(serialize_meta):
+    return object_detection_processor.ObjectDetectionProcessor.deserialize_meta_data(
+        None, serialize_meta)
+
+
+def _make_frame(random, box_num):
+    left_top = random.integers(0, 1800, size=(box_num, 2))
+    size = random.integers(1, 200, size=(box_num, 2))
+    bboxes = np.concatenate([left_top, left_top + size], axis=1)
+    scores = random.random(box_num).astype(np.float32)
+    class_ids = random.integers(0, 6, size=box_num)
+    return bboxes, scores, class_ids
+
+
+@pytest.mark.skipif(not meta_serializer.BULK_SUPPORTED,
+                    reason='bulk writing is not supported with this flatbuffers')
+def test_bulk_matches_generated_builders():
+    random = np.random.default_rng(0)
+    # one builder reused for frames of growing and shrinking sizes
+    serializer = meta_serializer.MetaSerializer(initial_size=64)
+    for box_num in [0, 1, 5, 300, 2, 0, 40]:
+        frame = _make_frame(random, box_num)
+        expected = _decode(meta_serializer.serialize_generated(*frame))
+        assert len(expected) == box_num
+        assert _decode(serializer.serialize_arrays(*frame)) == expected
+
+
+@pytest.mark.skipif(not meta_serializer.BULK_SUPPORTED,
+                    reason='bulk writing is not supported with this flatbuffers')
+def test_compact_matches_generated_builders():
+    random = np.random.default_rng(1)
+    serializer = meta_serializer.MetaSerializer('compact', initial_size=64)
+    for box_num in [0, 3, 100, 1]:
+        frame = _make_frame(random, box_num)
+        assert _decode(serializer.serialize_arrays(*frame)) \
+            == _decode(meta_serializer.serialize_generated(*frame))
+
+
+def test_generated_builders_without_bulk():
+    random = np.random.default_rng(2)
+    serializer = meta_serializer.MetaSerializer(bulk=False)
+    frame = _make_frame(random, 10)
+    assert serializer.serialize_arrays(*frame) == meta_serializer.serialize_generated(*frame)
+
+    with pytest.raises(RuntimeError):
+        meta_serializer.MetaSerializer('compact', bulk=False)
+
+
+def test_dict_round_trip(tmp_path):
+    dict_meta = {'perception': {'object_detection_list': [
+        {'class_id': 0, 'score': 0.5,
+         'bounding_box': {'left': 1, 'top': 2, 'right': 30, 'bottom': 40}},
+        {'class_id': 3, 'score': 0.75,
+         'bounding_box': {'left': 100, 'top': 200, 'right': 300, 'bottom': 400}}
+    ]}}
+    output_file = tmp_path / 'meta.bin'
+    with open(output_file, 'wb') as file:
+        for _ in range(3):
+            meta_serializer.write_record(file, meta_serializer.MetaSerializer()(dict_meta))
+
+    records = list(meta_serializer.read_records(output_file))
+    assert len(records) == 3
+    # detections are stored last first, as LocalDataLoader has always done
+    assert _decode(records[2]) == [
+        [[100, 200, 300, 400], 0.75, 3], [[1, 2, 30, 40], 0.5, 0]]
@@ -0,0 +1,140 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import math
+
+import numpy as np
+import pytest
+
+import occupancy
+import timestamp_util
+
+
+def _nearest_rank(values, percent):
+    rank = max(1, math.ceil(percent / 100.0 * len(values)))
+    return sorted(values)[rank - 1]
+
+
+@pytest.mark.parametrize('size', [1, 5, 64])
+def test_rolling_window_matches_recomputation(size):
+    random = np.random.default_rng(size)
+    window = occupancy.RollingWindow(size)
+    values = []
+    for value in random.integers(0, 12, size=300).tolist():
+        window.push(value)
+        values = (values + [value])[-size:]
+        assert len(window) == len(values)
+        assert window.mean() == pytest.approx(np.mean(values))
+        assert window.max() == max(values)
+        for percent in [0, 1, 50, 90, 99, 100]:
+            assert window.percentile(percent) == _nearest_rank(values, percent)
+
+
+def test_empty_rolling_window():
+    window = occupancy.RollingWindow(10)
+    assert (window.mean(), window.max(), window.percentile(50)) == (0.0, 0, 0)
+
+
+def test_rolling_window_state():
+    window = occupancy.RollingWindow(4)
+    for value in [3, 1, 4, 1, 5, 9]:
+        window.push(value)
+    restored = occupancy.RollingWindow(4)
+    restored.set_state(window.get_state())
+    for value in [2, 6]:
+        window.push(value)
+        restored.push(value)
+    assert restored.get_state() == window.get_state() == [5, 9, 2, 6]
+    assert restored.max() == window.max() == 9
+
+
+def test_invalid_rolling_window():
+    with pytest.raises(ValueError):
+        occupancy.RollingWindow(0)
+    with pytest.raises(ValueError):
+        occupancy.RollingWindow(4).push(-1)
+
+
+def test_interval_summary(tmp_path):
+    output_file = tmp_path / 'occupancy' / 'occupancy.jsonl'
+    aggregator = occupancy.OccupancyAggregator({
+        'window_frames': 3, 'interval_frames': 4, 'percentiles': [50],
+        'output_file': str(output_file)}, 2)
+    summaries = [aggregator(count) for count in [[0, 1], [2, 1], [4, 1], [0, 3], [1]]]
+    assert summaries[:3] == [None] * 3
+    assert summaries[3] == {
+        'start': 0, 'end': 3,
+        'areas': [
+            {'frames': 4, 'min': 0, 'max': 4, 'mean': 1.5, 'occupied_ratio': 0.5,
+             'person_frames': 6,
+             'rolling': {'frames': 3, 'mean': 2.0, 'max': 4, 'p50': 2}},
+            {'frames': 4, 'min': 1, 'max': 3, 'mean': 1.5, 'occupied_ratio': 1.0,
+             'person_frames': 6,
+             'rolling': {'frames': 3, 'mean': pytest.approx(5 / 3), 'max': 3, 'p50': 1}}
+        ]}
+    # a missing area counts 0
+    assert summaries[4] is None
+    last = aggregator.flush()
+    assert (last['start'], last['end']) == (4, 4)
+    assert last['areas'][1]['max'] == 0
+    assert aggregator.flush() is None
+
+    with open(output_file, 'r', encoding='utf-8') as file:
+        assert len([json.loads(line) for line in file]) == 2
+
+
+def test_timestamps_of_interval():
+    aggregator = occupancy.OccupancyAggregator({'interval_frames': 2}, 1)
+    aggregator([1], timestamp_util.parse('20230101000000000'))
+    summary = aggregator([1], timestamp_util.parse('20230101000000033'))
+    assert (summary['start'], summary['end']) == ('20230101000000000', '20230101000000033')
+
+
+def test_resume_from_state(tmp_path):
+    config = {'window_frames': 5, 'interval_frames': 3,
+              'output_file': str(tmp_path / 'occupancy.jsonl')}
+    counts = [[value % 4, value % 3] for value in range(20)]
+
+    aggregator = occupancy.OccupancyAggregator(config, 2)
+    summaries = []
+    for count in counts[:10]:
+        summaries.append(aggregator(count))
+    state = json.loads(json.dumps(aggregator.get_state()))
+    # frames after the checkpoint are processed again after resume
+    for count in counts[10:13]:
+        aggregator(count)
+
+    restored = occupancy.OccupancyAggregator(config, 2)
+    restored.set_state(state)
+    for count in counts[10:]:
+        summaries.append(restored(count))
+    summaries.append(restored.flush())
+
+    expected_aggregator = occupancy.OccupancyAggregator(
+        {'window_frames': 5, 'interval_frames': 3}, 2)
+    expected = [expected_aggregator(count) for count in counts] + [expected_aggregator.flush()]
+    assert summaries == expected
+    with open(tmp_path / 'occupancy.jsonl', 'r', encoding='utf-8') as file:
+        assert [json.loads(line) for line in file] \
+            == [summary for summary in expected if summary is not None]
+
+
+def test_invalid_parameter():
+    with pytest.raises(ValueError):
+        occupancy.OccupancyAggregator({'interval_frames': 0}, 1)
+    with pytest.raises(ValueError):
+        occupancy.OccupancyAggregator({'percentiles': [101]}, 1)
@@ -0,0 +1,101 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+
+import numpy as np
+
+import result_store
+
+
+AREA_NUM = 3
+FRAME_NUM = 150
+
+
+def _make_store(store_dir):
+    return result_store.ResultStore(
+        {'store_dir': str(store_dir), 'segment_frames': 25, 'frame_interval_ms': 1000},
+        AREA_NUM)
+
+
+def _count(frame):
+    # the last area is not defined in some frames
+    count = [frame % 7, frame % 3, frame % 11]
+    return count if frame % 4 else count[:2]
+
+
+def _append(store, frames):
+    for frame in frames:
+        store.append(None, _count(frame), frame)
+
+
+def _segment_files(store_dir):
+    return sorted(name for name in os.listdir(store_dir) if name.startswith('segment_'))
+
+
+def _assert_same_store(expected, actual):
+    for area in range(AREA_NUM):
+        expected_timestamps, expected_counts = expected.query(area, 0, FRAME_NUM * 1000)
+        timestamps, counts = actual.query(area, 0, FRAME_NUM * 1000)
+        np.testing.assert_array_equal(timestamps, expected_timestamps)
+        np.testing.assert_array_equal(counts, expected_counts)
+        assert actual.summary(area, 0, FRAME_NUM * 1000) \
+            == expected.summary(area, 0, FRAME_NUM * 1000)
+
+
+def test_resume_from_checkpoint(tmp_path):
+    expected = _make_store(tmp_path / 'expected')
+    _append(expected, range(FRAME_NUM))
+    expected.close()
+
+    # checkpoint in the middle of a segment, then rows are written until a crash
+    store = _make_store(tmp_path / 'resumed')
+    _append(store, range(70))
+    state = json.loads(json.dumps(store.get_state()))
+    _append(store, range(70, 110))
+
+    resumed = _make_store(tmp_path / 'resumed')
+    resumed.set_state(state)
+    _append(resumed, range(70, FRAME_NUM))
+    resumed.close()
+
+    # checkpoints do not cut segments short
+    assert _segment_files(tmp_path / 'resumed') == _segment_files(tmp_path / 'expected')
+    assert len(resumed) == FRAME_NUM
+    _assert_same_store(expected, resumed)
+
+
+def test_timestamps_of_frames(tmp_path):
+    store = _make_store(tmp_path)
+    store.append(None, [1], 10)
+    store.append(None, [2], 12)
+    store.close()
+    timestamps, counts = store.query(0, 0, 100000)
+    np.testing.assert_array_equal(timestamps, [10000, 12000])
+    np.testing.assert_array_equal(counts, [1, 2])
+
+
+def test_clear(tmp_path):
+    store = _make_store(tmp_path)
+    _append(store, range(60))
+    store.clear()
+    assert len(store) == 0
+    assert _segment_files(tmp_path) == []
+
+    _append(store, range(10))
+    store.close()
+    assert len(_make_store(tmp_path)) == 10
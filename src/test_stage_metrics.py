@@ -0,0 +1,132 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import socket
+import urllib.request
+
+import pytest
+
+import stage_metrics
+
+
+def test_histogram_statistics():
+    histogram = stage_metrics.LatencyHistogram()
+    for value in [0.001] * 90 + [0.1] * 10:
+        histogram.observe(value)
+    stats = histogram.to_dict()
+    assert stats['count'] == 100
+    assert stats['min'] == 0.001
+    assert stats['max'] == 0.1
+    assert stats['mean'] == pytest.approx(0.0109)
+    assert sum(stats['buckets']) == 100
+    # percentiles are the upper bound of the bucket, capped by the maximum
+    assert 0.001 <= stats['p50'] < 0.002
+    assert 0.001 <= stats['p90'] < 0.002
+    assert stats['p99'] == 0.1
+
+
+def test_empty_histogram():
+    stats = stage_metrics.LatencyHistogram().to_dict()
+    assert stats['count'] == 0
+    assert stats['mean'] == 0.0
+    assert stats['p99'] == 0.0
+
+
+def test_value_over_last_bound():
+    histogram = stage_metrics.LatencyHistogram()
+    histogram.observe(100.0)
+    assert histogram.buckets[-1] == 1
+    assert histogram.percentile(0.5) == 100.0
+
+
+def test_counters_and_stages():
+    metrics = stage_metrics.StageMetrics()
+    metrics.increment('frames')
+    metrics.increment('frames', 4)
+    metrics.increment('dropped')
+    with metrics.measure('detect'):
+        pass
+    metrics.observe('detect', 0.01)
+    metrics_dict = metrics.to_dict()
+    assert metrics_dict['counters'] == {'frames': 5, 'dropped': 1}
+    assert metrics_dict['stages']['detect']['count'] == 2
+    assert 'frames' in metrics.summary()
+
+
+def test_null_metrics_records_nothing():
+    metrics = stage_metrics.NullMetrics()
+    metrics.increment('frames')
+    metrics.observe('detect', 0.01)
+    with metrics.measure('detect'):
+        pass
+    metrics_dict = metrics.to_dict()
+    assert metrics_dict['counters'] == {}
+    assert metrics_dict['stages'] == {}
+
+
+def test_report_if_due():
+    lines = []
+    stage_metrics.StageMetrics().report_if_due(lines.append)
+    assert lines == []
+    stage_metrics.StageMetrics({'summary_interval': 1e-9}).report_if_due(lines.append)
+    assert len(lines) == 1
+
+    with pytest.raises(ValueError):
+        stage_metrics.StageMetrics({'summary_interval': -1})
+
+
+def test_dump(tmp_path):
+    dump_file = tmp_path / 'metrics' / 'metrics.json'
+    metrics = stage_metrics.StageMetrics({'dump_file': str(dump_file)})
+    metrics.increment('frames', 3)
+    metrics.observe('detect', 0.5)
+    metrics.close()
+    with open(dump_file, encoding='utf-8') as file:
+        metrics_dict = json.load(file)
+    assert metrics_dict['counters'] == {'frames': 3}
+    assert metrics_dict['stages']['detect']['max'] == 0.5
+
+
+def test_prometheus_text():
+    metrics = stage_metrics.StageMetrics()
+    metrics.observe('detect', 0.5)
+    metrics.observe('detect', 100.0)
+    metrics.increment('frames', 2)
+    lines = metrics.to_prometheus().splitlines()
+    buckets = [line for line in lines if line.startswith('crowd_count_stage_seconds_bucket')]
+    assert len(buckets) == len(stage_metrics.LatencyHistogram.BUCKET_BOUNDS) + 1
+    # buckets are cumulative
+    counts = [int(line.split()[-1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1] == 'crowd_count_stage_seconds_bucket{stage="detect",le="+Inf"} 2'
+    assert 'crowd_count_stage_seconds_count{stage="detect"} 2' in lines
+    assert 'crowd_count_events_total{name="frames"} 2' in lines
+
+
+def test_http_server():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    metrics = stage_metrics.StageMetrics({'http_port': port})
+    metrics.increment('frames')
+    metrics.start_http_server()
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+            body = response.read().decode('utf-8')
+    finally:
+        metrics.close()
+    assert 'crowd_count_events_total{name="frames"} 1' in body
@@ -0,0 +1,64 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+import pytest
+
+import timestamp_util
+
+
+def test_parse_and_format():
+    timestamp = timestamp_util.parse('20230102030405678')
+    assert timestamp == 1672628645678
+    assert timestamp_util.to_string(timestamp) == '20230102030405678'
+    assert timestamp_util.to_display(timestamp) == '2023-01-02 03:04:05'
+
+
+def test_short_timestamps_keep_their_length():
+    timestamps = ['20240229235959', '20240301000000']
+    parsed = timestamp_util.parse_array(timestamps)
+    np.testing.assert_array_equal(parsed % 1000, [0, 0])
+    length = timestamp_util.get_length(timestamps)
+    assert length == timestamp_util.SHORT_TIMESTAMP_LENGTH
+    assert [timestamp_util.to_string(value, length) for value in parsed] == timestamps
+
+
+def test_length_of_mixed_or_empty_timestamps():
+    assert timestamp_util.get_length(['20230101000000', '20230101000000123']) \
+        == timestamp_util.TIMESTAMP_LENGTH
+    assert timestamp_util.get_length([]) == timestamp_util.TIMESTAMP_LENGTH
+
+
+def test_parse_array_is_the_same_as_datetime():
+    random = np.random.default_rng(0)
+    values = random.integers(0, 4102444800000, size=1000)
+    strings = [timestamp_util.to_string(value) for value in values]
+    np.testing.assert_array_equal(timestamp_util.parse_array(strings), values)
+
+
+@pytest.mark.parametrize('timestamp', [
+    '2023010203040', '202301020304056789', '20230230000000', '20231301000000',
+    '20230101240000', '2023010100000a', '２０２３0101000000'])
+def test_invalid_timestamps(timestamp):
+    with pytest.raises(ValueError):
+        timestamp_util.parse_array(['20230101000000', timestamp])
+
+
+def test_match_finds_first_position():
+    timestamps = np.array([30, 10, 20, 10], dtype=np.int64)
+    np.testing.assert_array_equal(
+        timestamp_util.match(timestamps, [10, 20, 40, 30]), [1, 2, -1, 0])
+    np.testing.assert_array_equal(timestamp_util.match([], [10]), [-1])
@@ -0,0 +1,182 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+import pytest
+
+import tracker
+
+
+def _boxes(points, size=40):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.concatenate(
+        [points - [size / 2, size], points + [size / 2, 0]], axis=1).tolist()
+
+
+def _track(people_tracker, points):
+    return people_tracker(_boxes(points), points)
+
+
+def _greedy_ids(previous_ids, previous_points, points, max_distance, next_id):
+    # reference: all pairs sorted by distance, taken while both are free
+    pairs = []
+    for track, previous in enumerate(previous_points):
+        for detection, point in enumerate(points):
+            distance = np.hypot(*(np.asarray(previous) - point))
+            if distance <= max_distance:
+                pairs.append((distance, track, detection))
+    ids = [-1] * len(points)
+    used = set()
+    for _, track, detection in sorted(pairs):
+        if track not in used and ids[detection] < 0:
+            used.add(track)
+            ids[detection] = previous_ids[track]
+    for detection, track_id in enumerate(ids):
+        if track_id < 0:
+            ids[detection] = next_id
+            next_id += 1
+    return ids
+
+
+def test_ids_follow_moving_people():
+    people_tracker = tracker.Tracker({'max_distance': 50})
+    ids, _ = _track(people_tracker, [[100, 100], [300, 100]])
+    assert ids == [0, 1]
+    ids, _ = _track(people_tracker, [[310, 110], [90, 95]])
+    assert ids == [1, 0]
+    # too far for the old track
+    ids, _ = _track(people_tracker, [[90, 95], [500, 500]])
+    assert ids == [0, 2]
+
+
+def test_association_matches_greedy_assignment():
+    random = np.random.default_rng(0)
+    max_distance = 60
+    people_tracker = tracker.Tracker({'max_distance': max_distance, 'max_missed': 0})
+    points = random.uniform(0, 1000, size=(200, 2))
+    ids, _ = _track(people_tracker, points)
+    for _ in range(10):
+        # people move and some leave and enter
+        moved = points + random.normal(0, 20, size=points.shape)
+        keep = random.random(len(moved)) > 0.1
+        entered = random.uniform(0, 1000, size=(20, 2))
+        new_points = np.concatenate([moved[keep], entered])
+        expected = _greedy_ids(ids, points, new_points, max_distance, max(ids) + 1)
+        ids, _ = _track(people_tracker, new_points)
+        assert ids == expected
+        points = new_points
+
+
+def test_iou_metric():
+    people_tracker = tracker.Tracker(
+        {'metric': 'iou', 'iou_threshold': 0.5, 'max_distance': 200})
+    people_tracker([[0, 0, 100, 100]], [[50, 100]])
+    ids, _ = people_tracker([[10, 0, 110, 100]], [[60, 100]])
+    assert ids == [0]
+    # near enough, but the boxes overlap too little
+    ids, _ = people_tracker([[70, 0, 170, 100]], [[120, 100]])
+    assert ids == [1]
+
+
+def test_box_iou():
+    iou = tracker.box_iou(
+        np.array([[0, 0, 10, 10], [0, 0, 10, 10], [0, 0, 0, 0]], dtype=np.float64),
+        np.array([[0, 0, 10, 10], [5, 0, 15, 10], [0, 0, 0, 0]], dtype=np.float64))
+    np.testing.assert_allclose(iou, [1.0, 1 / 3, 0.0])
+
+
+def test_lost_tracks_are_dropped():
+    people_tracker = tracker.Tracker({'max_distance': 50, 'max_missed': 2})
+    _track(people_tracker, [[100, 100]])
+    _track(people_tracker, [])
+    _track(people_tracker, [])
+    ids, _ = _track(people_tracker, [[100, 100]])
+    assert ids == [0]
+    for _ in range(3):
+        _track(people_tracker, [])
+    ids, _ = _track(people_tracker, [[100, 100]])
+    assert ids == [1]
+
+
+@pytest.mark.parametrize('path, expected', [
+    # the line is drawn downwards, so its right side on the image is the left
+    ([[600, 500], [400, 500]], {'in': 1, 'out': 0}),
+    ([[400, 500], [600, 500]], {'in': 0, 'out': 1}),
+    ([[600, 500], [400, 500], [600, 500]], {'in': 1, 'out': 1}),
+    # beyond the end of the line
+    ([[600, 1200], [400, 1200]], {'in': 0, 'out': 0}),
+    ([[600, 500], [550, 500]], {'in': 0, 'out': 0}),
+])
+def test_line_crossing(path, expected):
+    people_tracker = tracker.Tracker({
+        'max_distance': 300, 'lines': [[[500, 0], [500, 1000]], [[0, 0], [1000, 0]]]})
+    for point in path:
+        _, line_count = _track(people_tracker, [point])
+    assert line_count == [expected, {'in': 0, 'out': 0}]
+
+
+def test_frame_step():
+    people_tracker = tracker.Tracker({'max_distance': 100, 'max_missed': 5})
+    _track(people_tracker, [[100, 100]])
+    ids, _ = _track(people_tracker, [[300, 100]])
+    assert ids == [1]
+
+    # people move frame_step times as far between tracked frames
+    people_tracker.set_frame_step(4)
+    ids, _ = _track(people_tracker, [[600, 100]])
+    assert ids == [1]
+
+    # missed frames are counted in input frames, 2 tracked frames are 8 input frames
+    _track(people_tracker, [])
+    _track(people_tracker, [])
+    ids, _ = _track(people_tracker, [[600, 100]])
+    assert ids == [2]
+
+
+def test_resume_from_state():
+    config = {'max_distance': 80, 'lines': [[[500, 0], [500, 1000]]]}
+    random = np.random.default_rng(1)
+    frames = []
+    points = random.uniform(0, 1000, size=(30, 2))
+    for _ in range(12):
+        points = points + random.normal(0, 15, size=points.shape)
+        frames.append(points)
+
+    people_tracker = tracker.Tracker(config)
+    results = [_track(people_tracker, frame) for frame in frames]
+
+    people_tracker = tracker.Tracker(config)
+    for frame in frames[:6]:
+        _track(people_tracker, frame)
+    restored = tracker.Tracker(config)
+    restored.set_state(people_tracker.get_state())
+    assert [_track(restored, frame) for frame in frames[6:]] == results[6:]
+
+    with pytest.raises(ValueError):
+        tracker.Tracker({}).set_state(people_tracker.get_state())
+
+
+@pytest.mark.parametrize('config', [
+    {'max_distance': 0},
+    {'metric': 'cosine'},
+    {'iou_threshold': 1.5},
+    {'max_missed': -1},
+    {'lines': [[[0, 0], [0, 0]]]},
+    {'lines': [[0, 0, 1]]},
+])
+def test_invalid_parameter(config):
+    with pytest.raises(ValueError):
+        tracker.Tracker(config)
@@ -0,0 +1,105 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+import pytest
+
+import zone_config
+
+
+MAX_AREA_NUM = 4
+MAX_POINT_NUM = 16
+
+SQUARE = [[100, 100], [200, 100], [200, 200], [100, 200]]
+
+
+def _make_config(*polygons):
+    return {
+        'remove_low_conf': {'min_detect_score': 0.0, 'max_height': 1080, 'min_height': 0},
+        'bbox2point': {'bbox_to_point_ratio': 1.0},
+        'inpolygon': {
+            'area_num': len(polygons),
+            'area_point_len': [len(polygon) for polygon in polygons],
+            'area_point': [list(polygon) for polygon in polygons]
+        },
+        'stabilizer': {'iir_up_ratio': 0.2, 'iir_down_ratio': 0.9}
+    }
+
+
+def _compile(*polygons):
+    return zone_config.CompiledZoneConfig(
+        _make_config(*polygons), MAX_AREA_NUM, MAX_POINT_NUM)
+
+
+def _signed_area(polygon):
+    x = polygon[:, 0]
+    y = polygon[:, 1]
+    return float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y))
+
+
+def test_valid_polygons():
+    compiled = _compile(SQUARE, [[300, 300], [500, 300], [400, 450]])
+    assert compiled.area_num == 2
+    assert len(compiled.area_polygons) == 2
+    np.testing.assert_array_equal(compiled.area_bbox[0], [100, 100, 200, 200])
+
+
+def test_orientation_is_normalized():
+    clockwise = _compile(SQUARE).area_polygons[0]
+    counterclockwise = _compile(SQUARE[::-1]).area_polygons[0]
+    assert np.sign(_signed_area(clockwise)) == np.sign(_signed_area(counterclockwise))
+
+
+def test_repeated_vertices_are_removed():
+    compiled = _compile([[100, 100], [200, 100], [200, 100], [200, 200], [100, 200]])
+    assert len(compiled.area_polygons[0]) == 4
+
+
+@pytest.mark.parametrize('polygon, message', [
+    ([[100, 100], [300, 200], [300, 100], [100, 250]], 'intersects itself'),
+    ([[100, 100], [200, 100], [200, 100], [100, 100]], '3 or more distinct vertices'),
+    ([[100, 100], [300, 100], [200, 100], [200, 200]], 'folds back on an edge'),
+    ([[100, 100], [150, 150], [200, 200], [120, 120]], 'no area'),
+    ([[float('nan'), 100], [200, 100], [200, 200], [100, 200]], 'must be finite'),
+    ([[float('inf'), 100], [200, 100], [200, 200], [100, 200]], 'must be finite'),
+])
+def test_invalid_polygon_names_the_area(polygon, message):
+    with pytest.raises(RuntimeError, match=f'area 2: .*{message}'):
+        _compile(SQUARE, polygon)
+
+
+def test_negative_coordinates_are_accepted():
+    compiled = _compile([[-50, -50], [200, -50], [200, 200], [-50, 200]])
+    np.testing.assert_array_equal(compiled.area_bbox[0], [-50, -50, 200, 200])
+
+
+def test_too_many_areas():
+    with pytest.raises(RuntimeError):
+        _compile(*([SQUARE] * (MAX_AREA_NUM + 1)))
+
+
+def test_compiled_config_is_immutable():
+    compiled = _compile(SQUARE)
+    with pytest.raises(AttributeError):
+        compiled.area_num = 2
+    with pytest.raises(ValueError):
+        compiled.area_polygons[0][0, 0] = 0
+
+
+def test_changed_areas():
+    previous = _compile(SQUARE, [[300, 300], [500, 300], [400, 450]])
+    compiled = _compile(SQUARE, [[300, 300], [500, 300], [400, 460]], SQUARE)
+    assert compiled.changed_areas(previous) == {1, 2}
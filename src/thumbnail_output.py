@@ -0,0 +1,251 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+
+import output
+import stage_metrics
+import timestamp_util
+
+class ThumbnailOutput(output.Output) :
+    """write small annotated JPEG images at an interval
+
+    The frame is downscaled once and the overlay is drawn at thumbnail
+    size, so the cost does not depend on the input resolution. Frames
+    between intervals are not touched. The last thumbnail is kept in
+    memory and can be served on http://127.0.0.1:<http_port>/latest.jpg.
+
+    Args:
+        Output (class): Output interface class
+    """
+
+    def __init__(self, config, image_info, param_info, metrics=None):
+        # Init
+        self._frame = 0
+        self._timestamp_length = timestamp_util.TIMESTAMP_LENGTH
+        self._latest = None
+        self._lock = threading.Lock()
+        self._http_server = None
+        self._metrics = stage_metrics.NULL_METRICS
+        if metrics is not None:
+            self._metrics = metrics
+
+        # Get parameter from config
+        self._output_dir = config.get('output_dir', 'output/thumbnail')
+        self._width = config.get('width', 320)
+        self._height = config.get('height', 180)
+        self._interval_frames = config.get('interval_frames', 30)
+        self._jpeg_quality = config.get('jpeg_quality', 80)
+        self._keep_files = config.get('keep_files', True)
+        self._http_port = config.get('http_port', 0)
+
+        # Check parameter
+        if self._width < 1 or self._height < 1:
+            raise ValueError('width and height must be 1 or more')
+        if self._interval_frames < 1:
+            raise ValueError('interval_frames must be 1 or more')
+        if not 0 <= self._jpeg_quality <= 100:
+            raise ValueError('jpeg_quality must be set in the range of 0 to 100')
+
+        self._output_name = image_info['image_name'] or 'thumbnail'
+        self._areas = []
+        self.update_param_info(param_info)
+        if self._output_dir:
+            os.makedirs(self._output_dir, exist_ok=True)
+        if self._http_port:
+            self._start_http_server()
+
+    def __del__(self):
+        self.close()
+
+    def update_param_info(self, param_info):
+        """update area parameter used for overlay
+
+        Args:
+            param_info (dict): inpolygon parameter
+        """
+        self._areas = [
+            np.asarray(polygon[:point_len], dtype=np.float64)
+            for polygon, point_len in zip(
+                param_info['area_point'][:param_info['area_num']],
+                param_info['area_point_len'])]
+
+    def __call__(self, dict_meta, image=None, timestamp=None, frame=None):
+        """write thumbnail if the interval has passed
+
+        Args:
+            dict_meta (dict): meta data
+            image (numpy.ndarray, optional): image data. Defaults to None.
+            timestamp (int, optional): timestamp in epoch milliseconds. Defaults to None.
+            frame (int, optional): frame index in the input, used in the name
+                and info of the thumbnail. Defaults to None (number of calls).
+        """
+        count = self._frame
+        self._frame += 1
+        if frame is None:
+            frame = count
+        if image is None or count % self._interval_frames != 0:
+            return
+
+        with self._metrics.measure('thumbnail'):
+            thumbnail = self._render(dict_meta, image, timestamp)
+            import cv2
+            ok, jpeg = cv2.imencode(
+                '.jpg', thumbnail, [cv2.IMWRITE_JPEG_QUALITY, self._jpeg_quality])
+            if not ok:
+                raise RuntimeError('cannot encode thumbnail')
+            jpeg = jpeg.tobytes()
+            info = {
+                'frame': frame,
+                'timestamp': timestamp_util.to_string(timestamp, self._timestamp_length)
+                    if timestamp is not None else None,
+                'count': dict_meta['count']}
+            with self._lock:
+                self._latest = (jpeg, info)
+            if self._output_dir:
+                self._write_files(jpeg, info)
+
+    def set_timestamp_length(self, length):
+        """set length of timestamp strings in names and info of thumbnails
+
+        Args:
+            length (int): length of timestamp strings of the input
+        """
+        self._timestamp_length = length
+
+    def latest(self):
+        """get the last thumbnail
+
+        Returns:
+            bytes: JPEG data, None before the first thumbnail
+            dict: frame, timestamp and count of the thumbnail
+        """
+        with self._lock:
+            if self._latest is None:
+                return None, None
+            return self._latest
+
+    def get_state(self):
+        """get thumbnail state for checkpoint
+
+        Returns:
+            dict: thumbnail state
+        """
+        return {'frame': self._frame}
+
+    def set_state(self, state):
+        """restore thumbnail state from checkpoint
+
+        Args:
+            state (dict): thumbnail state
+        """
+        self._frame = state['frame']
+
+    def close(self):
+        """stop http server
+
+        """
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+    def _write_files(self, jpeg, info):
+        if self._keep_files:
+            if info['timestamp'] is not None:
+                name = f"{self._output_name}_{info['timestamp']}"
+            else:
+                name = f"{self._output_name}_{info['frame']:08d}"
+            with open(os.path.join(self._output_dir, name + '.jpg'), 'wb') as file:
+                file.write(jpeg)
+
+        # latest.jpg is replaced atomically for viewers polling the directory
+        latest_file = os.path.join(self._output_dir, 'latest.jpg')
+        with open(latest_file + '.tmp', 'wb') as file:
+            file.write(jpeg)
+        os.replace(latest_file + '.tmp', latest_file)
+
+    def _render(self, dict_meta, image, timestamp):
+        # cv2 is only needed for thumbnails
+        import cv2
+
+        scale_x = self._width / image.shape[1]
+        scale_y = self._height / image.shape[0]
+        scale = np.array([scale_x, scale_y])
+        thumbnail = cv2.resize(
+            image, (self._width, self._height), interpolation=cv2.INTER_AREA)
+
+        polygons = [np.round(area * scale).astype(np.int32) for area in self._areas]
+        if polygons:
+            cv2.polylines(thumbnail, polygons, True, (0, 255, 0), 1)
+
+        if dict_meta['bboxes']:
+            boxes = np.array(
+                [[bbox['left'], bbox['top'], bbox['right'], bbox['bottom']]
+                 for bbox in dict_meta['bboxes']], dtype=np.float64)
+            boxes = np.round(boxes * np.tile(scale, 2)).astype(np.int32).tolist()
+            for left, top, right, bottom in boxes:
+                cv2.rectangle(thumbnail, (left, top), (right, bottom), (0, 0, 255), 1)
+
+        font_scale = min(self._width, self._height) * 0.002
+        line_height = max(8, int(self._height * 0.08))
+        for area, count in enumerate(dict_meta['count'][:len(self._areas)]):
+            cv2.putText(
+                thumbnail, f'area{area + 1}:{count}', (2, line_height * (area + 1)),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 225, 0), 1, cv2.LINE_AA)
+
+        if timestamp is not None:
+            cv2.putText(
+                thumbnail, timestamp_util.to_display(timestamp), (2, self._height - 4),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 225, 0), 1, cv2.LINE_AA)
+
+        return thumbnail
+
+    def _start_http_server(self):
+        # http.server is only needed for the preview endpoint
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        thumbnail_output = self
+
+        class _PreviewHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                jpeg, info = thumbnail_output.latest()
+                if self.path == '/latest.jpg' and jpeg is not None:
+                    body = jpeg
+                    content_type = 'image/jpeg'
+                elif self.path == '/latest.json' and info is not None:
+                    body = json.dumps(info).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer(
+            ('127.0.0.1', self._http_port), _PreviewHandler)
+        threading.Thread(
+            target=self._http_server.serve_forever, daemon=True).start()
@@ -0,0 +1,155 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import datetime
+import numpy as np
+
+# timestamps of Console are "yyyyMMddHHmmssfff" strings in UTC,
+# the application keeps them as int64 milliseconds since epoch
+TIMESTAMP_LENGTH = 17
+# "yyyyMMddHHmmss" without milliseconds
+SHORT_TIMESTAMP_LENGTH = 14
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+# positions of year, month, day, hour, minute, second and millisecond
+_FIELDS = ((0, 4), (4, 6), (6, 8), (8, 10), (10, 12), (12, 14), (14, 17))
+_DAYS_IN_MONTH = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def parse(timestamp):
+    """convert timestamp string of Console to epoch milliseconds
+
+    Args:
+        timestamp (str): timestamp in "yyyyMMddHHmmssfff" format (UTC),
+            milliseconds can be omitted
+
+    Returns:
+        int: milliseconds from 1970-01-01 00:00:00 UTC
+    """
+    return int(parse_array([timestamp])[0])
+
+
+def parse_array(timestamps):
+    """convert timestamp strings of Console to epoch milliseconds at once
+
+    Args:
+        timestamps (list): timestamps in "yyyyMMddHHmmssfff" format (UTC),
+            milliseconds can be omitted
+
+    Returns:
+        numpy.ndarray: int64 milliseconds from 1970-01-01 00:00:00 UTC
+    """
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=np.int64)
+    try:
+        text = np.array(timestamps, dtype=f'S{TIMESTAMP_LENGTH + 1}')
+    except UnicodeEncodeError as error:
+        raise ValueError('timestamp must be digits') from error
+    lengths = np.char.str_len(text)
+    invalid = ~np.isin(lengths, (SHORT_TIMESTAMP_LENGTH, TIMESTAMP_LENGTH))
+
+    # digits of each timestamp, omitted milliseconds are zero
+    digits = text.view(np.uint8).reshape(len(text), -1)[:, :TIMESTAMP_LENGTH].astype(np.int64)
+    digits[:, SHORT_TIMESTAMP_LENGTH:] = np.where(
+        lengths[:, None] == SHORT_TIMESTAMP_LENGTH, ord('0'), digits[:, SHORT_TIMESTAMP_LENGTH:])
+    digits -= ord('0')
+    invalid |= ((digits < 0) | (digits > 9)).any(axis=1)
+
+    year, month, day, hour, minute, second, millisecond = (
+        digits[:, first:last] @ (10 ** np.arange(last - first - 1, -1, -1))
+        for first, last in _FIELDS)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = _DAYS_IN_MONTH[np.clip(month, 0, 12)] - ((month == 2) & ~leap)
+    invalid |= (month < 1) | (month > 12) | (day < 1) | (day > month_days) \
+        | (hour > 23) | (minute > 59) | (second > 59)
+    if invalid.any():
+        raise ValueError(f'invalid timestamp {timestamps[int(np.argmax(invalid))]!r}')
+
+    # days from civil date (proleptic Gregorian calendar)
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+    return (((days * 24 + hour) * 60 + minute) * 60 + second) * 1000 + millisecond
+
+
+def get_length(timestamps):
+    """get length of timestamp strings to write them as they were read
+
+    Args:
+        timestamps (list): timestamp strings
+
+    Returns:
+        int: SHORT_TIMESTAMP_LENGTH if all timestamps omit milliseconds,
+            otherwise TIMESTAMP_LENGTH
+    """
+    if len(timestamps) > 0 \
+        and all(len(timestamp) == SHORT_TIMESTAMP_LENGTH for timestamp in timestamps):
+        return SHORT_TIMESTAMP_LENGTH
+    return TIMESTAMP_LENGTH
+
+
+def to_string(timestamp, length=TIMESTAMP_LENGTH):
+    """convert epoch milliseconds to timestamp string of Console
+
+    Args:
+        timestamp (int): milliseconds from 1970-01-01 00:00:00 UTC
+        length (int, optional): SHORT_TIMESTAMP_LENGTH to omit milliseconds.
+            Defaults to TIMESTAMP_LENGTH.
+
+    Returns:
+        str: timestamp in "yyyyMMddHHmmssfff" format (UTC)
+    """
+    date_time = _EPOCH + datetime.timedelta(milliseconds=int(timestamp))
+    if length == SHORT_TIMESTAMP_LENGTH:
+        return f'{date_time:%Y%m%d%H%M%S}'
+    return f'{date_time:%Y%m%d%H%M%S}{date_time.microsecond // 1000:03d}'
+
+
+def to_display(timestamp):
+    """convert epoch milliseconds to text drawn on images
+
+    Args:
+        timestamp (int): milliseconds from 1970-01-01 00:00:00 UTC
+
+    Returns:
+        str: "yyyy-MM-dd HH:mm:ss" (UTC)
+    """
+    date_time = _EPOCH + datetime.timedelta(milliseconds=int(timestamp))
+    return f'{date_time:%Y-%m-%d %H:%M:%S}'
+
+
+def match(timestamps, targets):
+    """find the first position of each target timestamp
+
+    Args:
+        timestamps (numpy.ndarray): timestamps to search in
+        targets (numpy.ndarray): timestamps to find
+
+    Returns:
+        numpy.ndarray: position in timestamps of each target, -1 if not found
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if len(timestamps) == 0:
+        return np.full(len(targets), -1, dtype=np.int64)
+    # stable sort keeps the first of equal timestamps first
+    order = np.argsort(timestamps, kind='stable')
+    found = np.searchsorted(timestamps[order], targets, side='left')
+    found = np.minimum(found, len(timestamps) - 1)
+    return np.where(timestamps[order][found] == targets, order[found], -1)
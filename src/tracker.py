@@ -0,0 +1,294 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+# packing of grid cell (x, y) into one key
+_CELL_OFFSET = 1 << 20
+_CELL_STRIDE = 1 << 21
+_NEIGHBORS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def _cell_keys(cells):
+    return (cells[:, 0] + _CELL_OFFSET) * _CELL_STRIDE + (cells[:, 1] + _CELL_OFFSET)
+
+
+def box_iou(boxes1, boxes2):
+    """IoU of box pairs
+
+    Args:
+        boxes1 (numpy.ndarray): boxes (left, top, right, bottom), shape (N, 4)
+        boxes2 (numpy.ndarray): boxes (left, top, right, bottom), shape (N, 4)
+
+    Returns:
+        numpy.ndarray: IoU of each pair, shape (N,)
+    """
+    width = np.minimum(boxes1[:, 2], boxes2[:, 2]) - np.maximum(boxes1[:, 0], boxes2[:, 0])
+    height = np.minimum(boxes1[:, 3], boxes2[:, 3]) - np.maximum(boxes1[:, 1], boxes2[:, 1])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    union = area1 + area2 - intersection
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(union > 0, intersection / union, 0.0)
+
+
+class Tracker() :
+    """track people between frames and count line crossings
+
+    Tracks are associated with detections by the distance of their points
+    (or IoU of their boxes). Only pairs in neighboring cells of a grid of
+    max_distance are compared, so dense frames do not compare every pair,
+    and all costs are computed as arrays. Pairs are assigned greedily by
+    cost, in rounds of mutual best pairs.
+
+    A crossing is counted when the point of a track moves across a line.
+    'in' is a crossing from the left to the right of the line seen on the
+    image, when the line is drawn from its first point to its second point.
+
+    Args:
+        config (dict): tracker settings
+    """
+
+    METRICS = ('distance', 'iou')
+
+    def __init__(self, config):
+
+        # Get parameter from config
+        self._max_distance = config.get('max_distance', 100)
+        self._metric = config.get('metric', 'distance')
+        self._iou_threshold = config.get('iou_threshold', 0.1)
+        self._max_missed = config.get('max_missed', 5)
+        lines = config.get('lines', [])
+
+        # Check parameter
+        if self._max_distance <= 0:
+            raise ValueError('max_distance must be larger than 0')
+        if self._metric not in self.METRICS:
+            raise ValueError(f'metric should be one of {self.METRICS}')
+        if not 0.0 <= self._iou_threshold <= 1.0:
+            raise ValueError('iou_threshold must be set in the range of 0 to 1')
+        if self._max_missed < 0:
+            raise ValueError('max_missed must be 0 or more')
+        line_array = np.asarray(lines, dtype=np.float64).reshape(-1, 2, 2)
+        if len(lines) != len(line_array):
+            raise ValueError('lines must be a list of [[x1, y1], [x2, y2]]')
+        if np.any(np.all(line_array[:, 0] == line_array[:, 1], axis=1)):
+            raise ValueError('both points of a line must be different')
+
+        self._line_start = line_array[:, 0]
+        self._line_vector = line_array[:, 1] - line_array[:, 0]
+        self._line_in = np.zeros(len(line_array), dtype=np.int64)
+        self._line_out = np.zeros(len(line_array), dtype=np.int64)
+
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._points = np.zeros((0, 2), dtype=np.float64)
+        self._boxes = np.zeros((0, 4), dtype=np.float64)
+        self._missed = np.zeros(0, dtype=np.int64)
+        self._next_id = 0
+        self._frame_step = 1
+
+    def set_frame_step(self, frame_step):
+        """set number of input frames since the previous tracked frame
+
+        People move frame_step times as far between tracked frames, so
+        max_distance is multiplied by frame_step, and missed frames are
+        counted in input frames, so max_missed keeps the same time.
+
+        Args:
+            frame_step (int): number of input frames, 1 if no frame is skipped
+        """
+        self._frame_step = frame_step
+
+    def __call__(self, bboxes, positiones):
+        """associate detections of one frame and count crossings
+
+        Args:
+            bboxes (list): bounding boxes (left, top, right, bottom)
+            positiones (list): point of each bounding box (x, y)
+
+        Returns:
+            list: track id of each bounding box
+            list: cumulative count of each line ({'in': n, 'out': n})
+        """
+        boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        points = np.asarray(positiones, dtype=np.float64).reshape(-1, 2)
+
+        track_index, detection_index = self._associate(boxes, points)
+        self._count_crossings(self._points[track_index], points[detection_index])
+
+        # update matched tracks
+        self._points[track_index] = points[detection_index]
+        self._boxes[track_index] = boxes[detection_index]
+        self._missed += self._frame_step
+        self._missed[track_index] = 0
+
+        detection_ids = np.full(len(points), -1, dtype=np.int64)
+        detection_ids[detection_index] = self._ids[track_index]
+
+        # drop lost tracks and start new tracks
+        alive = self._missed <= self._max_missed
+        new = detection_ids < 0
+        new_ids = np.arange(self._next_id, self._next_id + np.count_nonzero(new))
+        self._next_id += len(new_ids)
+        detection_ids[new] = new_ids
+
+        self._ids = np.concatenate([self._ids[alive], new_ids])
+        self._points = np.concatenate([self._points[alive], points[new]])
+        self._boxes = np.concatenate([self._boxes[alive], boxes[new]])
+        self._missed = np.concatenate(
+            [self._missed[alive], np.zeros(len(new_ids), dtype=np.int64)])
+
+        return detection_ids.tolist(), self.line_count()
+
+    def line_count(self):
+        """get cumulative count of each line
+
+        Returns:
+            list: count of each line ({'in': n, 'out': n})
+        """
+        return [
+            {'in': count_in, 'out': count_out}
+            for count_in, count_out in zip(self._line_in.tolist(), self._line_out.tolist())]
+
+    def get_state(self):
+        """get tracker state for checkpoint
+
+        Returns:
+            dict: tracker state
+        """
+        return {
+            'ids': self._ids.tolist(),
+            'points': self._points.tolist(),
+            'boxes': self._boxes.tolist(),
+            'missed': self._missed.tolist(),
+            'next_id': self._next_id,
+            'line_in': self._line_in.tolist(),
+            'line_out': self._line_out.tolist()
+        }
+
+    def set_state(self, state):
+        """restore tracker state from checkpoint
+
+        Args:
+            state (dict): tracker state
+        """
+        if len(state['line_in']) != len(self._line_in):
+            raise ValueError('number of lines does not match checkpoint')
+        self._ids = np.asarray(state['ids'], dtype=np.int64)
+        self._points = np.asarray(state['points'], dtype=np.float64).reshape(-1, 2)
+        self._boxes = np.asarray(state['boxes'], dtype=np.float64).reshape(-1, 4)
+        self._missed = np.asarray(state['missed'], dtype=np.int64)
+        self._next_id = state['next_id']
+        self._line_in = np.asarray(state['line_in'], dtype=np.int64)
+        self._line_out = np.asarray(state['line_out'], dtype=np.int64)
+
+    def _candidate_pairs(self, points):
+        # pairs of track and detection in neighboring grid cells
+        max_distance = self._max_distance * self._frame_step
+        detection_keys = _cell_keys(np.floor(points / max_distance).astype(np.int64))
+        order = np.argsort(detection_keys, kind='stable')
+        sorted_keys = detection_keys[order]
+        track_cells = np.floor(self._points / max_distance).astype(np.int64)
+
+        track_list = []
+        detection_list = []
+        for offset in _NEIGHBORS:
+            keys = _cell_keys(track_cells + offset)
+            low = np.searchsorted(sorted_keys, keys, side='left')
+            high = np.searchsorted(sorted_keys, keys, side='right')
+            counts = high - low
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # expand ranges [low, high) of each track
+            starts = np.repeat(low - (np.cumsum(counts) - counts), counts)
+            track_list.append(np.repeat(np.arange(len(keys)), counts))
+            detection_list.append(order[starts + np.arange(total)])
+
+        if not track_list:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(track_list), np.concatenate(detection_list)
+
+    def _associate(self, boxes, points):
+        empty = np.zeros(0, dtype=np.int64)
+        if len(self._ids) == 0 or len(points) == 0:
+            return empty, empty
+
+        pair_track, pair_detection = self._candidate_pairs(points)
+        distance = np.hypot(*(self._points[pair_track] - points[pair_detection]).T)
+        gate = distance <= self._max_distance * self._frame_step
+        if self._metric == 'iou':
+            iou = box_iou(self._boxes[pair_track], boxes[pair_detection])
+            gate &= iou >= self._iou_threshold
+            cost = 1.0 - iou
+        else:
+            cost = distance
+        pair_track = pair_track[gate]
+        pair_detection = pair_detection[gate]
+        cost = cost[gate]
+
+        # greedy assignment: pairs which are the best for both sides are
+        # taken in each round, which includes the cheapest remaining pair
+        matched_track = np.full(len(self._ids), -1, dtype=np.int64)
+        matched_detection = np.full(len(points), -1, dtype=np.int64)
+        while len(cost) > 0:
+            best_track = np.full(len(self._ids), np.inf)
+            np.minimum.at(best_track, pair_track, cost)
+            best_detection = np.full(len(points), np.inf)
+            np.minimum.at(best_detection, pair_detection, cost)
+            mutual = np.flatnonzero(
+                (cost == best_track[pair_track]) & (cost == best_detection[pair_detection]))
+
+            # one pair per track and per detection when costs are equal
+            mutual = mutual[np.unique(pair_track[mutual], return_index=True)[1]]
+            mutual = mutual[np.unique(pair_detection[mutual], return_index=True)[1]]
+            matched_track[pair_track[mutual]] = pair_detection[mutual]
+            matched_detection[pair_detection[mutual]] = pair_track[mutual]
+
+            remaining = (matched_track[pair_track] < 0) \
+                & (matched_detection[pair_detection] < 0)
+            pair_track = pair_track[remaining]
+            pair_detection = pair_detection[remaining]
+            cost = cost[remaining]
+
+        track_index = np.flatnonzero(matched_track >= 0)
+        return track_index, matched_track[track_index]
+
+    def _count_crossings(self, previous, current):
+        if len(self._line_start) == 0 or len(previous) == 0:
+            return
+        start = self._line_start[None, :, :]
+        vector = self._line_vector[None, :, :]
+        move = (current - previous)[:, None, :]
+        before = previous[:, None, :] - start
+        after = current[:, None, :] - start
+
+        # side of each point (positive is the right side on the image)
+        side_before = vector[..., 0] * before[..., 1] - vector[..., 1] * before[..., 0]
+        side_after = vector[..., 0] * after[..., 1] - vector[..., 1] * after[..., 0]
+
+        # crossing point must be on the line segment
+        denominator = vector[..., 0] * move[..., 1] - vector[..., 1] * move[..., 0]
+        numerator = before[..., 0] * move[..., 1] - before[..., 1] * move[..., 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            position = numerator / denominator
+        on_segment = (denominator != 0) & (position >= 0.0) & (position <= 1.0)
+
+        self._line_in += np.count_nonzero(
+            on_segment & (side_before < 0) & (side_after >= 0), axis=0)
+        self._line_out += np.count_nonzero(
+            on_segment & (side_before >= 0) & (side_after < 0), axis=0)
@@ -0,0 +1,456 @@
+"""
+Copyright 2023 Sony Semiconductor Solutions Corp. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import copy
+import hashlib
+import threading
+import yaml
+import numpy as np
+
+
+def _area_error(message, areas):
+    # error of the first area with a problem, numbered from 1 as in the overlay
+    return RuntimeError(f'area {int(np.min(areas)) + 1}: {message}')
+
+
+def _orientation(origin, point_a, point_b):
+    # sign of the cross product (a - origin) x (b - origin)
+    return np.sign(
+        (point_a[:, 0] - origin[:, 0]) * (point_b[:, 1] - origin[:, 1])
+        - (point_a[:, 1] - origin[:, 1]) * (point_b[:, 0] - origin[:, 0]))
+
+
+def _on_segment(start, end, point):
+    # point collinear with the segment lies between its ends
+    return (np.minimum(start[:, 0], end[:, 0]) <= point[:, 0]) \
+        & (point[:, 0] <= np.maximum(start[:, 0], end[:, 0])) \
+        & (np.minimum(start[:, 1], end[:, 1]) <= point[:, 1]) \
+        & (point[:, 1] <= np.maximum(start[:, 1], end[:, 1]))
+
+
+def _segments_touch(start_a, end_a, start_b, end_b):
+    orient_1 = _orientation(start_b, end_b, start_a)
+    orient_2 = _orientation(start_b, end_b, end_a)
+    orient_3 = _orientation(start_a, end_a, start_b)
+    orient_4 = _orientation(start_a, end_a, end_b)
+    cross = (orient_1 * orient_2 < 0) & (orient_3 * orient_4 < 0)
+    touch = ((orient_1 == 0) & _on_segment(start_b, end_b, start_a)) \
+        | ((orient_2 == 0) & _on_segment(start_b, end_b, end_a)) \
+        | ((orient_3 == 0) & _on_segment(start_a, end_a, start_b)) \
+        | ((orient_4 == 0) & _on_segment(start_a, end_a, end_b))
+    return cross | touch
+
+
+def _find_intersecting_edges(start, end, edge_areas, next_edge, max_pairs=1 << 20):
+    """find non adjacent edges of the same area which touch each other
+
+    Edges are swept from left to right: after sorting by the left end,
+    the edges whose x range overlaps an edge follow it up to the first
+    edge starting right of it, found by binary search. Only these pairs
+    are tested, a block of at most max_pairs pairs at a time.
+
+    Args:
+        start (numpy.ndarray): start vertex of each edge, shape (N, 2)
+        end (numpy.ndarray): end vertex of each edge, shape (N, 2)
+        edge_areas (numpy.ndarray): area of each edge, shape (N,)
+        next_edge (numpy.ndarray): next edge in the same area, shape (N,)
+        max_pairs (int, optional): pairs tested at once. Defaults to 1 << 20.
+
+    Returns:
+        numpy.ndarray: areas of touching edges, empty if none
+    """
+    edge_xmin = np.minimum(start[:, 0], end[:, 0])
+    edge_xmax = np.maximum(start[:, 0], end[:, 0])
+    order = np.argsort(edge_xmin, kind='stable')
+    sorted_xmin = edge_xmin[order]
+    stop = np.searchsorted(sorted_xmin, edge_xmax[order], side='right')
+    counts = np.maximum(stop - np.arange(len(order)) - 1, 0)
+    ends = np.cumsum(counts)
+
+    first = 0
+    while first < len(order):
+        # block of sorted edges with up to max_pairs candidate pairs
+        last = max(int(np.searchsorted(ends, ends[first] - counts[first] + max_pairs)),
+                   first + 1)
+        last = min(last, len(order))
+        block_counts = counts[first:last]
+        edge_a = np.repeat(np.arange(first, last), block_counts)
+        offsets = np.arange(len(edge_a)) \
+            - np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+        edge_b = order[edge_a + 1 + offsets]
+        edge_a = order[edge_a]
+
+        # same area, overlapping in y and not sharing a vertex
+        candidate = (edge_areas[edge_a] == edge_areas[edge_b]) \
+            & (next_edge[edge_a] != edge_b) & (next_edge[edge_b] != edge_a) \
+            & (np.minimum(start[edge_a, 1], end[edge_a, 1])
+               <= np.maximum(start[edge_b, 1], end[edge_b, 1])) \
+            & (np.minimum(start[edge_b, 1], end[edge_b, 1])
+               <= np.maximum(start[edge_a, 1], end[edge_a, 1]))
+        edge_a = edge_a[candidate]
+        edge_b = edge_b[candidate]
+        touch = _segments_touch(start[edge_a], end[edge_a], start[edge_b], end[edge_b])
+        if touch.any():
+            return edge_areas[edge_a[touch]]
+        first = last
+    return np.empty(0, dtype=np.int64)
+
+
+def _compile_polygons(area_points, point_lens):
+    """check and normalize polygons of all areas at once
+
+    Coordinates must be finite and 0 or more. Repeated vertices (edges of
+    length 0) are removed. Polygons with less than 3 distinct vertices,
+    without area, folding back on an edge or intersecting themselves are
+    rejected. Counterclockwise polygons (on the image) are reversed, so
+    that all polygons are clockwise.
+
+    Args:
+        area_points (list): vertices of each area
+        point_lens (numpy.ndarray): number of vertices of each area
+
+    Returns:
+        numpy.ndarray: vertices of all areas in order of areas, shape (N, 2)
+        numpy.ndarray: area of each vertex, shape (N,)
+        numpy.ndarray: index of the next vertex in the same area, shape (N,)
+    """
+    area_num = len(point_lens)
+    polygons = []
+    for area_point, point_len in zip(area_points, point_lens):
+        try:
+            polygon = np.array(area_point[:point_len], dtype=np.float64)
+        except (TypeError, ValueError) as error:
+            raise RuntimeError('area_point must be lists of [x, y]') from error
+        if polygon.ndim != 2 or polygon.shape[1] < 2:
+            raise RuntimeError('area_point must be lists of [x, y]')
+        polygons.append(polygon[:, :2])
+    vertices = np.concatenate(polygons) if polygons else np.empty((0, 2))
+    vertex_areas = np.repeat(np.arange(area_num), point_lens)
+
+    # bounds
+    # areas may reach out of the frame, only non-finite coordinates are rejected
+    invalid = ~np.isfinite(vertices).all(axis=1)
+    if invalid.any():
+        raise _area_error('coordinates must be finite', vertex_areas[invalid])
+
+    def next_of(vertex_areas):
+        # next vertex, the first vertex of the area after the last one
+        next_vertex = np.arange(1, len(vertex_areas) + 1)
+        if len(vertex_areas) == 0:
+            return next_vertex
+        last = np.flatnonzero(np.append(vertex_areas[1:] != vertex_areas[:-1], True))
+        first = np.append(0, last[:-1] + 1)
+        next_vertex[last] = first
+        return next_vertex
+
+    # degenerate edges: drop vertices equal to the next one
+    if len(vertices) > 0:
+        repeated = (vertices == vertices[next_of(vertex_areas)]).all(axis=1)
+        # a polygon of one repeated vertex keeps nothing
+        vertices = vertices[~repeated]
+        vertex_areas = vertex_areas[~repeated]
+    distinct = np.bincount(vertex_areas, minlength=area_num)
+    if (distinct < 3).any():
+        raise _area_error('polygon must have 3 or more distinct vertices',
+                          np.flatnonzero(distinct < 3))
+    next_vertex = next_of(vertex_areas)
+
+    # winding: signed area is positive for clockwise polygons on the image (y down)
+    following = vertices[next_vertex]
+    doubled_area = np.bincount(
+        vertex_areas,
+        weights=vertices[:, 0] * following[:, 1] - following[:, 0] * vertices[:, 1],
+        minlength=area_num)
+    if (doubled_area == 0).any():
+        raise _area_error('polygon has no area', np.flatnonzero(doubled_area == 0))
+    reverse = doubled_area[vertex_areas] < 0
+    if reverse.any():
+        # vertices are kept in order of areas, reversed within each area
+        order = np.lexsort((np.where(reverse, -1, 1) * np.arange(len(vertices)), vertex_areas))
+        vertices = vertices[order]
+        following = vertices[next_vertex]
+
+    # edges folding back on the previous edge overlap it
+    previous = np.empty_like(next_vertex)
+    previous[next_vertex] = np.arange(len(next_vertex))
+    incoming = vertices - vertices[previous]
+    outgoing = following - vertices
+    fold = (incoming[:, 0] * outgoing[:, 1] - incoming[:, 1] * outgoing[:, 0] == 0) \
+        & ((incoming * outgoing).sum(axis=1) < 0)
+    if fold.any():
+        raise _area_error('polygon folds back on an edge', vertex_areas[fold])
+
+    # self intersection of non adjacent edges
+    touching = _find_intersecting_edges(vertices, following, vertex_areas, next_vertex)
+    if len(touching) > 0:
+        raise _area_error('polygon intersects itself', touching)
+
+    return vertices, vertex_areas, next_vertex
+
+
+class CompiledZoneConfig() :
+    """immutable crowd count parameters with precomputed polygon edges
+
+    All edges of all areas are stored in one edge table, so that inpolygon
+    can test every point against every edge at once.
+
+    Args:
+        config (dict): crowd count parameters
+        max_area_num (int): maximum number of areas
+        max_point_num (int): maximum number of vertices per area
+    """
+
+    def __init__(self, config, max_area_num, max_point_num):
+        # copied list by list, deepcopy is slow for thousands of vertices
+        inpolygon_params = dict(config['inpolygon'])
+        inpolygon_params['area_point_len'] = list(inpolygon_params['area_point_len'])
+        inpolygon_params['area_point'] = [
+            [list(point) for point in area_point]
+            for area_point in inpolygon_params['area_point']]
+        stabilizer_params = copy.deepcopy(config['stabilizer'])
+
+        # parameter range check
+        if inpolygon_params['area_num'] > max_area_num:
+            raise RuntimeError(
+                'area_num should be less than or equal to ', max_area_num)
+        if len(inpolygon_params['area_point_len']) \
+            < inpolygon_params['area_num']:
+            raise RuntimeError(
+                'size of \'area_point_len\' and area_num do not match.')
+        if len(inpolygon_params['area_point']) \
+            < inpolygon_params['area_num']:
+            raise RuntimeError(
+                'size of \'area_point\' and area_num do not match.')
+
+        point_lens = np.array(
+            inpolygon_params['area_point_len'][:inpolygon_params['area_num']],
+            dtype=np.int64)
+        if (point_lens > max_point_num).any():
+            raise RuntimeError(
+                'area_point_len should be less than or equal to ', max_point_num)
+        if (point_lens < 3).any():
+            raise RuntimeError(
+                'area_point_len should be larger than 2 ')
+        for area, point_len in enumerate(point_lens):
+            if len(inpolygon_params['area_point'][area]) < point_len:
+                raise RuntimeError(
+                    'number of area_point should be larger than ', point_len)
+
+        if stabilizer_params['iir_down_ratio'] < 0 \
+            or stabilizer_params['iir_down_ratio'] > 1:
+            raise RuntimeError('iir_down_ratio must be set in the range of 0 to 1')
+        if stabilizer_params['iir_up_ratio'] < 0 \
+            or stabilizer_params['iir_up_ratio'] > 1:
+            raise RuntimeError('iir_up_ratio must be set in the range of 0 to 1')
+
+        # parameters as loaded, saved in checkpoint to restore with them
+        self.params = config
+        self.inpolygon_params = inpolygon_params
+        self.stabilizer_params = stabilizer_params
+        self.remove_params = copy.deepcopy(config['remove_low_conf'])
+        self.bbox2point_params = copy.deepcopy(config['bbox2point'])
+        self.area_num = inpolygon_params['area_num']
+
+        # polygons are checked and normalized in bulk (see _compile_polygons)
+        vertices, vertex_areas, next_vertex = _compile_polygons(
+            inpolygon_params['area_point'][:self.area_num], point_lens)
+        offsets = np.searchsorted(vertex_areas, np.arange(self.area_num))
+
+        # polygon of each area (used to find changed areas)
+        self.area_polygons = tuple(
+            np.split(vertices, offsets[1:]) if self.area_num > 0 else [])
+
+        # edge table: edge i goes from vertex i to the next vertex of its area
+        edge_areas = vertex_areas
+        start = vertices
+        end = vertices[next_vertex]
+
+        delta_x = end[:, 0] - start[:, 0]
+        delta_y = end[:, 1] - start[:, 1]
+        vertical = delta_x == 0
+        # vertical edges are never crossed (min(x) < x <= max(x) is empty)
+        slope = np.divide(
+            delta_y, delta_x, out=np.zeros_like(delta_y), where=~vertical)
+
+        self.edge_x1 = start[:, 0]
+        self.edge_y1 = start[:, 1]
+        self.edge_slope = slope
+        self.edge_xmin = np.minimum(start[:, 0], end[:, 0])
+        self.edge_xmax = np.maximum(start[:, 0], end[:, 0])
+
+        # mask of edge to area for counting crossings per area
+        self.edge_area_mask = np.zeros((len(edge_areas), self.area_num), dtype=np.int32)
+        self.edge_area_mask[np.arange(len(edge_areas)), edge_areas] = 1
+
+        # classes counted separately, with thresholds of each class
+        # (thresholds of remove_low_conf are used if not set)
+        classes = config.get('classes') or []
+        class_ids = [class_param.get('class_id') for class_param in classes]
+        for class_id in class_ids:
+            if not isinstance(class_id, int) or class_id < 0:
+                raise RuntimeError('class_id must be an integer of 0 or more')
+        if len(set(class_ids)) != len(class_ids):
+            raise RuntimeError('class_id must be unique in classes')
+        self.class_names = tuple(
+            str(class_param.get('name', class_param['class_id'])) for class_param in classes)
+        self.class_ids = np.array(class_ids, dtype=np.int64)
+        self.class_min_score = np.array(
+            [class_param.get('min_detect_score', self.remove_params['min_detect_score'])
+             for class_param in classes], dtype=np.float64)
+        self.class_min_height = np.array(
+            [class_param.get('min_height', self.remove_params['min_height'])
+             for class_param in classes], dtype=np.float64)
+        self.class_max_height = np.array(
+            [class_param.get('max_height', self.remove_params['max_height'])
+             for class_param in classes], dtype=np.float64)
+        if (self.class_min_height > self.class_max_height).any():
+            raise RuntimeError('min_height of a class must be less than or equal to max_height')
+        # order of class ids to find the row of a class id by binary search
+        self.class_order = np.argsort(self.class_ids, kind='stable')
+
+        # bounding box of each area (left, top, right, bottom)
+        self.area_bbox = np.zeros((self.area_num, 4), dtype=np.float64)
+        if self.area_num > 0:
+            self.area_bbox[:, :2] = np.minimum.reduceat(vertices, offsets)
+            self.area_bbox[:, 2:] = np.maximum.reduceat(vertices, offsets)
+
+        for array in self.area_polygons + (self.edge_x1, self.edge_y1, self.edge_slope,
+                      self.edge_xmin, self.edge_xmax, self.edge_area_mask,
+                      self.area_bbox, self.class_ids, self.class_min_score,
+                      self.class_min_height, self.class_max_height, self.class_order):
+            array.flags.writeable = False
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('CompiledZoneConfig is immutable')
+        super().__setattr__(name, value)
+
+    def changed_areas(self, previous):
+        """get areas whose polygon differs from previous config
+
+        Args:
+            previous (CompiledZoneConfig): previous config
+
+        Returns:
+            set: indexes of changed or added areas
+        """
+        changed = set()
+        for area, polygon in enumerate(self.area_polygons):
+            if area >= previous.area_num \
+                or not np.array_equal(previous.area_polygons[area], polygon):
+                changed.add(area)
+        return changed
+
+    def class_rows(self, class_ids):
+        """find the row of each class id in classes
+
+        Args:
+            class_ids (numpy.ndarray): class ids of detections
+
+        Returns:
+            numpy.ndarray: row in classes, -1 if the class is not counted
+        """
+        class_ids = np.asarray(class_ids, dtype=np.int64)
+        if len(self.class_ids) == 0:
+            return np.full(len(class_ids), -1, dtype=np.int64)
+        sorted_ids = self.class_ids[self.class_order]
+        found = np.minimum(
+            np.searchsorted(sorted_ids, class_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[found] == class_ids, self.class_order[found], -1)
+
+
+class ZoneConfigWatcher() :
+    """reload and compile parameter file when it changes
+
+    The file is checked in a background thread and the compiled config is
+    handed to the processing loop by take(), so that the config is swapped
+    between frames.
+
+    Args:
+        param_file (str): path of crowd count parameter file
+        compile_config (function): function to compile parameters
+        interval (float, optional): check interval in seconds. Defaults to 1.0.
+    """
+
+    def __init__(self, param_file, compile_config, interval=1.0):
+        self._param_file = param_file
+        self._compile_config = compile_config
+        self._interval = interval
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._stat = self._get_stat()
+        self._digest = hashlib.sha256(self._read()).hexdigest()
+
+        if self._interval <= 0:
+            raise ValueError('reload_interval must be larger than 0')
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def take(self):
+        """get newly compiled config
+
+        Returns:
+            CompiledZoneConfig: compiled config, None if not changed
+        """
+        if self._pending is None:
+            return None
+        with self._lock:
+            compiled, self._pending = self._pending, None
+        return compiled
+
+    def close(self):
+        """stop watching
+
+        """
+        self._stop_event.set()
+        self._thread.join()
+
+    def _get_stat(self):
+        try:
+            stat = os.stat(self._param_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self):
+        with open(self._param_file, 'rb') as file:
+            return file.read()
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            stat = self._get_stat()
+            if stat is None or stat == self._stat:
+                continue
+            self._stat = stat
+            try:
+                # the same bytes are hashed and parsed, so that a write
+                # between them is found at the next check
+                data = self._read()
+                digest = hashlib.sha256(data).hexdigest()
+                if digest == self._digest:
+                    continue
+                compiled = self._compile_config(yaml.safe_load(data.decode('utf-8')))
+            except Exception as error:  # keep current config on any error
+                print(f'failed to reload {self._param_file}: {error}')
+                continue
+            self._digest = digest
+            with self._lock:
+                self._pending = compiled
+            print(f'reloaded {self._param_file}')